@@ -3,19 +3,348 @@
 Fama-MacBeth Regression Test for Korea Fama-French Factors
 
 Tests the significance of MKT, SMB, and HML factors using Fama-MacBeth two-pass regression.
+
+Both passes are batched least squares over a (months x assets) returns matrix
+with missing values: the time-series betas of all assets are solved at once
+from per-asset masked cross products, and the cross-sectional regressions of
+all months likewise, instead of one OLS fit per asset or per month.
+
+Monthly factor returns are autocorrelated, so means are tested with Newey-West
+(HAC) standard errors, and means, Sharpe ratios and correlations with a
+stationary (or moving) block bootstrap. All resamples are drawn as one index
+matrix and evaluated with array operations, optionally over a process pool.
 """
 
 import pandas as pd
 import numpy as np
-import statsmodels.api as sm
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
 from scipy import stats
+from korea_factor_store import load_factor_file
+
+FACTORS = ['MKT', 'SMB', 'HML']
+
+
+def newey_west_lags(n: int) -> int:
+    """Default Newey-West lag length for n observations: floor(4 (n/100)^(2/9))."""
+    return int(np.floor(4 * (n / 100) ** (2 / 9)))
+
+
+def newey_west_se(values: np.ndarray, lags: Optional[int] = None) -> np.ndarray:
+    """
+    Newey-West (HAC) standard errors of column means.
+    
+    Args:
+        values: (T,) or (T, K) observations without missing values
+        lags: Number of autocovariance lags with Bartlett weights (default: newey_west_lags)
+    
+    Returns:
+        Standard error of the mean of every column
+    """
+    x = np.asarray(values, dtype='float64')
+    x = x.reshape(len(x), -1)
+    n = len(x)
+    lags = newey_west_lags(n) if lags is None else min(lags, n - 1)
+    
+    e = x - x.mean(axis=0)
+    long_run = (e * e).sum(axis=0) / n
+    for lag in range(1, lags + 1):
+        weight = 1 - lag / (lags + 1)
+        long_run += 2 * weight * (e[lag:] * e[:-lag]).sum(axis=0) / n
+    
+    se = np.sqrt(np.maximum(long_run, 0) / n)
+    return se if np.ndim(values) > 1 else se[0]
+
+
+def bootstrap_indices(n: int, n_boot: int, block_length: float, method: str = 'stationary',
+                      seed: Optional[int] = None) -> np.ndarray:
+    """
+    Index matrix of block bootstrap resamples of a time series.
+    
+    Args:
+        n: Series length
+        n_boot: Number of resamples
+        block_length: Block length ('block') or mean block length ('stationary')
+        method: 'stationary' (Politis-Romano, geometric block lengths, wrapping
+                around) or 'block' (moving blocks of fixed length)
+        seed: Random seed
+    
+    Returns:
+        (n_boot, n) integer matrix; row b indexes the observations of resample b
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(n)
+    
+    if method == 'stationary':
+        new_block = rng.random((n_boot, n)) < 1 / block_length
+        new_block[:, 0] = True
+    elif method == 'block':
+        new_block = np.broadcast_to(t % max(int(round(block_length)), 1) == 0, (n_boot, n))
+    else:
+        raise ValueError(f"Unknown bootstrap method: {method}")
+    
+    # Position of the current block's start, and a random start index for every block
+    block_start = np.maximum.accumulate(np.where(new_block, t, 0), axis=1)
+    starts = rng.integers(0, n, size=(n_boot, n))
+    return (np.take_along_axis(starts, block_start, axis=1) + t - block_start) % n
+
+
+def _bootstrap_statistics(values: np.ndarray, rf: np.ndarray, indices: np.ndarray) -> Dict[str, np.ndarray]:
+    """Means, annualized Sharpe ratios and correlations of every resample."""
+    sample = values[indices]                                  # (B, T, K)
+    mean = sample.mean(axis=1)
+    centered = sample - mean[:, None, :]
+    cov = np.matmul(centered.transpose(0, 2, 1), centered) / (values.shape[0] - 1)
+    std = np.sqrt(np.einsum('bkk->bk', cov))
+    corr = cov / (std[:, :, None] * std[:, None, :])
+    sharpe = (mean - rf[indices].mean(axis=1)[:, None]) * 12 / (std * np.sqrt(12))
+    return {'mean': mean, 'sharpe': sharpe, 'corr': corr}
+
+
+def bootstrap_factor_stats(factors: pd.DataFrame, rf: Optional[pd.Series] = None, n_boot: int = 10000,
+                           block_length: Optional[float] = None, method: str = 'stationary',
+                           workers: int = 1, seed: Optional[int] = 0,
+                           alpha: float = 0.05) -> Dict[str, pd.DataFrame]:
+    """
+    Block bootstrap of factor means, Sharpe ratios and correlations.
+    
+    Resamples whole rows (months), so the cross-correlation of the factors
+    and their autocorrelation within blocks are preserved. Sharpe ratios are
+    annualized as (mean - mean RF) * 12 / (std * sqrt(12)).
+    
+    Args:
+        factors: Months x factors returns (monthly %), without missing values
+        rf: Risk-free rate per month (monthly %) for Sharpe ratios (default: 0)
+        n_boot: Number of resamples
+        block_length: (Mean) block length in months (default: n^(1/3), at least 2)
+        method: 'stationary' or 'block' (see bootstrap_indices)
+        workers: Processes evaluating chunks of resamples (1: in this process)
+        seed: Random seed
+        alpha: Confidence intervals cover 1 - alpha (percentile intervals)
+    
+    Returns:
+        Dictionary with 'mean' and 'sharpe' (estimate, bootstrap SE, CI bounds and
+        a two-sided p-value for zero) and 'corr' (estimate and CI bounds per pair)
+        
+    Example:
+        >>> boot = bootstrap_factor_stats(factors[FACTORS], factors['RF'], n_boot=20000, workers=4)
+        >>> print(boot['mean'])
+    """
+    values = factors.to_numpy(dtype='float64')
+    n = len(values)
+    rf_values = rf.to_numpy(dtype='float64') if rf is not None else np.zeros(n)
+    block_length = block_length or max(2.0, n ** (1 / 3))
+    indices = bootstrap_indices(n, n_boot, block_length, method, seed)
+    
+    if workers > 1:
+        chunks = np.array_split(indices, workers)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_bootstrap_statistics, [values] * len(chunks), [rf_values] * len(chunks), chunks))
+        boot = {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+    else:
+        boot = _bootstrap_statistics(values, rf_values, indices)
+    
+    estimate = _bootstrap_statistics(values, rf_values, np.arange(n)[None, :])
+    lower, upper = 100 * alpha / 2, 100 * (1 - alpha / 2)
+    
+    def summarize(key: str) -> pd.DataFrame:
+        point, draws = estimate[key][0], boot[key]
+        # p-value of zero: share of recentered resamples at least as far from zero as the estimate
+        p_value = (np.abs(draws - point) >= np.abs(point)).mean(axis=0)
+        return pd.DataFrame({
+            'Estimate': point,
+            'Bootstrap SE': draws.std(axis=0, ddof=1),
+            'CI Low': np.percentile(draws, lower, axis=0),
+            'CI High': np.percentile(draws, upper, axis=0),
+            'Bootstrap P-Value': p_value
+        }, index=factors.columns)
+    
+    names = list(factors.columns)
+    pairs = [(i, j) for i in range(len(names)) for j in range(i + 1, len(names))]
+    corr = pd.DataFrame({
+        'Estimate': [estimate['corr'][0, i, j] for i, j in pairs],
+        'CI Low': [np.percentile(boot['corr'][:, i, j], lower) for i, j in pairs],
+        'CI High': [np.percentile(boot['corr'][:, i, j], upper) for i, j in pairs]
+    }, index=[f"{names[i]}-{names[j]}" for i, j in pairs])
+    
+    return {'mean': summarize('mean'), 'sharpe': summarize('sharpe'), 'corr': corr}
+
+
+def load_test_assets(filepath: str) -> pd.DataFrame:
+    """
+    Load test asset returns (monthly %) as a months x assets matrix.
+    
+    Accepts a wide CSV (date column plus one column per asset) or a long CSV
+    with columns date, asset (or gvkey) and return, or a wide Parquet/Arrow
+    store (see korea_factor_store).
+    
+    Args:
+        filepath: Path to test asset returns CSV file or store
+    
+    Returns:
+        DataFrame indexed by month-end date with one column per asset
+    """
+    df = load_factor_file(filepath)
+    asset_col = 'asset' if 'asset' in df.columns else 'gvkey' if 'gvkey' in df.columns else None
+    if asset_col is not None and 'return' in df.columns:
+        df = df.pivot_table(index='date', columns=asset_col, values='return', aggfunc='last')
+    else:
+        df = df.set_index('date')
+    df.index = df.index.to_period('M').to_timestamp('M')
+    return df.sort_index().astype('float64')
+
+
+def batched_lstsq(xtx: np.ndarray, xty: np.ndarray, counts: np.ndarray, min_obs: int) -> np.ndarray:
+    """
+    Solve a stack of normal equations, NaN where underdetermined.
+    
+    Args:
+        xtx: (B, P, P) cross products X'X
+        xty: (B, P) cross products X'y
+        counts: (B,) number of observations behind each system
+        min_obs: Minimum observations for a solution
+    
+    Returns:
+        (B, P) coefficients
+    """
+    coef = np.full(xty.shape, np.nan)
+    ok = counts >= max(min_obs, xty.shape[1])
+    if ok.any():
+        # Singular systems (e.g. a constant regressor) are dropped rather than failing the batch
+        ok[ok] = np.linalg.matrix_rank(xtx[ok], hermitian=True) == xty.shape[1]
+        coef[ok] = np.linalg.solve(xtx[ok], xty[ok][..., None])[..., 0]
+    return coef
+
+
+def time_series_betas(returns: pd.DataFrame, factors: pd.DataFrame, min_obs: int = 24) -> pd.DataFrame:
+    """
+    First pass: regress every asset's excess returns on the factors.
+    
+    R_i,t - R_f,t = a_i + b_i' f_t + e_i,t is fitted for all assets in one
+    batched solve; each asset uses only the months it has a return.
+    
+    Args:
+        returns: Months x assets excess returns
+        factors: Months x factors returns (same index as returns)
+        min_obs: Minimum months of returns for an asset's betas
+    
+    Returns:
+        DataFrame indexed by asset with columns alpha, then one beta per factor,
+        and n_obs (betas NaN for assets with fewer than min_obs months)
+    """
+    y = returns.to_numpy(dtype='float64')
+    x = np.column_stack([np.ones(len(factors)), factors.to_numpy(dtype='float64')])
+    mask = ~np.isnan(y) & ~np.isnan(x).any(axis=1)[:, None]
+    y0 = np.where(mask, y, 0.0)
+    m = mask.astype('float64')
+    x0 = np.nan_to_num(x)
+    
+    # Per-asset X'X and X'y over the months the asset has returns
+    xtx = np.einsum('tn,tk,tl->nkl', m, x0, x0, optimize=True)
+    xty = np.einsum('tk,tn->nk', x0, y0, optimize=True)
+    counts = mask.sum(axis=0)
+    
+    coef = batched_lstsq(xtx, xty, counts, min_obs)
+    result = pd.DataFrame(coef, index=returns.columns, columns=['alpha'] + list(factors.columns))
+    result['n_obs'] = counts
+    return result
+
+
+def cross_sectional_regressions(returns: pd.DataFrame, betas: pd.DataFrame,
+                                min_assets: Optional[int] = None) -> pd.DataFrame:
+    """
+    Second pass: regress each month's returns on the assets' betas.
+    
+    R_i,t = g_0,t + g_t' b_i + n_i,t is fitted for all months in one batched
+    solve; each month uses the assets with a return and betas.
+    
+    Args:
+        returns: Months x assets returns
+        betas: Assets x factors betas (e.g. time_series_betas without alpha/n_obs)
+        min_assets: Minimum assets in a month's regression (default: factors + 2)
+    
+    Returns:
+        DataFrame indexed by month with columns const, then one premium per factor,
+        and n_assets
+    """
+    betas = betas.reindex(returns.columns)
+    b = betas.to_numpy(dtype='float64')
+    x = np.column_stack([np.ones(len(b)), b])
+    y = returns.to_numpy(dtype='float64')
+    mask = ~np.isnan(y) & ~np.isnan(x).any(axis=1)[None, :]
+    y0 = np.where(mask, y, 0.0)
+    m = mask.astype('float64')
+    x0 = np.nan_to_num(x)
+    
+    # Per-month X'X and X'y over the assets with a return that month
+    xtx = np.einsum('tn,nk,nl->tkl', m, x0, x0, optimize=True)
+    xty = np.einsum('nk,tn->tk', x0, y0, optimize=True)
+    counts = mask.sum(axis=1)
+    
+    min_assets = min_assets if min_assets is not None else x.shape[1] + 1
+    coef = batched_lstsq(xtx, xty, counts, min_assets)
+    result = pd.DataFrame(coef, index=returns.index, columns=['const'] + list(betas.columns))
+    result['n_assets'] = counts
+    return result
+
 
-def fama_macbeth_test(factors_file='data/korea_factors_monthly.csv'):
+def fama_macbeth(returns: pd.DataFrame, factors: pd.DataFrame, rf: Optional[pd.Series] = None,
+                 min_obs: int = 24, lags: Optional[int] = None) -> Dict[str, pd.DataFrame]:
+    """
+    Two-pass Fama-MacBeth (1973) regression of test asset returns on factor betas.
+    
+    Args:
+        returns: Months x assets returns (monthly %)
+        factors: Months x factors returns (monthly %), e.g. MKT, SMB, HML
+        rf: Risk-free rate per month (monthly %), subtracted from returns if given
+        min_obs: Minimum months of returns for an asset to enter the second pass
+        lags: Newey-West lags of the premium standard errors (default:
+              newey_west_lags; 0 gives the plain Fama-MacBeth standard errors)
+    
+    Returns:
+        Dictionary with 'betas' (first pass), 'gammas' (second pass, per month)
+        and 'premiums' (mean, Newey-West standard error, t-statistic and p-value
+        of every gamma across months)
+        
+    Example:
+        >>> factors = load_factor_file('data/korea_factors_monthly.csv').set_index('date')
+        >>> fm = fama_macbeth(load_test_assets('data/test_assets.csv'), factors[FACTORS], factors['RF'])
+        >>> print(fm['premiums'])
+    """
+    returns, factors = returns.align(factors, join='inner', axis=0)
+    excess = returns.sub(rf.reindex(returns.index), axis=0) if rf is not None else returns
+    
+    betas = time_series_betas(excess, factors, min_obs)
+    gammas = cross_sectional_regressions(excess, betas[list(factors.columns)])
+    
+    estimates = gammas.drop(columns='n_assets').dropna()
+    n = len(estimates)
+    mean = estimates.mean()
+    se = pd.Series(newey_west_se(estimates.to_numpy(), lags), index=estimates.columns)
+    t_stat = mean / se
+    premiums = pd.DataFrame({
+        'Mean (Monthly %)': mean,
+        'NW Std Error': se,
+        'NW T-Statistic': t_stat,
+        'NW P-Value': 2 * stats.t.sf(np.abs(t_stat), n - 1),
+        'Months': n
+    })
+    return {'betas': betas, 'gammas': gammas, 'premiums': premiums}
+
+
+def fama_macbeth_test(factors_file='data/korea_factors_monthly.csv', returns_file=None,
+                      n_boot=10000, block_length=None, bootstrap_method='stationary', workers=1):
     """
     Perform Fama-MacBeth regression test on Korea factors.
     
     Args:
-        factors_file: Path to factors CSV file
+        factors_file: Path to factors CSV file or Parquet/Arrow store
+        returns_file: Optional test asset returns CSV (see load_test_assets); if
+                      given, the two-pass regression is run on these assets
+        n_boot: Number of bootstrap resamples (0: no bootstrap)
+        block_length: (Mean) bootstrap block length in months (default: n^(1/3))
+        bootstrap_method: 'stationary' or 'block'
+        workers: Processes evaluating the bootstrap resamples
     
     Returns:
         DataFrame with test results
@@ -25,7 +354,7 @@ def fama_macbeth_test(factors_file='data/korea_factors_monthly.csv'):
     print("="*80)
     
     # Load factor data
-    factors = pd.read_csv(factors_file, parse_dates=['date'])
+    factors = load_factor_file(factors_file)
     print(f"\nLoaded {len(factors)} months of factor data")
     print(f"Period: {factors['date'].min()} to {factors['date'].max()}")
     
@@ -43,39 +372,55 @@ def fama_macbeth_test(factors_file='data/korea_factors_monthly.csv'):
     annual_returns = factors[['MKT', 'SMB', 'HML']].mean() * 12
     print(annual_returns)
     
-    # T-tests for factor premiums
+    # Bootstrap of means, Sharpe ratios and correlations (months with all factors and RF)
+    complete = factors[FACTORS + ['RF']].dropna()
+    boot = None
+    if n_boot > 0:
+        boot = bootstrap_factor_stats(complete[FACTORS], complete['RF'], n_boot, block_length,
+                                      bootstrap_method, workers)
+    
+    # HAC t-tests for factor premiums
     print("\n" + "="*80)
-    print("T-Tests for Factor Premiums")
+    print(f"Newey-West T-Tests for Factor Premiums ({newey_west_lags(len(complete))} lags)")
     print("="*80)
     
     results = []
-    for factor in ['MKT', 'SMB', 'HML']:
+    for factor in FACTORS:
         data = factors[factor].dropna()
         n = len(data)
         mean = data.mean()
         std = data.std()
-        se = std / np.sqrt(n)
+        se = newey_west_se(data.to_numpy())
         t_stat = mean / se
-        p_value = 2 * (1 - stats.t.cdf(abs(t_stat), n-1))
+        p_value = 2 * stats.t.sf(abs(t_stat), n - 1)
         
         results.append({
             'Factor': factor,
             'Mean (Monthly %)': mean,
             'Std Dev': std,
-            'T-Statistic': t_stat,
-            'P-Value': p_value,
+            'NW Std Error': se,
+            'NW T-Statistic': t_stat,
+            'NW P-Value': p_value,
+            'Bootstrap P-Value': boot['mean'].loc[factor, 'Bootstrap P-Value'] if boot is not None else np.nan,
             'Significant': '***' if p_value < 0.01 else '**' if p_value < 0.05 else '*' if p_value < 0.1 else ''
         })
     
     results_df = pd.DataFrame(results)
     print(results_df.to_string(index=False))
     
+    if boot is not None:
+        print(f"\nBlock bootstrap ({bootstrap_method}, {n_boot} resamples) of monthly means:")
+        print(boot['mean'].to_string())
+    
     # Correlation matrix
     print("\n" + "="*80)
     print("Factor Correlation Matrix")
     print("="*80)
     corr = factors[['MKT', 'SMB', 'HML']].corr()
     print(corr)
+    if boot is not None:
+        print("\nBootstrap confidence intervals:")
+        print(boot['corr'].to_string())
     
     # Sharpe ratios (assuming RF as benchmark)
     print("\n" + "="*80)
@@ -87,12 +432,45 @@ def fama_macbeth_test(factors_file='data/korea_factors_monthly.csv'):
         volatility = factors[factor].std()
         sharpe = (excess_return * 12) / (volatility * np.sqrt(12))
         print(f"{factor}: {sharpe:.4f}")
+    if boot is not None:
+        print("\nBootstrap:")
+        print(boot['sharpe'].to_string())
+    
+    # Two-pass regression on test assets
+    if returns_file is not None:
+        returns = load_test_assets(returns_file)
+        indexed = factors.set_index(factors['date'].dt.to_period('M').dt.to_timestamp('M'))
+        fm = fama_macbeth(returns, indexed[FACTORS], indexed['RF'])
+        
+        print("\n" + "="*80)
+        print(f"Fama-MacBeth Risk Premiums ({returns.shape[1]} test assets)")
+        print("="*80)
+        print(f"Assets with betas: {fm['betas'][FACTORS].notna().all(axis=1).sum()}")
+        print(fm['premiums'].to_string())
     
     return results_df
 
 
 if __name__ == "__main__":
-    results = fama_macbeth_test()
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Fama-MacBeth test of Korea factors')
+    parser.add_argument('--factors-file', type=str, default='data/korea_factors_monthly.csv',
+                        help='Factor data CSV file or .parquet/.arrow store')
+    parser.add_argument('--returns-file', type=str, default=None,
+                        help='Test asset returns CSV (wide, or long with date, asset, return) for the two-pass regression')
+    parser.add_argument('--bootstrap', type=int, default=10000,
+                        help='Number of bootstrap resamples (0 to skip)')
+    parser.add_argument('--block-length', type=float, default=None,
+                        help='(Mean) bootstrap block length in months (default: n^(1/3))')
+    parser.add_argument('--bootstrap-method', type=str, default='stationary', choices=['stationary', 'block'],
+                        help='Stationary (random block lengths) or moving block bootstrap')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Processes evaluating the bootstrap resamples')
+    args = parser.parse_args()
+    
+    results = fama_macbeth_test(args.factors_file, args.returns_file, args.bootstrap, args.block_length,
+                                args.bootstrap_method, args.workers)
     
     print("\n" + "="*80)
     print("Conclusion")
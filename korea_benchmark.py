@@ -0,0 +1,553 @@
+#!/usr/bin/env python3
+"""
+Korea Factor Offline Benchmark
+
+This module benchmarks KoreaFactorCalculator and the updater without WRDS
+credentials or network access. A synthetic comp.g_secd/comp.g_funda is generated
+into a local DuckDB (or SQLite) database and served through a stand-in connection
+with the same raw_sql interface as wrds.Connection. SyntheticECOSServer is a
+local HTTP stand-in for the ECOS StatisticSearch API used by
+KoreaRiskFreeRateFetcher.
+
+Reported for every benchmark: wall time, time per pipeline stage, number of
+queries, rows fetched, rows/sec and peak Python memory (tracemalloc).
+"""
+
+import pandas as pd
+import numpy as np
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from unittest import mock
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+import os
+import re
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+import korea_factor_calculator
+import korea_factor_updater
+from korea_factor_calculator import KoreaFactorCalculator
+from korea_fundamentals import KoreaFundamentalsStore
+from korea_trading_calendar import KoreaTradingCalendar
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Functions and methods timed as pipeline stages: (owner, attribute, stage name)
+STAGES = [
+    (korea_factor_calculator, 'get_korea_all_stocks', 'formation_stocks'),
+    (korea_factor_calculator, 'get_korea_month_end_prices', 'month_end_prices'),
+    (korea_factor_calculator, 'get_korea_price_panel', 'price_panel'),
+    (KoreaFundamentalsStore, 'load', 'fundamentals'),
+    (KoreaTradingCalendar, 'load', 'calendar'),
+    (KoreaFactorCalculator, 'assign_portfolios', 'assign_portfolios'),
+    (KoreaFactorCalculator, 'calculate_portfolio_returns', 'portfolio_returns'),
+]
+
+
+def generate_compustat(n_firms: int = 500, start_date: str = '2018-01-01', end_date: str = '2021-12-31',
+                       share_class_frac: float = 0.1, seed: int = 0) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Generate synthetic Korean comp.g_secd and comp.g_funda tables.
+    
+    Prices follow independent random walks on business days; some firms list
+    late or delist early, a fraction has a second share class (iid '02'), and a
+    small share of prices and shares outstanding is missing. Fundamentals are
+    December fiscal year ends from three years before start_date, with some
+    firm-years missing and some negative book equity.
+    
+    Args:
+        n_firms: Number of firms (gvkeys)
+        start_date: First trading day in 'YYYY-MM-DD' format
+        end_date: Last trading day in 'YYYY-MM-DD' format
+        share_class_frac: Fraction of firms with a second share class
+        seed: Random seed
+    
+    Returns:
+        Tuple of (g_secd, g_funda) DataFrames with the columns used by this project
+    
+    Example:
+        >>> secd, funda = generate_compustat(1000, '2015-01-01', '2021-12-31')
+    """
+    rng = np.random.default_rng(seed)
+    days = pd.bdate_range(start_date, end_date)
+    days = days[rng.random(len(days)) > 0.03]
+    
+    frames = []
+    shares = {}
+    for firm in range(n_firms):
+        gvkey = f"{100000 + firm:06d}"
+        iids = ['01', '02'] if rng.random() < share_class_frac else ['01']
+        first = rng.integers(0, len(days) // 3) if rng.random() < 0.2 else 0
+        last = len(days) - (rng.integers(0, len(days) // 3) if rng.random() < 0.1 else 0)
+        firm_days = days[first:last]
+        n = len(firm_days)
+        
+        for iid in iids:
+            prccd = 10000 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+            prccd[rng.random(n) < 0.005] = np.nan
+            cshoc = np.full(n, rng.uniform(1e6, 1e8))
+            shares[gvkey] = shares.get(gvkey, 0) + cshoc[0]
+            cshoc[rng.random(n) < 0.01] = np.nan
+            frames.append(pd.DataFrame({
+                'gvkey': gvkey, 'iid': iid, 'datadate': firm_days, 'conm': f"SYNTHETIC FIRM {firm}",
+                'fic': 'KOR', 'prccd': prccd, 'ajexdi': 1.0, 'cshoc': cshoc, 'trfd': 1.0
+            }))
+    secd = pd.concat(frames, ignore_index=True)
+    
+    first_year, last_year = pd.Timestamp(start_date).year - 3, pd.Timestamp(end_date).year
+    firm_years = pd.MultiIndex.from_product([[f"{100000 + f:06d}" for f in range(n_firms)],
+                                             range(first_year, last_year + 1)], names=['gvkey', 'fyear'])
+    funda = firm_years.to_frame(index=False)
+    funda = funda[rng.random(len(funda)) > 0.1].reset_index(drop=True)
+    funda['datadate'] = pd.to_datetime(funda['fyear'].astype(str) + '-12-31')
+    funda['fic'] = 'KOR'
+    # Book-to-market around one (at the initial price), independent of size; some negative book equity
+    funda['ceq'] = funda['gvkey'].map(shares) * 10000 * rng.lognormal(0, 0.7, len(funda)) * \
+                   np.where(rng.random(len(funda)) < 0.05, -1, 1)
+    funda['at'] = rng.uniform(1e11, 5e11, len(funda))
+    funda['revt'] = funda['at'] * rng.uniform(0.3, 1.2, len(funda))
+    funda['cogs'] = funda['revt'] * rng.uniform(0.5, 0.9, len(funda))
+    funda['xsga'] = funda['revt'] * rng.uniform(0.05, 0.2, len(funda))
+    funda['xint'] = np.where(rng.random(len(funda)) < 0.2, np.nan, funda['at'] * rng.uniform(0, 0.02, len(funda)))
+    
+    logger.info(f"Generated {len(secd)} g_secd rows and {len(funda)} g_funda rows for {n_firms} firms")
+    return secd, funda
+
+
+def wrds_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Column dtypes as returned by wrds.Connection.raw_sql (dtype_backend='numpy_nullable').
+    
+    Text becomes string, floats Float64 (also whole-valued ones) and integers
+    Int64; date objects stay object columns.
+    """
+    df = df.convert_dtypes(dtype_backend='numpy_nullable', convert_integer=False)
+    integers = [col for col in df.columns if pd.api.types.is_integer_dtype(df[col].dtype)]
+    return df.astype({col: 'Int64' for col in integers}) if integers else df
+
+
+class SyntheticConnection:
+    """
+    Stand-in for wrds.Connection that runs raw_sql against a local database.
+    
+    Queries are written for PostgreSQL (WRDS); the few constructs used by this
+    project are translated for the local engine: pyformat parameters,
+    `= ANY(array)` and date arithmetic on SQLite, and the reserved column name
+    `at` on DuckDB.
+    Dates come back as datetime.date objects, as from psycopg2, and all other
+    columns with the nullable dtypes of wrds.Connection.raw_sql (see wrds_dtypes).
+    """
+    
+    def __init__(self, secd: pd.DataFrame, funda: pd.DataFrame, backend: Optional[str] = None,
+                 latency: float = 0.0):
+        """
+        Initialize connection.
+        
+        Args:
+            secd: Synthetic comp.g_secd table
+            funda: Synthetic comp.g_funda table
+            backend: 'duckdb' or 'sqlite' (default: duckdb if installed)
+            latency: Seconds added to every query (simulated network round trip)
+        """
+        self.backend = backend or ('duckdb' if duckdb is not None else 'sqlite')
+        self.latency = latency
+        self.queries = 0
+        self.rows = 0
+        self.query_seconds = 0.0
+        self._lock = threading.Lock()
+        
+        if self.backend == 'duckdb':
+            if duckdb is None:
+                raise ImportError("duckdb is required for the duckdb backend (pip install duckdb)")
+            self.db = duckdb.connect()
+            self.db.execute("CREATE SCHEMA comp")
+            for name, table in [('g_secd', secd), ('g_funda', funda)]:
+                self.db.register('_source', table)
+                self.db.execute(f"CREATE TABLE comp.{name} AS SELECT * FROM _source")
+                self.db.unregister('_source')
+            self.db.execute("CREATE TABLE comp.g_company AS SELECT DISTINCT gvkey, conm, fic FROM comp.g_secd")
+        else:
+            self.db = sqlite3.connect(':memory:', check_same_thread=False)
+            self.db.execute("ATTACH DATABASE ':memory:' AS comp")
+            for name, table in [('g_secd', secd), ('g_funda', funda)]:
+                table = table.copy()
+                table['datadate'] = table['datadate'].dt.strftime('%Y-%m-%d')
+                table.to_sql(f"_{name}", self.db, index=False)
+                self.db.execute(f"CREATE TABLE comp.{name} AS SELECT * FROM main._{name}")
+                self.db.execute(f"DROP TABLE main._{name}")
+            self.db.execute("CREATE TABLE comp.g_company AS SELECT DISTINCT gvkey, conm, fic FROM comp.g_secd")
+            self.db.execute("CREATE INDEX comp.g_secd_datadate ON g_secd (datadate)")
+    
+    def raw_sql(self, sql: str, params: Optional[dict] = None, chunksize: Optional[int] = None,
+                return_iter: bool = False, **kwargs):
+        """Run a query; same signature and return types as wrds.Connection.raw_sql."""
+        t0 = time.perf_counter()
+        if self.latency > 0:
+            time.sleep(self.latency)
+        
+        if self.backend == 'duckdb':
+            sql, params = self._translate_duckdb(sql, params or {})
+            df = self.db.cursor().execute(sql, params).df()
+        else:
+            sql, params = self._translate_sqlite(sql, params or {})
+            with self._lock:
+                df = pd.read_sql_query(sql, self.db, params=params)
+        
+        for col in df.columns:
+            if pd.api.types.is_datetime64_any_dtype(df[col]) or \
+                    (self.backend == 'sqlite' and col.endswith('date')):
+                df[col] = pd.to_datetime(df[col]).dt.date
+        
+        with self._lock:
+            self.queries += 1
+            self.rows += len(df)
+            self.query_seconds += time.perf_counter() - t0
+        
+        if return_iter and chunksize:
+            return (wrds_dtypes(df.iloc[i:i + chunksize]) for i in range(0, max(len(df), 1), chunksize))
+        return wrds_dtypes(df)
+    
+    def close(self):
+        pass
+    
+    @staticmethod
+    def _translate_duckdb(sql: str, params: dict) -> Tuple[str, dict]:
+        sql = re.sub(r'%\((\w+)\)s', r'$\1', sql)
+        sql = re.sub(r'(?<![\w."])at(?![\w"])', '"at"', sql)
+        params = {k: list(v) if isinstance(v, (list, tuple)) else v for k, v in params.items()}
+        return sql, {k: v for k, v in params.items() if f"${k}" in sql}
+    
+    @staticmethod
+    def _translate_sqlite(sql: str, params: dict) -> Tuple[str, dict]:
+        expanded = {}
+        
+        def expand(match):
+            name = match.group(1)
+            values = list(params[name])
+            expanded.update({f"{name}_{i}": v for i, v in enumerate(values)})
+            return "IN (" + ", ".join(f":{name}_{i}" for i in range(len(values))) + ")" if values else "IN (NULL)"
+        
+        sql = re.sub(r'=\s*ANY\(%\((\w+)\)s\)', expand, sql)
+        sql = re.sub(r"DATE\s+('[\d-]+')\s*-\s*INTERVAL\s+'(\d+)'\s+DAY", r"date(\1, '-\2 day')", sql)
+        sql = re.sub(r'%\((\w+)\)s', r':\1', sql)
+        sql = re.sub(r"date_trunc\('month',\s*(\w+)\)", r"strftime('%Y-%m', \1)", sql)
+        scalars = {k: v for k, v in params.items() if not isinstance(v, (list, tuple))}
+        return sql, {**scalars, **expanded}
+
+
+class SyntheticECOSServer:
+    """
+    Local HTTP stand-in for the ECOS StatisticSearch API.
+    
+    Serves a synthetic daily 1-year treasury rate series (business days from
+    start_date to end_date) in the ECOS JSON format, honoring the requested row
+    window and date range. Requests can be slowed down and made to fail
+    periodically to exercise pagination, concurrency and retries.
+    
+    Example:
+        >>> with SyntheticECOSServer(fail_every=5) as server:
+        ...     fetcher = KoreaRiskFreeRateFetcher('key', base_url=server.url, backoff=0.01)
+        ...     daily = fetcher.fetch_treasury_1year('20000101', '20241231')
+        ...     print(server.requests, len(daily))
+    """
+    
+    MAX_ROWS = 10000
+    
+    def __init__(self, start_date: str = '19950101', end_date: str = '20251231', latency: float = 0.0,
+                 fail_every: int = 0, seed: int = 0):
+        """
+        Initialize the server (not yet listening).
+        
+        Args:
+            start_date: First day of the series (YYYYMMDD)
+            end_date: Last day of the series (YYYYMMDD)
+            latency: Seconds added to every request
+            fail_every: Answer every n-th request with HTTP 500 (0: never)
+            seed: Random seed of the rate series
+        """
+        rng = np.random.default_rng(seed)
+        days = pd.bdate_range(start_date, end_date)
+        rates = np.clip(3.0 + np.cumsum(rng.normal(0, 0.02, len(days))), 0.1, None)
+        self.series = pd.DataFrame({'TIME': days.strftime('%Y%m%d'), 'DATA_VALUE': np.round(rates, 3).astype(str)})
+        self.latency = latency
+        self.fail_every = fail_every
+        self.requests = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+    
+    @property
+    def url(self) -> str:
+        """API root to pass as KoreaRiskFreeRateFetcher(base_url=...)."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api"
+    
+    def start(self) -> 'SyntheticECOSServer':
+        server = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                status, body = server.respond(self.path)
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+            
+            def log_message(self, *args):
+                pass
+        
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+    
+    def __enter__(self) -> 'SyntheticECOSServer':
+        return self.start()
+    
+    def __exit__(self, *exc):
+        self.stop()
+    
+    def respond(self, path: str) -> Tuple[int, Dict]:
+        """HTTP status and JSON body for a request path."""
+        with self._lock:
+            self.requests += 1
+            fail = self.fail_every > 0 and self.requests % self.fail_every == 0
+            if fail:
+                self.failures += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            return 500, {'RESULT': {'CODE': 'ERROR-500', 'MESSAGE': 'synthetic failure'}}
+        
+        # /api/StatisticSearch/{key}/json/kr/{first}/{last}/{stat}/D/{start}/{end}/{item}
+        parts = path.strip('/').split('/')
+        try:
+            first_row, last_row = int(parts[5]), int(parts[6])
+            start_date, end_date = parts[9], parts[10]
+        except (IndexError, ValueError):
+            return 400, {'RESULT': {'CODE': 'ERROR-100', 'MESSAGE': 'malformed request'}}
+        if last_row - first_row + 1 > self.MAX_ROWS:
+            return 200, {'RESULT': {'CODE': 'ERROR-301', 'MESSAGE': 'too many rows requested'}}
+        
+        rows = self.series[(self.series['TIME'] >= start_date) & (self.series['TIME'] <= end_date)]
+        if len(rows) == 0:
+            return 200, {'RESULT': {'CODE': 'INFO-200', 'MESSAGE': 'no data'}}
+        page = rows.iloc[first_row - 1:last_row]
+        return 200, {'StatisticSearch': {'list_total_count': len(rows), 'row': page.to_dict('records')}}
+
+
+@contextmanager
+def stage_timer() -> Iterator[Dict[str, float]]:
+    """Time the pipeline stages in STAGES (seconds summed over calls and threads)."""
+    timings = {}
+    lock = threading.Lock()
+    
+    def timed(func: Callable, stage: str) -> Callable:
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with lock:
+                    timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - t0
+        return wrapper
+    
+    patches = []
+    for owner, attr, stage in STAGES:
+        original = owner.__dict__[attr]
+        if isinstance(original, classmethod):
+            wrapped = classmethod(timed(original.__func__, stage))
+        else:
+            wrapped = timed(original, stage)
+        patches.append(mock.patch.object(owner, attr, wrapped))
+    
+    for p in patches:
+        p.start()
+    try:
+        yield timings
+    finally:
+        for p in reversed(patches):
+            p.stop()
+
+
+def measure(name: str, func: Callable, conn: SyntheticConnection, memory: bool = True) -> Dict:
+    """
+    Run a benchmark once for timings and (optionally) once more for peak memory.
+    
+    Args:
+        name: Benchmark name
+        func: Callable without arguments running the workload
+        conn: Connection the workload queries (for query and row counts)
+        memory: Also measure peak memory (a second run under tracemalloc)
+    
+    Returns:
+        Dictionary with seconds, stages, queries, query_seconds, rows_fetched,
+        rows_per_sec and peak_mb
+    """
+    queries, rows, query_seconds = conn.queries, conn.rows, conn.query_seconds
+    with stage_timer() as stages:
+        t0 = time.perf_counter()
+        func()
+        seconds = time.perf_counter() - t0
+    
+    result = {
+        'benchmark': name,
+        'seconds': seconds,
+        'stages': {k: round(v, 6) for k, v in stages.items()},
+        'queries': conn.queries - queries,
+        'query_seconds': conn.query_seconds - query_seconds,
+        'rows_fetched': conn.rows - rows,
+        'rows_per_sec': (conn.rows - rows) / seconds if seconds > 0 else float('nan'),
+        'peak_mb': None
+    }
+    
+    if memory:
+        tracemalloc.start()
+        try:
+            func()
+            result['peak_mb'] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        finally:
+            tracemalloc.stop()
+    
+    logger.info(f"{name}: {seconds:.3f}s, {result['queries']} queries, {result['rows_fetched']} rows")
+    return result
+
+
+def run_benchmarks(n_firms: int = 500, years: int = 3, share_class_frac: float = 0.1,
+                   backend: Optional[str] = None, latency: float = 0.0, workers: int = 1,
+                   memory: bool = True, seed: int = 0) -> List[Dict]:
+    """
+    Benchmark calculate_monthly_factors, calculate_factors_for_period and update_factors.
+    
+    The synthetic data spans `years` calendar years; the period benchmarks
+    compute every month of the last year, the single-month benchmark its
+    last month.
+    
+    Args:
+        n_firms: Number of synthetic firms
+        years: Number of calendar years of synthetic prices
+        share_class_frac: Fraction of firms with a second share class
+        backend: Local database engine ('duckdb' or 'sqlite')
+        latency: Seconds added to every query
+        workers: Workers for the parallel period and update benchmarks
+        memory: Also measure peak memory
+        seed: Random seed
+    
+    Returns:
+        List of result dictionaries (see measure)
+    """
+    last_year = 2021
+    secd, funda = generate_compustat(n_firms, f"{last_year - years + 1}-01-01", f"{last_year}-12-31",
+                                     share_class_frac, seed)
+    conn = SyntheticConnection(secd, funda, backend, latency)
+    start_date, end_date = f"{last_year}-01-01", f"{last_year}-12-31"
+    
+    def connection_factory():
+        return conn
+    
+    def update():
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch.object(korea_factor_updater, 'connect_wrds', lambda **kwargs: conn):
+            korea_factor_updater.update_factors(os.path.join(tmp, 'factors.csv'), start_date, end_date,
+                                                workers=workers)
+    
+    benchmarks = [
+        ('calculate_monthly_factors', lambda: KoreaFactorCalculator(conn).calculate_monthly_factors(last_year, 12)),
+        ('calculate_factors_for_period[monthly]',
+         lambda: KoreaFactorCalculator(conn).calculate_factors_for_period(start_date, end_date, workers=workers,
+                                                                          connection_factory=connection_factory)),
+        ('calculate_factors_for_period[pipelined]',
+         lambda: KoreaFactorCalculator(conn).calculate_factors_for_period(start_date, end_date, prefetch=2)),
+        ('calculate_factors_for_period[panel]',
+         lambda: KoreaFactorCalculator(conn).calculate_factors_for_period(start_date, end_date, engine='panel')),
+        ('update_factors', update),
+    ]
+    
+    info = {'firms': n_firms, 'years': years, 'share_class_frac': share_class_frac, 'backend': conn.backend,
+            'latency': latency, 'workers': workers, 'secd_rows': len(secd), 'funda_rows': len(funda)}
+    return [{**info, **measure(name, func, conn, memory)} for name, func in benchmarks]
+
+
+def print_results(results: List[Dict]):
+    """Print benchmark results as a table, followed by per-stage times."""
+    print(f"{'benchmark':<40} {'seconds':>9} {'queries':>8} {'sql s':>8} {'rows':>10} "
+          f"{'rows/s':>11} {'peak MB':>9}")
+    for r in results:
+        peak = f"{r['peak_mb']:.1f}" if r['peak_mb'] is not None else '-'
+        print(f"{r['benchmark']:<40} {r['seconds']:>9.3f} {r['queries']:>8} {r['query_seconds']:>8.3f} "
+              f"{r['rows_fetched']:>10} {r['rows_per_sec']:>11.0f} {peak:>9}")
+    
+    print("\nStages (seconds):")
+    for r in results:
+        stages = ", ".join(f"{k}={v:.3f}" for k, v in sorted(r['stages'].items(), key=lambda kv: -kv[1]))
+        print(f"  {r['benchmark']}: {stages}")
+
+
+def git_revision() -> Optional[str]:
+    """Short hash of the checked-out commit, if running inside a git work tree."""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Benchmark the Korea factor pipeline on synthetic data')
+    parser.add_argument('--firms', type=int, default=500, help='Number of synthetic firms')
+    parser.add_argument('--years', type=int, default=3, help='Years of synthetic daily prices')
+    parser.add_argument('--share-classes', type=float, default=0.1,
+                        help='Fraction of firms with a second share class')
+    parser.add_argument('--backend', type=str, default=None, choices=['duckdb', 'sqlite'],
+                        help='Local database engine (default: duckdb if installed)')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every query')
+    parser.add_argument('--workers', type=int, default=1, help='Workers for the period and update benchmarks')
+    parser.add_argument('--no-memory', action='store_true', help='Skip the peak memory runs')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Append results as JSON lines (e.g. data/benchmarks.jsonl)')
+    args = parser.parse_args()
+    
+    logging.getLogger().setLevel(logging.WARNING)
+    
+    print("="*80)
+    print("Korea Factor Offline Benchmark")
+    print("="*80)
+    
+    results = run_benchmarks(args.firms, args.years, args.share_classes, args.backend, args.latency,
+                             args.workers, not args.no_memory, args.seed)
+    print_results(results)
+    
+    if args.output:
+        revision, timestamp = git_revision(), datetime.now().isoformat(timespec='seconds')
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        with open(args.output, 'a') as f:
+            for r in results:
+                f.write(json.dumps({'revision': revision, 'timestamp': timestamp, **r}) + "\n")
+        print(f"\nAppended {len(results)} results to {args.output}")
+    
+    print("\n✅ Benchmark completed!")
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Korea WRDS Connection Manager
+
+This module wraps the WRDS PostgreSQL database in a pooled SQLAlchemy engine, so
+that long batch jobs share one set of connections, survive network blips and
+report how much time they spend in queries.
+
+- Connections are checked out of a pool per query and pinged on checkout
+  (pool_pre_ping), so a connection dropped by the server is replaced
+  transparently instead of failing the next query.
+- Read-only queries that fail with a disconnect or operational error are retried
+  with exponential backoff; SQL errors are raised immediately.
+- Query counts, retries, reconnects and latencies are kept for reporting.
+
+ManagedConnection has the raw_sql/close interface of wrds.Connection, so it can
+be passed anywhere a WRDS connection is expected (KoreaFactorCalculator,
+korea_ticker_utils, KoreaDataCache, ...). The pooled engine is thread-safe: one
+ManagedConnection can serve all workers of a parallel run.
+"""
+
+import pandas as pd
+import numpy as np
+import sqlalchemy as sa
+import wrds
+from collections import deque
+from typing import Dict, Iterator, Optional, Union
+import logging
+import re
+import threading
+import time
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Errors worth retrying: lost or refused connections, pool timeouts, server restarts
+RETRYABLE_ERRORS = (sa.exc.OperationalError, sa.exc.InterfaceError, sa.exc.DisconnectionError,
+                    sa.exc.TimeoutError)
+
+# Statements safe to run again after a failure
+_READ_ONLY = re.compile(r'^\s*(SELECT|WITH)\b', re.IGNORECASE)
+
+
+class ManagedConnection:
+    """
+    Pooled, self-healing connection with the raw_sql interface of wrds.Connection.
+    
+    Example:
+        >>> conn = connect_wrds(pool_size=4)
+        >>> calculator = KoreaFactorCalculator(conn)
+        >>> factors = calculator.calculate_factors_for_period('2020-10-01', '2020-12-31', workers=4)
+        >>> print(conn.stats())
+        >>> conn.close()
+    """
+    
+    def __init__(self, engine: sa.engine.Engine, max_retries: int = 3, backoff: float = 1.0,
+                 latency_window: int = 10000):
+        """
+        Initialize connection manager.
+        
+        Args:
+            engine: SQLAlchemy engine (see connect_wrds for the WRDS engine)
+            max_retries: Retries of a read-only query after a retryable error
+            backoff: Seconds before the first retry, doubled for every further retry
+            latency_window: Number of most recent query latencies kept for percentiles
+        """
+        self.engine = engine
+        self.max_retries = max_retries
+        self.backoff = backoff
+        
+        self.queries = 0
+        self.errors = 0
+        self.retries = 0
+        self.reconnects = 0
+        self.rows = 0
+        self.query_seconds = 0.0
+        self._latencies = deque(maxlen=latency_window)
+        self._lock = threading.Lock()
+    
+    def raw_sql(self, sql: str, params: Optional[Union[dict, tuple]] = None,
+                chunksize: Optional[int] = 500000, return_iter: bool = False,
+                date_cols=None, index_col=None, coerce_float: bool = True, dtype=None,
+                dtype_backend: str = 'numpy_nullable',
+                idempotent: Optional[bool] = None) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
+        """
+        Run a query on a pooled connection; same arguments and results as wrds.Connection.raw_sql.
+        
+        Args:
+            sql: SQL query (pyformat parameters, e.g. %(gvkeys)s)
+            params: Query parameters
+            chunksize: Rows per chunk when return_iter is True
+            return_iter: Return an iterator of DataFrame chunks (the connection is
+                         held until the iterator is exhausted or closed)
+            date_cols: Columns parsed as dates
+            index_col: Column(s) to use as the index
+            coerce_float: Convert decimals to floats
+            dtype: Column types
+            dtype_backend: Column dtypes ('numpy_nullable' as in wrds.Connection.raw_sql, or 'pyarrow')
+            idempotent: Whether the query may be retried (default: SELECT/WITH queries)
+        
+        Returns:
+            DataFrame, or an iterator of DataFrames if return_iter
+        """
+        read_kwargs = dict(params=params, parse_dates=date_cols, index_col=index_col,
+                           coerce_float=coerce_float, dtype=dtype, dtype_backend=dtype_backend)
+        retry = bool(_READ_ONLY.match(sql)) if idempotent is None else idempotent
+        
+        if return_iter and chunksize:
+            return self._stream(sql, chunksize, read_kwargs, retry)
+        return self._run(lambda connection: pd.read_sql_query(sql, connection, **read_kwargs), retry)
+    
+    def _run(self, read, retry: bool):
+        """Run read(connection) on a pooled connection, retrying retryable errors with backoff."""
+        attempts = self.max_retries + 1 if retry else 1
+        for attempt in range(attempts):
+            t0 = time.perf_counter()
+            try:
+                with self.engine.connect() as connection:
+                    df = read(connection)
+                self._record(time.perf_counter() - t0, len(df))
+                return df
+            except RETRYABLE_ERRORS as e:
+                self._record_error(e, time.perf_counter() - t0)
+                if attempt == attempts - 1:
+                    raise
+                self._wait(attempt, e)
+    
+    def _stream(self, sql: str, chunksize: int, read_kwargs: Dict, retry: bool) -> Iterator[pd.DataFrame]:
+        """
+        Stream chunks of a query on a server-side cursor (stream_results), so only
+        one chunk is held by the client; a failure before the first chunk is
+        retried like _run.
+        """
+        attempts = self.max_retries + 1 if retry else 1
+        for attempt in range(attempts):
+            t0 = time.perf_counter()
+            yielded = False
+            try:
+                with self.engine.connect().execution_options(stream_results=True) as connection:
+                    rows = 0
+                    for chunk in pd.read_sql_query(sql, connection, chunksize=chunksize, **read_kwargs):
+                        rows += len(chunk)
+                        yielded = True
+                        yield chunk
+                self._record(time.perf_counter() - t0, rows)
+                return
+            except RETRYABLE_ERRORS as e:
+                self._record_error(e, time.perf_counter() - t0)
+                # Chunks already handed out cannot be taken back
+                if yielded or attempt == attempts - 1:
+                    raise
+                self._wait(attempt, e)
+    
+    def _record(self, seconds: float, rows: int):
+        with self._lock:
+            self.queries += 1
+            self.rows += rows
+            self.query_seconds += seconds
+            self._latencies.append(seconds)
+    
+    def _record_error(self, error: Exception, seconds: float):
+        with self._lock:
+            self.errors += 1
+            self.query_seconds += seconds
+            if getattr(error, 'connection_invalidated', False) or isinstance(error, sa.exc.DisconnectionError):
+                self.reconnects += 1
+    
+    def _wait(self, attempt: int, error: Exception):
+        delay = self.backoff * 2 ** attempt
+        with self._lock:
+            self.retries += 1
+        logger.warning(f"Query failed ({type(error).__name__}: {str(error).splitlines()[0]}), "
+                       f"retrying in {delay:.1f}s ({attempt + 1}/{self.max_retries})")
+        time.sleep(delay)
+    
+    def ping(self) -> bool:
+        """Check that the database answers, reconnecting if needed (no retries)."""
+        try:
+            with self.engine.connect() as connection:
+                connection.exec_driver_sql('SELECT 1')
+            return True
+        except sa.exc.SQLAlchemyError as e:
+            logger.warning(f"Health check failed: {e}")
+            return False
+    
+    def stats(self) -> Dict[str, float]:
+        """
+        Query statistics since the connection was created.
+        
+        Returns:
+            Dictionary with queries, errors, retries, reconnects, rows,
+            query_seconds and latency percentiles (p50_ms, p95_ms, max_ms) of the
+            most recent successful queries, and pool checkouts in use
+        """
+        with self._lock:
+            latencies = np.array(self._latencies, dtype=float) * 1000
+            stats = {
+                'queries': self.queries,
+                'errors': self.errors,
+                'retries': self.retries,
+                'reconnects': self.reconnects,
+                'rows': self.rows,
+                'query_seconds': self.query_seconds,
+            }
+        stats['p50_ms'] = float(np.percentile(latencies, 50)) if len(latencies) else 0.0
+        stats['p95_ms'] = float(np.percentile(latencies, 95)) if len(latencies) else 0.0
+        stats['max_ms'] = float(latencies.max()) if len(latencies) else 0.0
+        checkedout = getattr(self.engine.pool, 'checkedout', None)
+        stats['pool_checked_out'] = checkedout() if checkedout is not None else 0
+        return stats
+    
+    def close(self):
+        """Log query statistics and dispose of the pool."""
+        stats = self.stats()
+        logger.info(f"WRDS connection: {stats['queries']} queries in {stats['query_seconds']:.2f}s "
+                    f"(p50 {stats['p50_ms']:.0f}ms, p95 {stats['p95_ms']:.0f}ms), "
+                    f"{stats['retries']} retries, {stats['reconnects']} reconnects")
+        self.engine.dispose()
+    
+    def __enter__(self) -> 'ManagedConnection':
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+
+def connect_wrds(pool_size: int = 4, max_overflow: int = 4, pool_recycle: int = 1800,
+                 max_retries: int = 3, backoff: float = 1.0, **wrds_kwargs) -> ManagedConnection:
+    """
+    Open a pooled, self-healing connection to WRDS.
+    
+    Credentials are resolved by wrds.Connection (arguments such as wrds_username,
+    ~/.pgpass or an interactive prompt); its engine settings are then reused for
+    a pooled engine with pre-ping health checks.
+    
+    Args:
+        pool_size: Connections kept open in the pool (e.g. the number of workers)
+        max_overflow: Extra connections opened under load beyond pool_size
+        pool_recycle: Seconds after which a pooled connection is replaced
+        max_retries: Retries of a read-only query after a retryable error
+        backoff: Seconds before the first retry, doubled for every further retry
+        **wrds_kwargs: Passed to wrds.Connection (e.g. wrds_username)
+    
+    Returns:
+        ManagedConnection
+    """
+    db = wrds.Connection(autoconnect=False, **wrds_kwargs)
+    db.connect()
+    url = db.engine.url
+    connect_args = getattr(db, '_connect_args', {})
+    db.close()
+    
+    engine = sa.create_engine(url, isolation_level='AUTOCOMMIT', connect_args=connect_args,
+                              pool_size=pool_size, max_overflow=max_overflow, pool_recycle=pool_recycle,
+                              pool_pre_ping=True)
+    logger.info(f"Connected to WRDS ({url.host}) with a pool of {pool_size}+{max_overflow} connections")
+    return ManagedConnection(engine, max_retries=max_retries, backoff=backoff)
+
+
+if __name__ == "__main__":
+    print("="*80)
+    print("Korea WRDS Connection Manager")
+    print("="*80)
+    
+    with connect_wrds(pool_size=2) as conn:
+        print(f"\nHealth check: {'ok' if conn.ping() else 'failed'}")
+        df = conn.raw_sql("SELECT COUNT(DISTINCT gvkey) AS n FROM comp.g_secd WHERE fic = 'KOR' "
+                          "AND datadate = (SELECT MAX(datadate) FROM comp.g_secd WHERE fic = 'KOR')")
+        print(f"Korean securities on the latest trading day: {df['n'].iloc[0]}")
+        print(f"\nStats: {conn.stats()}")
+    
+    print("\n✅ Completed!")
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Korea Compustat Global Local Cache
+
+This module keeps a local Parquet copy of the Korean rows of WRDS Compustat Global,
+so that reruns and backtests read history from disk instead of re-querying WRDS.
+
+Layout:
+    <cache_dir>/g_secd/month=YYYY-MM.parquet   # daily security data, one file per month
+    <cache_dir>/g_funda/fyear=YYYY.parquet     # annual fundamentals, one file per fiscal year
+    <cache_dir>/g_company/all.parquet          # company names
+    <cache_dir>/manifest.json                  # fetch time of every partition
+
+Only partitions that are missing or stale are fetched. A partition is stale while
+it may still change on WRDS: a g_secd month until `secd_settle_days` after the
+month ends, a g_funda fiscal year until `funda_settle_days` after it ends
+(annual reports and restatements arrive late). Company names are refetched
+after `company_refresh_days`. A partition fetched by a cache object stays fresh
+for the rest of that object's life, so a run fetches unsettled partitions once.
+
+A cache object can be shared by threads: checking and fetching partitions and
+writing the manifest are serialized, and every writer uses its own temp files.
+"""
+
+import pandas as pd
+import wrds
+from typing import Dict, List, Optional, Set, Tuple
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+
+try:
+    import pyarrow  # noqa: F401
+except ImportError:
+    pyarrow = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SECD_COLUMNS = ['gvkey', 'iid', 'conm', 'datadate', 'prccd', 'ajexdi', 'cshoc', 'trfd', 'market_cap']
+FUNDA_COLUMNS = ['gvkey', 'fyear', 'datadate', 'ceq', 'at', 'revt', 'cogs', 'xsga', 'xint']
+COMPANY_COLUMNS = ['gvkey', 'conm']
+
+
+class KoreaDataCache:
+    """
+    Local Parquet cache of comp.g_secd (by month) and comp.g_funda (by fiscal year).
+    
+    Without a connection the cache runs offline and serves whatever is on disk.
+    """
+    
+    def __init__(self, cache_dir: str = 'data/cache', conn: Optional[wrds.Connection] = None,
+                 secd_settle_days: int = 7, funda_settle_days: int = 550,
+                 company_refresh_days: int = 30):
+        """
+        Initialize cache.
+        
+        Args:
+            cache_dir: Root directory of the cache
+            conn: WRDS connection object used to fill missing partitions (None: offline)
+            secd_settle_days: Days after month end before a g_secd month is final
+            funda_settle_days: Days after fiscal year end before a g_funda year is final
+            company_refresh_days: Days after which company names are fetched again
+        """
+        if pyarrow is None:
+            raise ImportError("pyarrow is required for KoreaDataCache (pip install pyarrow)")
+        
+        self.cache_dir = cache_dir
+        self.conn = conn
+        self.secd_settle_days = secd_settle_days
+        self.funda_settle_days = funda_settle_days
+        self.company_refresh_days = company_refresh_days
+        self.manifest_path = os.path.join(cache_dir, 'manifest.json')
+        self.manifest = self._load_manifest()
+        self._fetched: Set[Tuple[str, str]] = set()
+        self._lock = threading.RLock()
+        
+        os.makedirs(os.path.join(cache_dir, 'g_secd'), exist_ok=True)
+        os.makedirs(os.path.join(cache_dir, 'g_funda'), exist_ok=True)
+        os.makedirs(os.path.join(cache_dir, 'g_company'), exist_ok=True)
+    
+    @property
+    def offline(self) -> bool:
+        """True when the cache has no connection to fill missing partitions."""
+        return self.conn is None
+    
+    def secd(self, start_date: str, end_date: str) -> pd.DataFrame:
+        """
+        Get cached daily security data for Korean stocks.
+        
+        Args:
+            start_date: Start date in 'YYYY-MM-DD' format
+            end_date: End date in 'YYYY-MM-DD' format
+        
+        Returns:
+            DataFrame with columns: gvkey, iid, conm, datadate, prccd, ajexdi, cshoc, trfd,
+            market_cap (rows with prccd present only; trfd is missing in partitions
+            cached before it was added)
+        """
+        months = [p.strftime('%Y-%m') for p in pd.period_range(start_date, end_date, freq='M')]
+        self._refresh('g_secd', months)
+        
+        df = self._read('g_secd', [f"month={m}" for m in months], SECD_COLUMNS)
+        mask = (df['datadate'] >= pd.Timestamp(start_date)) & (df['datadate'] <= pd.Timestamp(end_date))
+        return df[mask].reset_index(drop=True)
+    
+    def funda(self, start_date: str, end_date: str) -> pd.DataFrame:
+        """
+        Get cached annual fundamentals for Korean firms with datadate in a range.
+        
+        Args:
+            start_date: Start date in 'YYYY-MM-DD' format
+            end_date: End date in 'YYYY-MM-DD' format
+        
+        Returns:
+            DataFrame with columns: gvkey, fyear, datadate, ceq, at
+        """
+        # Fiscal years ending Jan-May belong to the previous fyear
+        years = [str(y) for y in range(int(start_date[:4]) - 1, int(end_date[:4]) + 1)]
+        self._refresh('g_funda', years)
+        
+        df = self._read('g_funda', [f"fyear={y}" for y in years], FUNDA_COLUMNS)
+        mask = (df['datadate'] >= pd.Timestamp(start_date)) & (df['datadate'] <= pd.Timestamp(end_date))
+        return df[mask].reset_index(drop=True)
+    
+    def company(self) -> pd.DataFrame:
+        """
+        Get cached company names of Korean firms (comp.g_company).
+        
+        Returns:
+            DataFrame with columns: gvkey, conm
+        """
+        self._refresh('g_company', ['all'])
+        return self._read('g_company', ['all'], COMPANY_COLUMNS)
+    
+    def refresh(self, start_date: str, end_date: str):
+        """Fetch every missing or stale g_secd and g_funda partition of a date range."""
+        self.refresh_secd(start_date, end_date)
+        self.refresh_funda(start_date, end_date)
+    
+    def refresh_secd(self, start_date: str, end_date: str):
+        """Fetch missing or stale g_secd months of a date range."""
+        self._refresh('g_secd', [p.strftime('%Y-%m') for p in pd.period_range(start_date, end_date, freq='M')])
+    
+    def refresh_funda(self, start_date: str, end_date: str):
+        """Fetch missing or stale g_funda fiscal years covering a datadate range."""
+        self._refresh('g_funda', [str(y) for y in range(int(start_date[:4]) - 1, int(end_date[:4]) + 1)])
+    
+    def is_stale(self, table: str, key: str) -> bool:
+        """Whether a partition is missing or unsettled (partitions fetched by this cache stay fresh)."""
+        fetched = self.manifest.get(table, {}).get(key)
+        if fetched is None or not os.path.exists(self._path(table, key)):
+            return True
+        if (table, key) in self._fetched:
+            return False
+        
+        if table == 'g_company':
+            return pd.Timestamp(fetched) < pd.Timestamp.now() - pd.Timedelta(days=self.company_refresh_days)
+        if table == 'g_secd':
+            settled = pd.Period(key, freq='M').end_time + pd.Timedelta(days=self.secd_settle_days)
+        else:
+            settled = pd.Timestamp(f"{key}-12-31") + pd.Timedelta(days=self.funda_settle_days)
+        return pd.Timestamp(fetched) < settled
+    
+    def _refresh(self, table: str, keys: List[str]):
+        """Fetch stale partitions, one query per contiguous run of keys."""
+        # Threads needing the same partitions wait for one fetch instead of repeating it
+        with self._lock:
+            stale = [k for k in keys if self.is_stale(table, k)]
+            if len(stale) == 0:
+                return
+            
+            if self.offline:
+                missing = [k for k in stale if not os.path.exists(self._path(table, k))]
+                if missing:
+                    logger.warning(f"Offline: {len(missing)} {table} partitions not cached "
+                                   f"({missing[0]}..{missing[-1]})")
+                return
+            
+            for run in self._contiguous_runs(table, stale):
+                self._fetch(table, run)
+    
+    def _fetch(self, table: str, keys: List[str]):
+        """Download a contiguous run of partitions and write one file per partition."""
+        logger.info(f"Fetching {table} partitions {keys[0]} to {keys[-1]}")
+        fetched_at = datetime.now().isoformat(timespec='seconds')
+        
+        if table == 'g_secd':
+            start = pd.Period(keys[0], freq='M').start_time.strftime('%Y-%m-%d')
+            end = pd.Period(keys[-1], freq='M').end_time.strftime('%Y-%m-%d')
+            query = f"""
+            SELECT gvkey, iid, conm, datadate,
+                   prccd, ajexdi, cshoc, trfd,
+                   (prccd / ajexdi * cshoc) as market_cap
+            FROM comp.g_secd
+            WHERE fic = 'KOR'
+            AND datadate BETWEEN '{start}' AND '{end}'
+            AND prccd IS NOT NULL
+            """
+        elif table == 'g_funda':
+            query = f"""
+            SELECT gvkey, fyear, datadate, ceq, at, revt, cogs, xsga, xint
+            FROM comp.g_funda
+            WHERE fic = 'KOR'
+            AND fyear BETWEEN {keys[0]} AND {keys[-1]}
+            """
+        else:
+            query = """
+            SELECT gvkey, conm
+            FROM comp.g_company
+            WHERE fic = 'KOR'
+            """
+        
+        df = self.conn.raw_sql(query)
+        if 'datadate' in df.columns:
+            df['datadate'] = pd.to_datetime(df['datadate'])
+        logger.info(f"Retrieved {len(df)} {table} records")
+        
+        if table == 'g_company':
+            partition = pd.Series('all', index=df.index)
+        elif table == 'g_secd':
+            partition = df['datadate'].dt.strftime('%Y-%m')
+        else:
+            partition = df['fyear'].astype('Int64').astype(str)
+        
+        groups = dict(tuple(df.groupby(partition)))
+        for key in keys:
+            part = groups.get(key, df.iloc[0:0])
+            self._write(self._path(table, key), part.reset_index(drop=True))
+            self.manifest.setdefault(table, {})[key] = fetched_at
+            self._fetched.add((table, key))
+        self._save_manifest()
+    
+    def _read(self, table: str, partitions: List[str], columns: List[str]) -> pd.DataFrame:
+        """Read and concatenate partition files that exist on disk."""
+        paths = [os.path.join(self.cache_dir, table, f"{p}.parquet") for p in partitions]
+        frames = [pd.read_parquet(path) for path in paths if os.path.exists(path)]
+        frames = [f for f in frames if len(f) > 0]
+        if len(frames) == 0:
+            return pd.DataFrame({c: pd.Series(dtype='datetime64[ns]' if c == 'datadate' else 'object')
+                                 for c in columns})
+        return pd.concat(frames, ignore_index=True)
+    
+    def _path(self, table: str, key: str) -> str:
+        if table == 'g_company':
+            return os.path.join(self.cache_dir, table, f"{key}.parquet")
+        prefix = 'month' if table == 'g_secd' else 'fyear'
+        return os.path.join(self.cache_dir, table, f"{prefix}={key}.parquet")
+    
+    @staticmethod
+    def _contiguous_runs(table: str, keys: List[str]) -> List[List[str]]:
+        """Split sorted partition keys into runs of consecutive months/years."""
+        if table == 'g_company':
+            return [keys]
+        if table == 'g_secd':
+            ordinals = [pd.Period(k, freq='M').ordinal for k in keys]
+        else:
+            ordinals = [int(k) for k in keys]
+        
+        runs = [[keys[0]]]
+        for prev, cur, key in zip(ordinals, ordinals[1:], keys[1:]):
+            if cur == prev + 1:
+                runs[-1].append(key)
+            else:
+                runs.append([key])
+        return runs
+    
+    @staticmethod
+    def _write(path: str, df: pd.DataFrame):
+        """Write a partition atomically (temp file of this writer, then rename)."""
+        tmp_path = _tmp_path(path)
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    
+    def _load_manifest(self) -> Dict[str, Dict[str, str]]:
+        try:
+            with open(self.manifest_path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+    
+    def _save_manifest(self):
+        with self._lock:
+            tmp_path = _tmp_path(self.manifest_path)
+            with open(tmp_path, 'w') as f:
+                json.dump(self.manifest, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.manifest_path)
+
+
+def _tmp_path(path: str) -> str:
+    """Temp file of path unique to the writing process and thread."""
+    return f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Fill the local Compustat Global Korea cache')
+    parser.add_argument('--cache-dir', type=str, default='data/cache', help='Cache directory')
+    parser.add_argument('--start-date', type=str, default='2020-10-01', help='Start date (YYYY-MM-DD)')
+    parser.add_argument('--end-date', type=str, default=datetime.today().strftime('%Y-%m-%d'),
+                        help='End date (YYYY-MM-DD)')
+    args = parser.parse_args()
+    
+    from korea_connection import connect_wrds
+    
+    conn = connect_wrds()
+    cache = KoreaDataCache(args.cache_dir, conn)
+    cache.refresh(args.start_date, args.end_date)
+    conn.close()
+    
+    print("\n✅ Cache is up to date!")
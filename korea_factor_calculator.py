@@ -9,15 +9,91 @@ following the methodology of Fama and French (1993).
 import pandas as pd
 import numpy as np
 import wrds
-from typing import Dict, List, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
-from korea_ticker_utils import get_korea_all_stocks, get_korea_stock_prices
+from korea_ticker_utils import get_korea_all_stocks, get_korea_month_end_prices, get_korea_price_panel
+from korea_data_cache import KoreaDataCache
+from korea_portfolio_utils import value_weighted_returns, value_weights
+from korea_trading_calendar import KoreaTradingCalendar
+from korea_fundamentals import KoreaFundamentalsStore
+from korea_metrics import PipelineMetrics, null_metrics
+from korea_connection import ManagedConnection, connect_wrds
+from korea_factor_store import open_factor_store
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Minimum number of stocks with book-to-market needed to form portfolios
+MIN_STOCKS = 100
+
+# 2x3 portfolio names, in the order of assign_portfolios' category codes
+PORTFOLIOS = ['S/L', 'S/M', 'S/H', 'B/L', 'B/M', 'B/H']
+
+# Portfolios of stock holdings rows (see korea_holdings): the six portfolios and the market
+HOLDINGS_PORTFOLIOS = PORTFOLIOS + ['MKT']
+
+# Months between portfolio formations for each rebalancing frequency
+REBALANCE_MONTHS = {'monthly': 1, 'quarterly': 3, 'annual': 12}
+
+
+def formation_target_date(year: int, month: int) -> str:
+    """Target portfolio formation date for a return month ('YYYY-MM-DD')."""
+    return (datetime(year, month, 1) - relativedelta(months=1)).strftime('%Y-%m-%d')
+
+
+def holding_start(year: int, month: int, rebalance: str = 'monthly',
+                  rebalance_month: int = 6) -> Tuple[int, int]:
+    """
+    First return month of the holding period a return month belongs to.
+    
+    Portfolios are formed in a rebalance month (the month of the formation
+    target date) and held from the next month until the next rebalance. With
+    annual rebalancing in June, the return months July through June share the
+    portfolios formed in June; quarterly rebalancing forms them every third
+    month counted from rebalance_month.
+    
+    Args:
+        year: Year of the return month
+        month: Return month (1-12)
+        rebalance: 'monthly', 'quarterly' or 'annual'
+        rebalance_month: Formation month of annual (and anchor of quarterly) rebalancing
+    
+    Returns:
+        (year, month) of the first return month of the holding period; its
+        formation_target_date is the formation target of the return month
+    """
+    if rebalance not in REBALANCE_MONTHS:
+        raise ValueError(f"Unknown rebalancing frequency: {rebalance}")
+    formation_month = pd.Period(year=year, month=month, freq='M') - 1
+    formation_month -= (formation_month.month - rebalance_month) % REBALANCE_MONTHS[rebalance]
+    first = formation_month + 1
+    return first.year, first.month
+
+
+def month_end_date(year: int, month: int) -> str:
+    """Last calendar day of a month ('YYYY-MM-DD')."""
+    return (datetime(year, month, 1) + relativedelta(months=1) - relativedelta(days=1)).strftime('%Y-%m-%d')
+
+
+def month_range(start_date: str, end_date: str) -> List[Tuple[int, int]]:
+    """List of (year, month) tuples from start_date to end_date, inclusive."""
+    start = datetime.strptime(start_date, '%Y-%m-%d')
+    end = datetime.strptime(end_date, '%Y-%m-%d')
+    
+    months = []
+    current = start
+    while current <= end:
+        months.append((current.year, current.month))
+        current = current + relativedelta(months=1)
+    
+    return months
+
 
 class KoreaFactorCalculator:
     """
@@ -30,19 +106,62 @@ class KoreaFactorCalculator:
     - SMB = (S/L + S/M + S/H)/3 - (B/L + B/M + B/H)/3
     - HML = (S/L + B/L)/2 - (S/H + B/H)/2
     - MKT = Value-weighted market return - RF
+    - Rebalancing: monthly (default), quarterly or annual (e.g. in June as in
+      Fama-French 1993); portfolios are held until the next rebalance
     """
     
-    def __init__(self, conn: wrds.Connection, risk_free_rate: float = 0.01/12):
+    def __init__(self, conn: Optional[wrds.Connection], risk_free_rate: float = 0.01/12,
+                 cache: Optional[KoreaDataCache] = None,
+                 calendar: Optional[KoreaTradingCalendar] = None,
+                 fundamentals: Optional[KoreaFundamentalsStore] = None,
+                 reporting_lag_months: int = 0,
+                 metrics_file: Optional[str] = None,
+                 rebalance: str = 'monthly',
+                 rebalance_month: int = 6):
         """
         Initialize calculator.
         
         Args:
-            conn: WRDS connection object
+            conn: WRDS connection object (may be None when running offline from a cache)
             risk_free_rate: Monthly risk-free rate (default: 1% annual / 12)
+            cache: Local data cache used instead of live WRDS queries
+            calendar: Trading calendar used instead of per-month trading day queries
+            fundamentals: Point-in-time book equity store used instead of per-month queries
+            reporting_lag_months: Months after fiscal year end before book equity is used
+            metrics_file: JSON lines file the metrics of every calculated month are appended to
+            rebalance: Portfolio rebalancing frequency: 'monthly', 'quarterly' or 'annual'
+            rebalance_month: Formation month of annual rebalancing (default: June), also
+                             the anchor of quarterly rebalancing
         """
+        if conn is None and cache is None:
+            raise ValueError("Either a WRDS connection or a data cache is required")
+        if rebalance not in REBALANCE_MONTHS:
+            raise ValueError(f"Unknown rebalancing frequency: {rebalance}")
+        
         self.conn = conn
         self.risk_free_rate = risk_free_rate
-        logger.info(f"Initialized KoreaFactorCalculator with RF={risk_free_rate*12*100:.2f}% annual")
+        self.cache = cache
+        self.calendar = calendar
+        self.fundamentals = fundamentals
+        self.reporting_lag_months = reporting_lag_months
+        self.metrics_file = metrics_file
+        self.month_metrics: Dict[Tuple[int, int], PipelineMetrics] = {}
+        self.rebalance = rebalance
+        self.rebalance_month = rebalance_month
+        
+        # Portfolio assignments per holding period (first return month), None if too few stocks
+        self.membership: Dict[Tuple[int, int], Optional[pd.DataFrame]] = {}
+        self._membership_locks: Dict[Tuple[int, int], threading.Lock] = {}
+        self._membership_lock = threading.Lock()
+        
+        # Stock holdings (see korea_holdings) of every calculated return month
+        self.holdings: Dict[Tuple[int, int], pd.DataFrame] = {}
+        logger.info(f"Initialized KoreaFactorCalculator with RF={risk_free_rate*12*100:.2f}% annual, "
+                    f"{rebalance} rebalancing")
+    
+    def formation_target(self, year: int, month: int) -> str:
+        """Formation target date of a return month under the rebalancing frequency."""
+        return formation_target_date(*holding_start(year, month, self.rebalance, self.rebalance_month))
     
     def find_previous_trading_day(self, target_date: str, max_days_back: int = 10) -> str:
         """
@@ -55,18 +174,27 @@ class KoreaFactorCalculator:
         Returns:
             Date string of previous trading day with data
         """
-        query = f"""
-        SELECT DISTINCT datadate
-        FROM comp.g_secd
-        WHERE fic = 'KOR'
-        AND datadate <= '{target_date}'
-        AND datadate >= DATE '{target_date}' - INTERVAL '{max_days_back}' DAY
-        AND prccd IS NOT NULL
-        ORDER BY datadate DESC
-        LIMIT 1
-        """
+        if self.calendar is not None and self.calendar.covers(target_date):
+            trading_day = self.calendar.previous_trading_day(target_date, max_days_back)
+            result = pd.DataFrame({'datadate': [trading_day] if trading_day is not None else []})
+        elif self.cache is not None:
+            window_start = (pd.Timestamp(target_date) - pd.Timedelta(days=max_days_back)).strftime('%Y-%m-%d')
+            dates = self.cache.secd(window_start, target_date)['datadate']
+            result = pd.DataFrame({'datadate': sorted(dates.unique(), reverse=True)[:1]})
+        else:
+            query = f"""
+            SELECT DISTINCT datadate
+            FROM comp.g_secd
+            WHERE fic = 'KOR'
+            AND datadate <= '{target_date}'
+            AND datadate >= DATE '{target_date}' - INTERVAL '{max_days_back}' DAY
+            AND prccd IS NOT NULL
+            ORDER BY datadate DESC
+            LIMIT 1
+            """
+            
+            result = self.conn.raw_sql(query)
         
-        result = self.conn.raw_sql(query)
         if len(result) > 0:
             trading_day = str(result['datadate'].iloc[0])[:10]
             logger.info(f"Found trading day: {trading_day} for target: {target_date}")
@@ -75,61 +203,123 @@ class KoreaFactorCalculator:
             logger.warning(f"No trading day found near {target_date}")
             return target_date
     
-    def form_portfolios(self, stocks_df: pd.DataFrame) -> Dict[str, List[str]]:
+    def load_calendar(self, start_date: str, end_date: str, max_days_back: int = 10,
+                      cache_file: Optional[str] = None) -> KoreaTradingCalendar:
         """
-        Form 6 portfolios based on size and value (2x3 sort).
+        Load the trading calendar needed for the return months of a period.
+        
+        Args:
+            start_date: Start date in 'YYYY-MM-DD' format
+            end_date: End date in 'YYYY-MM-DD' format
+            max_days_back: Maximum days to search backwards for a formation day
+            cache_file: Optional CSV file to reuse/save the calendar
+        
+        Returns:
+            The calendar, also kept on the calculator
+        """
+        months = month_range(start_date, end_date)
+        calendar_start = (pd.Timestamp(self.formation_target(*months[0])) -
+                          pd.Timedelta(days=max_days_back)).strftime('%Y-%m-%d')
+        calendar_end = month_end_date(*months[-1])
+        
+        self.calendar = KoreaTradingCalendar.load(self.conn, calendar_start, calendar_end,
+                                                  cache=self.cache, cache_file=cache_file)
+        return self.calendar
+    
+    def load_fundamentals(self, start_date: str, end_date: str,
+                          max_days_back: int = 10) -> KoreaFundamentalsStore:
+        """
+        Load the point-in-time book equity needed for the return months of a period.
+        
+        Args:
+            start_date: Start date in 'YYYY-MM-DD' format
+            end_date: End date in 'YYYY-MM-DD' format
+            max_days_back: Maximum days to search backwards for a formation day
+        
+        Returns:
+            The store, also kept on the calculator
+        """
+        months = month_range(start_date, end_date)
+        first_formation = (pd.Timestamp(self.formation_target(*months[0])) -
+                           pd.Timedelta(days=max_days_back)).strftime('%Y-%m-%d')
+        
+        self.fundamentals = KoreaFundamentalsStore.load(self.conn, first_formation,
+                                                        self.formation_target(*months[-1]),
+                                                        cache=self.cache,
+                                                        reporting_lag_months=self.reporting_lag_months)
+        return self.fundamentals
+    
+    def formation_fundamentals(self, formation_date: str) -> KoreaFundamentalsStore:
+        """Fundamentals store covering a formation date (loaded for it if necessary)."""
+        if self.fundamentals is not None and self.fundamentals.covers(formation_date):
+            return self.fundamentals
+        return KoreaFundamentalsStore.load(self.conn, formation_date, formation_date, cache=self.cache,
+                                           reporting_lag_months=self.reporting_lag_months)
+    
+    def assign_portfolios(self, stocks_df: pd.DataFrame, by: Optional[str] = None) -> pd.DataFrame:
+        """
+        Label every stock with its size/value portfolio (2x3 sort).
+        
+        Breakpoints are compared against whole columns at once, so the cost does
+        not grow with a per-stock Python loop.
         
         Args:
             stocks_df: DataFrame with gvkey, market_cap, book_to_market
+            by: Optional column (e.g. 'month') to compute breakpoints within each group
         
         Returns:
-            Dictionary with portfolio names as keys, list of gvkeys as values
+            Copy of stocks_df with categorical 'size' (S/B), 'value' (L/M/H) and
+            'portfolio' (S/L ... B/H) columns
         """
-        # Size breakpoint: median
-        size_median = stocks_df['market_cap'].median()
-        
-        # Value breakpoints: 30th and 70th percentile
-        bm_30 = stocks_df['book_to_market'].quantile(0.30)
-        bm_70 = stocks_df['book_to_market'].quantile(0.70)
-        
-        logger.info(f"Size median: {size_median/1e12:.2f}T KRW")
-        logger.info(f"B/M 30th percentile: {bm_30:.6f}")
-        logger.info(f"B/M 70th percentile: {bm_70:.6f}")
-        
-        # Assign stocks to portfolios
-        portfolios = {
-            'S/L': [],  # Small Value
-            'S/M': [],  # Small Neutral
-            'S/H': [],  # Small Growth
-            'B/L': [],  # Big Value
-            'B/M': [],  # Big Neutral
-            'B/H': []   # Big Growth
-        }
+        df = stocks_df.copy()
         
-        for _, stock in stocks_df.iterrows():
-            gvkey = stock['gvkey']
-            mc = stock['market_cap']
-            bm = stock['book_to_market']
-            
-            # Determine size category
-            size_cat = 'S' if mc <= size_median else 'B'
+        # Size breakpoint: median; value breakpoints: 30th and 70th percentile
+        if by is None:
+            size_median = df['market_cap'].median()
+            bm_30 = df['book_to_market'].quantile(0.30)
+            bm_70 = df['book_to_market'].quantile(0.70)
             
-            # Determine value category
-            if bm <= bm_30:
-                value_cat = 'H'  # Growth (High B/M is actually low, confusing naming)
-            elif bm >= bm_70:
-                value_cat = 'L'  # Value (Low B/M is actually high)
-            else:
-                value_cat = 'M'  # Neutral
-            
-            portfolio_name = f"{size_cat}/{value_cat}"
-            portfolios[portfolio_name].append(gvkey)
+            logger.info(f"Size median: {size_median/1e12:.2f}T KRW")
+            logger.info(f"B/M 30th percentile: {bm_30:.6f}")
+            logger.info(f"B/M 70th percentile: {bm_70:.6f}")
+        else:
+            groups = df.groupby(by)
+            size_median = groups['market_cap'].transform('median')
+            bm_30 = groups['book_to_market'].transform(lambda x: x.quantile(0.30))
+            bm_70 = groups['book_to_market'].transform(lambda x: x.quantile(0.70))
+        
+        mc = df['market_cap'].to_numpy(dtype=float, na_value=np.nan)
+        bm = df['book_to_market'].to_numpy(dtype=float, na_value=np.nan)
         
-        # Log portfolio sizes
-        for name, stocks in portfolios.items():
-            logger.info(f"Portfolio {name}: {len(stocks)} stocks")
+        # Codes: size S=0, B=1; value L=0, M=1, H=2 (B/M at or below the 30th
+        # percentile is labelled H and at or above the 70th L, as before)
+        size_code = np.where(mc <= np.asarray(size_median, dtype=float), 0, 1)
+        value_code = np.where(bm <= np.asarray(bm_30, dtype=float), 2,
+                              np.where(bm >= np.asarray(bm_70, dtype=float), 0, 1))
         
-        return portfolios
+        df['size'] = pd.Categorical.from_codes(size_code, categories=['S', 'B'])
+        df['value'] = pd.Categorical.from_codes(value_code, categories=['L', 'M', 'H'])
+        df['portfolio'] = pd.Categorical.from_codes(size_code * 3 + value_code, categories=PORTFOLIOS)
+        
+        if by is None:
+            for name, count in df['portfolio'].value_counts(sort=False).items():
+                logger.info(f"Portfolio {name}: {count} stocks")
+        
+        return df
+    
+    def form_portfolios(self, stocks_df: pd.DataFrame) -> Dict[str, List[str]]:
+        """
+        Form 6 portfolios based on size and value (2x3 sort).
+        
+        Args:
+            stocks_df: DataFrame with gvkey, market_cap, book_to_market
+        
+        Returns:
+            Dictionary with portfolio names as keys, list of gvkeys as values
+        """
+        labeled = self.assign_portfolios(stocks_df)
+        grouped = labeled.groupby('portfolio', observed=False)['gvkey']
+        return {name: list(gvkeys) for name, gvkeys in grouped}
     
     def calculate_portfolio_return(self, portfolio_gvkeys: List[str], 
                                    returns_df: pd.DataFrame) -> float:
@@ -141,35 +331,144 @@ class KoreaFactorCalculator:
             returns_df: DataFrame with gvkey, monthly_return, market_cap
         
         Returns:
-            Portfolio return (float)
+            Portfolio return (NaN if the portfolio has no valid returns or no market cap)
+        """
+        portfolio_data = returns_df[returns_df['gvkey'].isin(portfolio_gvkeys)].assign(portfolio='P')
+        ret = value_weighted_returns(portfolio_data, 'portfolio', groups=['P']).loc['P', 'return']
+        
+        if np.isnan(ret):
+            logger.warning("Empty portfolio or zero market cap, returning NaN")
+        
+        return ret
+    
+    def calculate_portfolio_returns(self, stocks_df: pd.DataFrame,
+                                    returns_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Calculate value-weighted returns of the six portfolios and the market in one pass.
+        
+        A gvkey belongs to every portfolio any of its share classes was sorted
+        into, and all of its share classes' returns count in those portfolios.
+        The market ('MKT') counts every return row once.
+        
+        Args:
+            stocks_df: Output of assign_portfolios (gvkey, portfolio)
+            returns_df: DataFrame with gvkey, monthly_return, market_cap
+        
+        Returns:
+            DataFrame indexed by S/L ... B/H and MKT with columns: return, total_cap,
+            n_stocks (return is NaN for an empty portfolio)
+        """
+        members = self.portfolio_members(stocks_df, returns_df)
+        return value_weighted_returns(members, 'portfolio', groups=PORTFOLIOS, total='MKT')
+    
+    def portfolio_members(self, stocks_df: pd.DataFrame, returns_df: pd.DataFrame) -> pd.DataFrame:
+        """Return rows joined to every portfolio their gvkey belongs to (index of returns_df kept)."""
+        membership = stocks_df[['gvkey', 'portfolio']].drop_duplicates().set_index('gvkey')
+        return returns_df.join(membership, on='gvkey', how='inner')
+    
+    def stock_holdings(self, members: pd.DataFrame, market: pd.DataFrame) -> pd.DataFrame:
         """
-        # Filter to portfolio stocks
-        portfolio_data = returns_df[returns_df['gvkey'].isin(portfolio_gvkeys)].copy()
+        Stock-level holdings of the six portfolios and the market.
         
-        if len(portfolio_data) == 0:
-            logger.warning("Empty portfolio, returning 0")
-            return 0.0
+        Weights are those of value_weighted_returns, so each portfolio's return
+        is the sum of weight * return over its rows.
+        
+        Args:
+            members: Return rows with month, gvkey, iid, portfolio, monthly_return, market_cap
+            market: Return rows of the market, each security once (same columns but portfolio)
+        
+        Returns:
+            DataFrame with date (month end), gvkey, iid, portfolio, weight and
+            return (in %), portfolio rows before market rows
+        """
+        months = np.concatenate([members['month'].to_numpy(), market['month'].to_numpy()])
+        portfolio = np.concatenate([
+            pd.Categorical(members['portfolio'], categories=HOLDINGS_PORTFOLIOS).codes,
+            np.full(len(market), HOLDINGS_PORTFOLIOS.index('MKT'), dtype=np.int8)
+        ])
         
-        # Remove stocks with missing returns
-        portfolio_data = portfolio_data[portfolio_data['monthly_return'].notna()]
+        return pd.DataFrame({
+            'date': pd.PeriodIndex(months, freq='M').to_timestamp(how='end').normalize(),
+            'gvkey': pd.Categorical(np.concatenate([members['gvkey'].astype(str), market['gvkey'].astype(str)])),
+            'iid': pd.Categorical(np.concatenate([members['iid'].astype(str), market['iid'].astype(str)])),
+            'portfolio': pd.Categorical.from_codes(portfolio, categories=HOLDINGS_PORTFOLIOS),
+            'weight': np.concatenate([value_weights(members, ['month', 'portfolio']), value_weights(market, 'month')]),
+            'return': np.concatenate([members['monthly_return'].to_numpy(dtype=float),
+                                      market['monthly_return'].to_numpy(dtype=float)]) * 100
+        })
+    
+    def collected_holdings(self) -> pd.DataFrame:
+        """Holdings of all months calculated so far, sorted by date."""
+        if len(self.holdings) == 0:
+            return pd.DataFrame(columns=['date', 'gvkey', 'iid', 'portfolio', 'weight', 'return'])
+        frames = [self.holdings[key] for key in sorted(self.holdings)]
+        return pd.concat(frames, ignore_index=True)
+    
+    def _keep_holdings(self, holdings: pd.DataFrame):
+        """Keep holdings of one or more months in self.holdings, by return month."""
+        for date, frame in holdings.groupby('date', sort=False):
+            self.holdings[(date.year, date.month)] = frame.reset_index(drop=True)
+    
+    def portfolio_membership(self, year: int, month: int,
+                             metrics: Optional[PipelineMetrics] = None) -> Optional[pd.DataFrame]:
+        """
+        Portfolio assignments used for a return month.
         
-        if len(portfolio_data) == 0:
-            logger.warning("No valid returns in portfolio, returning 0")
-            return 0.0
+        Assignments are formed once per holding period (see holding_start) from
+        the formation snapshot and cached in self.membership, so that between
+        rebalances only returns and weights are fetched. Concurrent callers for
+        the same holding period wait for a single formation.
         
-        # Calculate value-weighted return
-        total_market_cap = portfolio_data['market_cap'].sum()
-        if total_market_cap == 0:
-            return 0.0
+        Args:
+            year: Year of the return month
+            month: Return month (1-12)
+            metrics: Metrics to record the formation stages into
         
-        weighted_return = (portfolio_data['monthly_return'] * portfolio_data['market_cap']).sum() / total_market_cap
+        Returns:
+            Output of assign_portfolios for the formation date, or None if fewer
+            than MIN_STOCKS stocks were available
+        """
+        metrics = metrics or null_metrics()
+        key = holding_start(year, month, self.rebalance, self.rebalance_month)
+        with self._membership_lock:
+            lock = self._membership_locks.setdefault(key, threading.Lock())
         
-        return weighted_return
+        with lock:
+            if key in self.membership:
+                logger.info(f"Using portfolios formed for {key[0]}-{key[1]:02d}")
+                return self.membership[key]
+            
+            # Get portfolio formation date (end of previous month)
+            with metrics.stage('formation_date'):
+                formation_date = self.find_previous_trading_day(formation_target_date(*key))
+            logger.info(f"Formation date: {formation_date}")
+            
+            # Get all stocks with market cap and book-to-market
+            with metrics.stage('fundamentals_store'):
+                fundamentals = self.formation_fundamentals(formation_date)
+            stocks_df = get_korea_all_stocks(formation_date, self.conn, cache=self.cache,
+                                             fundamentals=fundamentals, metrics=metrics)
+            
+            if len(stocks_df) < MIN_STOCKS:
+                logger.warning(f"Only {len(stocks_df)} stocks available, skipping")
+                stocks_df = None
+            else:
+                # Form portfolios
+                with metrics.stage('assign_portfolios'):
+                    stocks_df = self.assign_portfolios(stocks_df)
+            
+            self.membership[key] = stocks_df
+            return stocks_df
     
     def calculate_monthly_factors(self, year: int, month: int) -> Dict[str, float]:
         """
         Calculate factors for a specific month.
         
+        Stage times and data volumes of the month are kept in
+        self.month_metrics[(year, month)] and appended to metrics_file if set.
+        Its status is 'ok', 'skipped' (not enough data for the month) or
+        'error' (a query failed).
+        
         Args:
             year: Year (e.g., 2020)
             month: Month (1-12)
@@ -177,69 +476,105 @@ class KoreaFactorCalculator:
         Returns:
             Dictionary with 'date', 'MKT', 'SMB', 'HML', 'RF'
         """
+        metrics = PipelineMetrics(f"{year}-{month:02d}")
+        self.month_metrics[(year, month)] = metrics
+        return self._tracked_month(metrics, lambda: self._calculate_monthly_factors(year, month, metrics))
+    
+    def _tracked_month(self, metrics: PipelineMetrics,
+                       calculate: Callable[[], Optional[Dict[str, float]]]) -> Optional[Dict[str, float]]:
+        """Run a month's calculation, then set its status and log/write its metrics."""
+        try:
+            factors = calculate()
+            metrics.status = 'ok' if factors is not None else (metrics.status or 'skipped')
+            return factors
+        except Exception:
+            metrics.status = 'error'
+            raise
+        finally:
+            logger.info(f"Metrics {metrics.label}: {metrics.total_seconds:.2f}s ({metrics.summary()})")
+            if self.metrics_file is not None:
+                metrics.write_jsonl(self.metrics_file)
+    
+    def _calculate_monthly_factors(self, year: int, month: int, metrics: PipelineMetrics) -> Dict[str, float]:
+        """calculate_monthly_factors, recording into metrics."""
         logger.info(f"Calculating factors for {year}-{month:02d}")
+        data = self._fetch_month(year, month, metrics)
+        return self._compute_month(year, month, data, metrics)
+    
+    def _fetch_month(self, year: int, month: int,
+                     metrics: PipelineMetrics) -> Optional[Tuple[pd.DataFrame, pd.DataFrame]]:
+        """
+        Query stage of a month: portfolio assignments and month-end prices.
         
-        # Get portfolio formation date (end of previous month)
-        current_date = datetime(year, month, 1)
-        formation_date_target = (current_date - relativedelta(months=1)).strftime('%Y-%m-%d')
-        formation_date = self.find_previous_trading_day(formation_date_target)
-        
-        # Get month-end date for returns
-        if month == 12:
-            end_date = datetime(year, 12, 31).strftime('%Y-%m-%d')
-        else:
-            end_date = (datetime(year, month+1, 1) - relativedelta(days=1)).strftime('%Y-%m-%d')
-        
-        start_date = datetime(year, month, 1).strftime('%Y-%m-%d')
-        
-        logger.info(f"Formation date: {formation_date}, Return period: {start_date} to {end_date}")
-        
-        # Get all stocks with market cap and book-to-market
+        Returns:
+            Tuple of (portfolio assignments, month-end prices of the month and the
+            previous month), or None if the month is skipped or a query failed
+            (metrics.status is then 'error')
+        """
+        # Portfolios formed at the last rebalance (formed now if this month starts a holding period)
         try:
-            stocks_df = get_korea_all_stocks(formation_date, self.conn)
+            stocks_df = self.portfolio_membership(year, month, metrics)
         except Exception as e:
-            logger.error(f"Failed to get stocks for {formation_date}: {e}")
+            logger.error(f"Failed to form portfolios for {year}-{month:02d}: {e}")
+            metrics.status = 'error'
             return None
         
-        if len(stocks_df) < 100:
-            logger.warning(f"Only {len(stocks_df)} stocks available, skipping")
+        if stocks_df is None:
             return None
         
-        # Form portfolios
-        portfolios = self.form_portfolios(stocks_df)
-        
         # Get returns for the month (need previous month for return calculation)
         all_gvkeys = stocks_df['gvkey'].tolist()
         prev_month_start = (datetime(year, month, 1) - relativedelta(months=1)).strftime('%Y-%m-%d')
         
         try:
-            prices_df = get_korea_stock_prices(all_gvkeys, prev_month_start, end_date, self.conn)
+            # Month-end rows only (last trading day per security-month, selected in the database)
+            monthly_df = get_korea_month_end_prices(all_gvkeys, prev_month_start, month_end_date(year, month),
+                                                    self.conn, cache=self.cache, metrics=metrics)
         except Exception as e:
             logger.error(f"Failed to get prices: {e}")
+            metrics.status = 'error'
             return None
         
-        # Get month-end prices
-        prices_df['month'] = pd.to_datetime(prices_df['datadate']).dt.to_period('M')
-        monthly_df = prices_df.sort_values(['gvkey', 'iid', 'datadate'])
-        monthly_df = monthly_df.groupby(['gvkey', 'iid', 'month']).last().reset_index()
+        return stocks_df, monthly_df
+    
+    def _compute_month(self, year: int, month: int, data: Optional[Tuple[pd.DataFrame, pd.DataFrame]],
+                       metrics: PipelineMetrics) -> Optional[Dict[str, float]]:
+        """Compute stage of a month: returns, portfolio returns and factors (no queries)."""
+        if data is None:
+            return None
+        stocks_df, monthly_df = data
+        
+        # Get month-end date for returns
+        end_date = month_end_date(year, month)
+        
+        with metrics.stage('month_end'):
+            # Calculate monthly returns
+            monthly_df['monthly_return'] = monthly_df.groupby(['gvkey', 'iid'], observed=True)['prccd'].pct_change()
+            
+            # Filter to current month only
+            current_month = pd.Period(f"{year}-{month:02d}", freq='M')
+            monthly_df = monthly_df[monthly_df['month'] == current_month]
+            
+            # Remove stocks without valid returns
+            monthly_df = monthly_df[monthly_df['monthly_return'].notna()]
+        metrics.record_frame('month_end', monthly_df)
         
-        # Calculate monthly returns
-        monthly_df = monthly_df.sort_values(['gvkey', 'iid', 'month'])
-        monthly_df['monthly_return'] = monthly_df.groupby(['gvkey', 'iid'])['prccd'].pct_change()
+        # Calculate portfolio and market returns
+        with metrics.stage('portfolio_returns'):
+            members = self.portfolio_members(stocks_df, monthly_df)
+            returns = value_weighted_returns(members, 'portfolio', groups=PORTFOLIOS, total='MKT')
+        for name, row in returns.iterrows():
+            logger.info(f"Portfolio {name} return: {row['return']*100:.2f}% ({row['n_stocks']} stocks)")
         
-        # Filter to current month only
-        current_month = pd.Period(f"{year}-{month:02d}", freq='M')
-        monthly_df = monthly_df[monthly_df['month'] == current_month]
+        empty = returns.index[returns['return'].isna()].tolist()
+        if empty:
+            logger.warning(f"No valid returns in {empty} for {year}-{month:02d}, skipping")
+            return None
         
-        # Remove stocks without valid returns
-        monthly_df = monthly_df[monthly_df['monthly_return'].notna()]
+        portfolio_returns = returns['return']
         
-        # Calculate portfolio returns
-        portfolio_returns = {}
-        for name, gvkeys in portfolios.items():
-            ret = self.calculate_portfolio_return(gvkeys, monthly_df)
-            portfolio_returns[name] = ret
-            logger.info(f"Portfolio {name} return: {ret*100:.2f}%")
+        with metrics.stage('holdings'):
+            self.holdings[(year, month)] = self.stock_holdings(members, members[~members.index.duplicated()])
         
         # Calculate factors
         # SMB = (S/L + S/M + S/H)/3 - (B/L + B/M + B/H)/3
@@ -251,13 +586,7 @@ class KoreaFactorCalculator:
               (portfolio_returns['S/H'] + portfolio_returns['B/H']) / 2
         
         # MKT = Value-weighted market return - RF
-        total_market_cap = monthly_df['market_cap'].sum()
-        if total_market_cap > 0:
-            market_return = (monthly_df['monthly_return'] * monthly_df['market_cap']).sum() / total_market_cap
-        else:
-            market_return = 0.0
-        
-        mkt = market_return - self.risk_free_rate
+        mkt = portfolio_returns['MKT'] - self.risk_free_rate
         
         logger.info(f"MKT: {mkt*100:.2f}%, SMB: {smb*100:.2f}%, HML: {hml*100:.2f}%")
         
@@ -269,72 +598,552 @@ class KoreaFactorCalculator:
             'RF': self.risk_free_rate * 100
         }
     
-    def calculate_factors_for_period(self, start_date: str, end_date: str) -> pd.DataFrame:
+    def calculate_factors_for_period(self, start_date: str, end_date: str,
+                                     engine: str = 'monthly', workers: int = 1,
+                                     connection_factory: Optional[Callable[[], wrds.Connection]] = None,
+                                     prefetch: int = 0) -> pd.DataFrame:
         """
         Calculate factors for entire period.
         
         Args:
             start_date: Start date in 'YYYY-MM-DD' format
             end_date: End date in 'YYYY-MM-DD' format
+            engine: 'monthly' runs calculate_monthly_factors month by month,
+                    'panel' pulls the whole period once and computes all months
+                    in vectorized passes (see calculate_factors_panel)
+            workers: Number of months computed concurrently by the monthly engine,
+                     each worker with its own WRDS connection
+            connection_factory: Creates worker connections (default: wrds.Connection)
+            prefetch: With a single worker, fetch up to this many months ahead on a
+                      background thread while the current month is computed
+                      (see calculate_months_pipelined; 0 = no prefetching)
         
         Returns:
             DataFrame with date, MKT, SMB, HML, RF
         """
+        if engine == 'panel':
+            return self.calculate_factors_panel(start_date, end_date)
+        if engine != 'monthly':
+            raise ValueError(f"Unknown engine: {engine}")
+        
         logger.info(f"Calculating factors from {start_date} to {end_date}")
         
-        start = datetime.strptime(start_date, '%Y-%m-%d')
-        end = datetime.strptime(end_date, '%Y-%m-%d')
+        # One calendar and one fundamentals query for the period instead of per month
+        months = month_range(start_date, end_date)
+        if len(months) > 0:
+            first_target, last_target = self.formation_target(*months[0]), self.formation_target(*months[-1])
+            if self.calendar is None or not (self.calendar.covers(first_target) and
+                                             self.calendar.covers(last_target)):
+                self.load_calendar(start_date, end_date)
+            if self.fundamentals is None or not (self.fundamentals.covers(first_target) and
+                                                 self.fundamentals.covers(last_target)):
+                self.load_fundamentals(start_date, end_date)
         
-        factors_list = []
-        current = start
+        if workers > 1:
+            results = self.calculate_months_parallel(months, workers, connection_factory)
+        elif prefetch > 0:
+            results = self.calculate_months_pipelined(months, prefetch)
+        else:
+            results = [self.calculate_monthly_factors(year, month) for year, month in months]
         
-        while current <= end:
-            year = current.year
-            month = current.month
-            
-            factors = self.calculate_monthly_factors(year, month)
-            
-            if factors is not None:
-                factors_list.append(factors)
-            
-            # Move to next month
-            current = current + relativedelta(months=1)
+        factors_list = [factors for factors in results if factors is not None]
         
         df = pd.DataFrame(factors_list)
         logger.info(f"Calculated factors for {len(df)} months")
         
         return df
     
+    def calculate_months_parallel(self, months: List[Tuple[int, int]], workers: int,
+                                  connection_factory: Optional[Callable[[], wrds.Connection]] = None,
+                                  on_result: Optional[Callable[[Tuple[int, int], Optional[Dict[str, float]]], None]] = None
+                                  ) -> List[Optional[Dict[str, float]]]:
+        """
+        Calculate monthly factors for many months on a thread pool.
+        
+        Each worker thread has its own calculator (sharing this calculator's
+        risk-free rate, cache and calendar). With a ManagedConnection all workers
+        share its connection pool; otherwise each worker opens its own connection.
+        A month that fails is logged and returned as None without affecting the
+        others.
+        
+        Args:
+            months: List of (year, month) tuples
+            workers: Number of worker threads
+            connection_factory: Creates worker connections (default: this calculator's
+                                ManagedConnection, else wrds.Connection); not used
+                                when running offline from a cache
+            on_result: Called with ((year, month), result) in the calling thread as
+                       soon as each month finishes (e.g. to checkpoint it)
+        
+        Returns:
+            List of calculate_monthly_factors results, in the order of months
+        """
+        if connection_factory is None:
+            if isinstance(self.conn, ManagedConnection):
+                connection_factory = lambda: self.conn
+            else:
+                connection_factory = wrds.Connection
+        offline = self.conn is None
+        
+        # Fill the cache up front; partitions fetched here stay fresh for the run,
+        # so workers read them from disk (KoreaDataCache serializes any other fetch)
+        if self.cache is not None and not self.cache.offline and len(months) > 0:
+            first_target = pd.Timestamp(self.formation_target(*months[0]))
+            last_day = month_end_date(*months[-1])
+            self.cache.refresh_secd((first_target - pd.Timedelta(days=31)).strftime('%Y-%m-%d'), last_day)
+            self.cache.refresh_funda(f"{first_target.year - 2}-01-01", last_day)
+        
+        local = threading.local()
+        connections = []
+        lock = threading.Lock()
+        
+        def worker_calculator() -> 'KoreaFactorCalculator':
+            if not hasattr(local, 'calculator'):
+                conn = None if offline else connection_factory()
+                if conn is not None:
+                    with lock:
+                        connections.append(conn)
+                local.calculator = KoreaFactorCalculator(conn, self.risk_free_rate,
+                                                         cache=self.cache, calendar=self.calendar,
+                                                         fundamentals=self.fundamentals,
+                                                         reporting_lag_months=self.reporting_lag_months,
+                                                         metrics_file=self.metrics_file,
+                                                         rebalance=self.rebalance,
+                                                         rebalance_month=self.rebalance_month)
+                local.calculator.month_metrics = self.month_metrics
+                local.calculator.holdings = self.holdings
+                local.calculator.membership = self.membership
+                local.calculator._membership_locks = self._membership_locks
+                local.calculator._membership_lock = self._membership_lock
+            return local.calculator
+        
+        def run(year_month: Tuple[int, int]) -> Optional[Dict[str, float]]:
+            year, month = year_month
+            try:
+                return worker_calculator().calculate_monthly_factors(year, month)
+            except Exception as e:
+                logger.error(f"Failed to calculate factors for {year}-{month:02d}: {e}")
+                return None
+        
+        logger.info(f"Calculating {len(months)} months with {workers} workers")
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(run, year_month): i for i, year_month in enumerate(months)}
+                results = [None] * len(months)
+                for future in as_completed(futures):
+                    i = futures[future]
+                    results[i] = future.result()
+                    if on_result is not None:
+                        on_result(months[i], results[i])
+        finally:
+            for conn in connections:
+                if conn is not self.conn:
+                    conn.close()
+        
+        return results
+    
+    def calculate_months_pipelined(self, months: List[Tuple[int, int]], prefetch: int = 2,
+                                   on_result: Optional[Callable[[Tuple[int, int], Optional[Dict[str, float]]], None]] = None
+                                   ) -> List[Optional[Dict[str, float]]]:
+        """
+        Calculate monthly factors with queries overlapped with computation.
+        
+        A background thread runs the query stage of each month (portfolio
+        formation snapshot and month-end prices) and puts the results into a
+        queue of at most `prefetch` months, while the calling thread computes
+        returns and factors of the months already fetched. At most prefetch + 2
+        months of data are held in memory (queued, being fetched, being
+        computed), and the elapsed time approaches the larger of the total query
+        and compute times instead of their sum. Results are the same as
+        calculate_monthly_factors month by month.
+        
+        Args:
+            months: List of (year, month) tuples
+            prefetch: Maximum number of fetched months waiting to be computed
+            on_result: Called with ((year, month), result) as soon as each month
+                       finishes (e.g. to checkpoint it)
+        
+        Returns:
+            List of calculate_monthly_factors results, in the order of months
+        """
+        if prefetch < 1:
+            raise ValueError(f"prefetch must be at least 1, got {prefetch}")
+        
+        fetched = queue.Queue(maxsize=prefetch)
+        stop = threading.Event()
+        
+        def fetch_all():
+            for year, month in months:
+                metrics = PipelineMetrics(f"{year}-{month:02d}")
+                try:
+                    item = (metrics, self._fetch_month(year, month, metrics), None)
+                except Exception as e:
+                    item = (metrics, None, e)
+                # Wait for room in the queue, giving up if the consumer stopped
+                while not stop.is_set():
+                    try:
+                        fetched.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+        
+        fetcher = threading.Thread(target=fetch_all, name='month-prefetch', daemon=True)
+        logger.info(f"Calculating {len(months)} months with up to {prefetch} months prefetched")
+        fetcher.start()
+        
+        results = []
+        try:
+            for year, month in months:
+                metrics, data, error = fetched.get()
+                self.month_metrics[(year, month)] = metrics
+                logger.info(f"Calculating factors for {year}-{month:02d}")
+                
+                def compute():
+                    if error is not None:
+                        raise error
+                    return self._compute_month(year, month, data, metrics)
+                
+                try:
+                    factors = self._tracked_month(metrics, compute)
+                except Exception as e:
+                    logger.error(f"Failed to calculate factors for {year}-{month:02d}: {e}")
+                    factors = None
+                results.append(factors)
+                if on_result is not None:
+                    on_result((year, month), factors)
+        finally:
+            stop.set()
+            fetcher.join()
+        
+        return results
+    
+    def calculate_factors_panel(self, start_date: str, end_date: str,
+                                max_days_back: int = 10) -> pd.DataFrame:
+        """
+        Calculate factors for entire period from a single panel pull.
+        
+        Downloads the comp.g_secd price panel and comp.g_funda book equity for the
+        whole range once (two queries instead of 4+ per month), then computes
+        formation dates, breakpoints, portfolios and MKT/SMB/HML for every month
+        in vectorized passes. Follows the same rules as calculate_monthly_factors,
+        so both engines produce the same factors (up to floating-point summation
+        order).
+        
+        Args:
+            start_date: Start date in 'YYYY-MM-DD' format
+            end_date: End date in 'YYYY-MM-DD' format
+            max_days_back: Maximum days to search backwards for a formation day
+        
+        Returns:
+            DataFrame with date, MKT, SMB, HML, RF
+        """
+        logger.info(f"Calculating factors from {start_date} to {end_date} (panel engine)")
+        
+        if len(month_range(start_date, end_date)) == 0:
+            return pd.DataFrame(columns=['date', 'MKT', 'SMB', 'HML', 'RF'])
+        
+        prices, stocks, valid_months = self._panel_portfolios(start_date, end_date, max_days_back)
+        
+        # Month-end returns of every security in the formation universe
+        monthly = self._panel_monthly_returns(prices)
+        universe = stocks[['month', 'gvkey']].drop_duplicates()
+        monthly = monthly.merge(universe, on=['month', 'gvkey'], how='inner')
+        
+        # A gvkey belongs to every portfolio any of its share classes was sorted into
+        membership = stocks[['month', 'gvkey', 'portfolio']].drop_duplicates()
+        members = monthly.merge(membership, on=['month', 'gvkey'], how='inner')
+        
+        portfolio_returns = value_weighted_returns(members, ['month', 'portfolio'])['return']
+        portfolio_returns = portfolio_returns.unstack('portfolio').reindex(index=valid_months, columns=PORTFOLIOS)
+        market_return = value_weighted_returns(monthly, 'month')['return'].reindex(valid_months)
+        
+        incomplete = portfolio_returns.isna().any(axis=1) | market_return.isna()
+        for month in valid_months[incomplete.values]:
+            logger.warning(f"Empty portfolio for {month}, skipping")
+        valid_months = valid_months[~incomplete.values]
+        portfolio_returns = portfolio_returns[~incomplete.values]
+        market_return = market_return[~incomplete.values]
+        self._keep_holdings(self.stock_holdings(members[members['month'].isin(valid_months)],
+                                                monthly[monthly['month'].isin(valid_months)]))
+        
+        smb = (portfolio_returns['S/L'] + portfolio_returns['S/M'] + portfolio_returns['S/H']) / 3 - \
+              (portfolio_returns['B/L'] + portfolio_returns['B/M'] + portfolio_returns['B/H']) / 3
+        hml = (portfolio_returns['S/L'] + portfolio_returns['B/L']) / 2 - \
+              (portfolio_returns['S/H'] + portfolio_returns['B/H']) / 2
+        mkt = market_return - self.risk_free_rate
+        
+        df = pd.DataFrame({
+            'date': [month_end_date(m.year, m.month) for m in valid_months],
+            'MKT': (mkt * 100).values,
+            'SMB': (smb * 100).values,
+            'HML': (hml * 100).values,
+            'RF': self.risk_free_rate * 100
+        })
+        logger.info(f"Calculated factors for {len(df)} months")
+        
+        return df
+    
+    def calculate_daily_factors(self, start_date: str, end_date: str,
+                                max_days_back: int = 10) -> pd.DataFrame:
+        """
+        Calculate daily factors for every trading day of a period from one panel pull.
+        
+        Portfolio assignments are the monthly ones (same formation dates,
+        breakpoints and universe as calculate_factors_panel) and are held fixed
+        within each month. Daily portfolio returns are value-weighted by each
+        security's market cap on the previous trading day, and are computed for
+        all days of the period in a single grouped pass. The monthly risk-free
+        rate is spread evenly (compounded) over the trading days of the month.
+        
+        Args:
+            start_date: Start date in 'YYYY-MM-DD' format
+            end_date: End date in 'YYYY-MM-DD' format
+            max_days_back: Maximum days to search backwards for a formation day
+        
+        Returns:
+            DataFrame with date, MKT, SMB, HML, RF (daily, in %)
+            
+        Example:
+            >>> daily = calculator.calculate_daily_factors('2020-10-01', '2020-12-31')
+            >>> calculator.save_factors(daily, 'data/korea_factors_daily.csv')
+        """
+        logger.info(f"Calculating daily factors from {start_date} to {end_date}")
+        
+        if len(month_range(start_date, end_date)) == 0:
+            return pd.DataFrame(columns=['date', 'MKT', 'SMB', 'HML', 'RF'])
+        
+        prices, stocks, valid_months = self._panel_portfolios(start_date, end_date, max_days_back)
+        
+        # Daily returns of every security in the formation universe of its month
+        daily = self._panel_daily_returns(prices)
+        daily = daily[daily['month'].isin(valid_months)]
+        universe = stocks[['month', 'gvkey']].drop_duplicates()
+        daily = daily.merge(universe, on=['month', 'gvkey'], how='inner')
+        
+        membership = stocks[['month', 'gvkey', 'portfolio']].drop_duplicates()
+        members = daily.merge(membership, on=['month', 'gvkey'], how='inner')
+        
+        portfolio_returns = value_weighted_returns(members, ['datadate', 'portfolio'], return_col='daily_return',
+                                                   weight_col='prev_market_cap')['return']
+        days = pd.DatetimeIndex(np.sort(daily['datadate'].unique()), name='datadate')
+        portfolio_returns = portfolio_returns.unstack('portfolio').reindex(index=days, columns=PORTFOLIOS)
+        market_return = value_weighted_returns(daily, 'datadate', return_col='daily_return',
+                                               weight_col='prev_market_cap')['return'].reindex(days)
+        
+        incomplete = portfolio_returns.isna().any(axis=1) | market_return.isna()
+        if incomplete.any():
+            logger.warning(f"Empty portfolio on {incomplete.sum()} days, skipping them")
+        days = days[~incomplete.values]
+        portfolio_returns = portfolio_returns[~incomplete.values]
+        market_return = market_return[~incomplete.values]
+        
+        # Daily risk-free rate compounding to the monthly rate over the month's trading days
+        day_months = days.to_period('M')
+        days_in_month = pd.Series(day_months).map(pd.Series(day_months).value_counts()).values
+        rf = (1 + self.risk_free_rate) ** (1 / days_in_month) - 1
+        
+        smb = (portfolio_returns['S/L'] + portfolio_returns['S/M'] + portfolio_returns['S/H']) / 3 - \
+              (portfolio_returns['B/L'] + portfolio_returns['B/M'] + portfolio_returns['B/H']) / 3
+        hml = (portfolio_returns['S/L'] + portfolio_returns['B/L']) / 2 - \
+              (portfolio_returns['S/H'] + portfolio_returns['B/H']) / 2
+        mkt = market_return.values - rf
+        
+        df = pd.DataFrame({
+            'date': days.strftime('%Y-%m-%d'),
+            'MKT': mkt * 100,
+            'SMB': (smb * 100).values,
+            'HML': (hml * 100).values,
+            'RF': rf * 100
+        })
+        logger.info(f"Calculated daily factors for {len(df)} trading days")
+        
+        return df
+    
+    def _panel_portfolios(self, start_date: str, end_date: str, max_days_back: int = 10,
+                          history_months: int = 0) -> Tuple[pd.DataFrame, pd.DataFrame, pd.PeriodIndex]:
+        """
+        Price panel and 2x3 portfolio assignments for every return month of a period.
+        
+        Args:
+            start_date: Start date in 'YYYY-MM-DD' format
+            end_date: End date in 'YYYY-MM-DD' format
+            max_days_back: Maximum days to search backwards for a formation day
+            history_months: Months of prices to include before the first formation
+                            date (e.g. for past-return characteristics)
+        
+        Returns:
+            Tuple of (daily price panel, formation stocks with size/value/portfolio
+            labels, months with enough stocks)
+        """
+        months = pd.DataFrame(month_range(start_date, end_date), columns=['year', 'month_num'])
+        months['month'] = [pd.Period(year=y, month=m, freq='M') for y, m in zip(months['year'], months['month_num'])]
+        months['target'] = pd.to_datetime([self.formation_target(y, m)
+                                           for y, m in zip(months['year'], months['month_num'])])
+        
+        first_formation = months['target'].min() - pd.Timedelta(days=max_days_back)
+        panel_start = (first_formation - pd.DateOffset(months=history_months)).strftime('%Y-%m-%d')
+        panel_end = month_end_date(*month_range(start_date, end_date)[-1])
+        
+        prices = get_korea_price_panel(panel_start, panel_end, self.conn, cache=self.cache)
+        fundamentals = self.fundamentals
+        if fundamentals is None or not (fundamentals.covers(first_formation.strftime('%Y-%m-%d')) and
+                                        fundamentals.covers(months['target'].max().strftime('%Y-%m-%d'))):
+            fundamentals = self.load_fundamentals(start_date, end_date, max_days_back)
+        
+        # Formation dates: last trading day on or before each target
+        calendar = KoreaTradingCalendar(prices['datadate'].unique(), panel_start, panel_end)
+        formation = calendar.previous_trading_days(months['target'], max_days_back)
+        months['formation'] = np.where(np.isnat(formation), months['target'].values.astype('datetime64[D]'),
+                                       formation).astype('datetime64[ns]')
+        
+        stocks = self._panel_formation_stocks(prices, fundamentals, months)
+        counts = stocks.groupby('month').size().reindex(months['month'], fill_value=0)
+        valid_months = counts.index[counts.values >= MIN_STOCKS]
+        for month, n in counts[counts < MIN_STOCKS].items():
+            logger.warning(f"Only {n} stocks available for {month}, skipping")
+        stocks = stocks[stocks['month'].isin(valid_months)]
+        
+        # 2x3 sort for every month at once
+        stocks = self.assign_portfolios(stocks, by='month')
+        
+        return prices, stocks, valid_months
+    
+    def _panel_formation_stocks(self, prices: pd.DataFrame, fundamentals: KoreaFundamentalsStore,
+                                months: pd.DataFrame) -> pd.DataFrame:
+        """Formation snapshots (as in get_korea_all_stocks) for all months of a panel."""
+        snapshot = prices[prices['cshoc'].notna() & (prices['cshoc'] > 0) & (prices['market_cap'] >= 0)]
+        snapshot = snapshot.merge(months[['month', 'formation']],
+                                  left_on='datadate', right_on='formation', how='inner')
+        
+        # Latest book equity available at each formation date, all months in one as-of merge
+        snapshot = fundamentals.as_of(snapshot, date_col='formation')
+        
+        snapshot['book_equity'] = snapshot['ceq']
+        snapshot['book_to_market'] = snapshot['book_equity'] / snapshot['market_cap']
+        
+        return snapshot[snapshot['book_to_market'].notna()].reset_index(drop=True)
+    
+    def _panel_monthly_returns(self, prices: pd.DataFrame) -> pd.DataFrame:
+        """Month-end prices and one-month returns for every security in a panel."""
+        prices = prices.sort_values(['gvkey', 'iid', 'datadate'])
+        prices['month'] = prices['datadate'].dt.to_period('M')
+        monthly = prices.groupby(['gvkey', 'iid', 'month'], observed=True).last().reset_index()
+        
+        # Only a return over two adjacent months counts, as in the per-month path
+        same_security = (monthly['gvkey'] == monthly['gvkey'].shift(1)) & \
+                        (monthly['iid'] == monthly['iid'].shift(1))
+        adjacent = same_security & (monthly['month'] == monthly['month'].shift(1) + 1)
+        monthly['monthly_return'] = (monthly['prccd'] / monthly['prccd'].shift(1) - 1).where(adjacent)
+        
+        return monthly[monthly['monthly_return'].notna()]
+    
+    def _panel_daily_returns(self, prices: pd.DataFrame) -> pd.DataFrame:
+        """Daily returns and previous-day market caps for every security in a panel."""
+        prices = prices.sort_values(['gvkey', 'iid', 'datadate'])
+        
+        # Only a return from the previous trading day counts (no gaps over missing days)
+        days = np.unique(prices['datadate'].values)
+        day_index = np.searchsorted(days, prices['datadate'].values)
+        same_security = (prices['gvkey'] == prices['gvkey'].shift(1)) & \
+                        (prices['iid'] == prices['iid'].shift(1))
+        adjacent = same_security & (day_index == np.roll(day_index, 1) + 1)
+        
+        daily = prices[['gvkey', 'iid', 'datadate']].copy()
+        daily['month'] = daily['datadate'].dt.to_period('M')
+        daily['daily_return'] = (prices['prccd'] / prices['prccd'].shift(1) - 1).where(adjacent)
+        daily['prev_market_cap'] = prices['market_cap'].shift(1).where(adjacent)
+        
+        return daily[daily['daily_return'].notna()]
+    
+    def compare_period_engines(self, start_date: str, end_date: str) -> Dict[str, float]:
+        """
+        Time the monthly and panel engines on the same period and compare outputs.
+        
+        Args:
+            start_date: Start date in 'YYYY-MM-DD' format
+            end_date: End date in 'YYYY-MM-DD' format
+        
+        Returns:
+            Dictionary with each engine's seconds, the speedup and the maximum
+            absolute difference between factor values (in %)
+        """
+        timings = {}
+        results = {}
+        for engine in ['monthly', 'panel']:
+            t0 = time.perf_counter()
+            results[engine] = self.calculate_factors_for_period(start_date, end_date, engine=engine)
+            timings[engine] = time.perf_counter() - t0
+        
+        monthly_df, panel_df = results['monthly'], results['panel']
+        if list(monthly_df['date']) != list(panel_df['date']):
+            raise AssertionError("Engines produced different months")
+        cols = ['MKT', 'SMB', 'HML', 'RF']
+        max_diff = float(np.abs(monthly_df[cols].values - panel_df[cols].values).max()) if len(panel_df) else 0.0
+        
+        comparison = {
+            'monthly_seconds': timings['monthly'],
+            'panel_seconds': timings['panel'],
+            'speedup': timings['monthly'] / timings['panel'] if timings['panel'] > 0 else float('inf'),
+            'max_abs_diff': max_diff
+        }
+        logger.info(f"Monthly engine: {timings['monthly']:.2f}s, panel engine: {timings['panel']:.2f}s "
+                    f"({comparison['speedup']:.1f}x), max abs diff: {max_diff:.2e}")
+        return comparison
+    
     def save_factors(self, factors_df: pd.DataFrame, filepath: str):
-        """Save factors to CSV file."""
-        factors_df.to_csv(filepath, index=False)
+        """Save factors to a CSV file or Parquet/Arrow store (by suffix, see korea_factor_store)."""
+        open_factor_store(filepath).write(factors_df)
         logger.info(f"Saved factors to {filepath}")
     
     def load_factors(self, filepath: str) -> pd.DataFrame:
-        """Load factors from CSV file."""
-        df = pd.read_csv(filepath, parse_dates=['date'])
+        """Load factors from a CSV file or Parquet/Arrow store."""
+        df = open_factor_store(filepath).load()
         logger.info(f"Loaded {len(df)} months of factors from {filepath}")
         return df
 
 
 if __name__ == "__main__":
     # Test the calculator
-    import wrds
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Test Korea factor calculator')
+    parser.add_argument('--start-date', type=str, default='2020-10-01', help='Start date (YYYY-MM-DD)')
+    parser.add_argument('--end-date', type=str, default='2020-12-31', help='End date (YYYY-MM-DD)')
+    parser.add_argument('--engine', type=str, default='monthly', choices=['monthly', 'panel'],
+                        help='Period engine to use')
+    parser.add_argument('--compare', action='store_true',
+                        help='Time the monthly and panel engines against each other')
+    parser.add_argument('--rebalance', type=str, default='monthly', choices=list(REBALANCE_MONTHS),
+                        help='Portfolio rebalancing frequency')
+    parser.add_argument('--rebalance-month', type=int, default=6,
+                        help='Formation month of annual/quarterly rebalancing (default: 6, June)')
+    parser.add_argument('--prefetch', type=int, default=0,
+                        help='Months fetched ahead while the current month is computed (monthly engine)')
+    args = parser.parse_args()
     
-    conn = wrds.Connection()
-    calculator = KoreaFactorCalculator(conn)
+    conn = connect_wrds()
+    calculator = KoreaFactorCalculator(conn, rebalance=args.rebalance, rebalance_month=args.rebalance_month)
     
     # Test: Calculate factors for Oct-Dec 2020
     print("="*80)
     print("Testing Korea Factor Calculator")
     print("="*80)
     
-    factors = calculator.calculate_factors_for_period('2020-10-01', '2020-12-31')
-    print("\nCalculated factors:")
-    print(factors)
-    
-    # Save test results
-    calculator.save_factors(factors, 'data/korea_factors_test.csv')
+    if args.compare:
+        comparison = calculator.compare_period_engines(args.start_date, args.end_date)
+        print("\nEngine comparison:")
+        for key, value in comparison.items():
+            print(f"  {key}: {value:.6g}")
+    else:
+        factors = calculator.calculate_factors_for_period(args.start_date, args.end_date, engine=args.engine,
+                                                          prefetch=args.prefetch)
+        print("\nCalculated factors:")
+        print(factors)
+        
+        # Save test results
+        calculator.save_factors(factors, 'data/korea_factors_test.csv')
     
     conn.close()
     print("\n✅ Test completed!")
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Korea Factor Store
+
+This module reads and writes factor series (and other tables keyed by date, such
+as stock holdings) through one interface, with the storage format chosen by the
+path:
+
+    data/korea_factors_monthly.csv        # CSV file (export format, rewritten on every save)
+    data/korea_factors_monthly.parquet/   # Parquet partitions
+    data/korea_factors_monthly.arrow/     # Arrow IPC (Feather v2) partitions, memory-mapped reads
+
+Partitioned stores are append-only: every append writes one new partition file
+(e.g. the months added by one update run) and atomically replaces a small
+manifest listing the active partitions, so existing partitions are never
+rewritten and readers never see a half-written store. When a date appears in
+several partitions its rows in the most recently written one replace the others,
+so appends can also correct or extend (add columns to) earlier dates. compact()
+merges all partitions into one.
+
+Arrow IPC partitions are read through memory maps: read_table() returns Arrow
+columns backed by the mapped files without copying them.
+"""
+
+import pandas as pd
+from abc import ABC, abstractmethod
+from typing import List, Optional
+import json
+import logging
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MANIFEST = '_manifest.json'
+
+# Identifier columns read from CSV as text (keeps leading zeros)
+ID_DTYPES = {'gvkey': str, 'iid': str}
+
+
+class FactorStore:
+    """
+    CSV factor store: one file with a date column, rewritten atomically on every save.
+    
+    Subclasses keep the same interface with other storage formats; use
+    open_factor_store to pick one by path.
+    """
+    
+    def __init__(self, path: str):
+        """
+        Initialize store.
+        
+        Args:
+            path: CSV file path
+        """
+        self.path = path
+    
+    def exists(self) -> bool:
+        """Whether the store has been written."""
+        return os.path.exists(self.path)
+    
+    def load(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Load all rows, sorted by date.
+        
+        Args:
+            columns: Columns to load besides date (default: all)
+        
+        Returns:
+            DataFrame with a datetime64 date column
+        
+        Raises:
+            FileNotFoundError: If the store has not been written
+        """
+        usecols = None if columns is None else ['date'] + [c for c in columns if c != 'date']
+        return pd.read_csv(self.path, parse_dates=['date'], usecols=usecols, dtype=ID_DTYPES)
+    
+    def write(self, df: pd.DataFrame):
+        """Replace the stored rows with df (atomically)."""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, self.path)
+    
+    def append(self, df: pd.DataFrame):
+        """
+        Add rows, replacing all stored rows of the dates in df.
+        
+        Columns not in the store yet are added (missing in the other rows).
+        """
+        if len(df) == 0:
+            return
+        combined = merge_rows(self.load(), df) if self.exists() else prepare_rows(df)
+        self.write(combined)
+    
+    def export_csv(self, filepath: str):
+        """Write all rows to a CSV file."""
+        df = self.load()
+        df['date'] = df['date'].dt.strftime('%Y-%m-%d')
+        FactorStore(filepath).write(df)
+
+
+class PartitionedFactorStore(FactorStore, ABC):
+    """
+    Directory of append-only partition files listed in a manifest (see module docstring).
+    
+    Subclasses set the partition file suffix and implement _write_file and
+    _read_partition for their file format.
+    """
+    
+    suffix = ''
+    
+    def __init__(self, path: str):
+        if pa is None:
+            raise ImportError("pyarrow is required for Parquet/Arrow factor stores (pip install pyarrow)")
+        super().__init__(path)
+    
+    def exists(self) -> bool:
+        return os.path.exists(os.path.join(self.path, MANIFEST))
+    
+    def partitions(self) -> List[str]:
+        """Active partition files, oldest first."""
+        with open(os.path.join(self.path, MANIFEST), 'r') as f:
+            return [os.path.join(self.path, name) for name in json.load(f)['partitions']]
+    
+    def read_table(self, columns: Optional[List[str]] = None) -> 'pa.Table':
+        """
+        All rows as an Arrow table, sorted by date (each date from the newest partition with it).
+        
+        Args:
+            columns: Columns to load besides date (default: all)
+        
+        Raises:
+            FileNotFoundError: If the store has not been written
+        """
+        if not self.exists():
+            raise FileNotFoundError(f"No factor store at {self.path}")
+        tables = [self._read_partition(part, columns) for part in self.partitions()]
+        if len(tables) == 1:
+            return tables[0]
+        
+        # Dates written again by a later partition are dropped from earlier ones
+        newer = [tables[-1].column('date').combine_chunks()]
+        for i in range(len(tables) - 2, -1, -1):
+            dates = tables[i].column('date')
+            replaced = pc.is_in(dates, value_set=pa.concat_arrays(newer))
+            if pc.any(replaced).as_py():
+                tables[i] = tables[i].filter(pc.invert(replaced))
+            newer.append(dates.combine_chunks())
+        
+        # Partitions of later dates concatenate without copying
+        table = pa.concat_tables(tables, promote_options='default')
+        dates = table.column('date').to_numpy()
+        if len(dates) > 1 and (dates[1:] < dates[:-1]).any():
+            table = table.take(pc.sort_indices(table, sort_keys=[('date', 'ascending')]))
+        return table
+    
+    def load(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        table = self.read_table(columns)
+        df = table.to_pandas()
+        df['date'] = pd.to_datetime(df['date']).astype('datetime64[ns]')
+        return df.reset_index(drop=True)
+    
+    def write(self, df: pd.DataFrame):
+        old = self.partitions() if self.exists() else []
+        self._commit([self._write_partition(prepare_rows(df))], old)
+    
+    def append(self, df: pd.DataFrame):
+        if len(df) == 0:
+            return
+        current = self.partitions() if self.exists() else []
+        part = self._write_partition(prepare_rows(df))
+        self._commit(current + [part], [])
+        logger.info(f"Appended {len(df)} rows to {self.path} ({os.path.basename(part)})")
+    
+    def compact(self):
+        """Merge all partitions into one (same rows as load())."""
+        if self.exists() and len(self.partitions()) > 1:
+            self.write(self.load())
+    
+    def _commit(self, partitions: List[str], obsolete: List[str]):
+        """Atomically point the manifest at partitions, then delete obsolete files."""
+        manifest = os.path.join(self.path, MANIFEST)
+        with open(manifest + '.tmp', 'w') as f:
+            json.dump({'partitions': [os.path.basename(p) for p in partitions]}, f, indent=2)
+        os.replace(manifest + '.tmp', manifest)
+        for path in obsolete:
+            if path not in partitions and os.path.exists(path):
+                os.remove(path)
+    
+    def _write_partition(self, df: pd.DataFrame) -> str:
+        """Write df to the next partition file (atomically) and return its path."""
+        os.makedirs(self.path, exist_ok=True)
+        numbers = [int(name[5:10]) for name in os.listdir(self.path)
+                   if name.startswith('part-') and name.endswith(self.suffix)]
+        path = os.path.join(self.path, f"part-{max(numbers, default=0) + 1:05d}{self.suffix}")
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        self._write_file(table, path + '.tmp')
+        os.replace(path + '.tmp', path)
+        return path
+    
+    @abstractmethod
+    def _write_file(self, table: 'pa.Table', path: str):
+        """Write a table to a partition file."""
+    
+    @abstractmethod
+    def _read_partition(self, path: str, columns: Optional[List[str]]) -> 'pa.Table':
+        """Read the columns of a partition file (all if columns is None, see _select)."""
+
+
+class ParquetFactorStore(PartitionedFactorStore):
+    """Partitioned store of compressed Parquet files (smallest on disk)."""
+    
+    suffix = '.parquet'
+    
+    def _write_file(self, table: 'pa.Table', path: str):
+        pq.write_table(table, path)
+    
+    def _read_partition(self, path: str, columns: Optional[List[str]]) -> 'pa.Table':
+        table = pq.read_table(path, memory_map=True)
+        return _select(table, columns)
+
+
+class ArrowFactorStore(PartitionedFactorStore):
+    """Partitioned store of uncompressed Arrow IPC (Feather v2) files, read zero-copy."""
+    
+    suffix = '.arrow'
+    
+    def _write_file(self, table: 'pa.Table', path: str):
+        with pa.OSFile(path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+    
+    def _read_partition(self, path: str, columns: Optional[List[str]]) -> 'pa.Table':
+        with pa.memory_map(path, 'r') as source:
+            table = pa.ipc.open_file(source).read_all()
+        return _select(table, columns)
+
+
+STORES = {'.csv': FactorStore, '.parquet': ParquetFactorStore,
+          '.arrow': ArrowFactorStore, '.feather': ArrowFactorStore}
+
+
+def open_factor_store(path: str) -> FactorStore:
+    """
+    Factor store for a path, by its suffix (.csv, .parquet, .arrow or .feather).
+    
+    Example:
+        >>> store = open_factor_store('data/korea_factors_monthly.arrow')
+        >>> store.append(new_months)
+        >>> factors = store.load()
+    """
+    suffix = os.path.splitext(path.rstrip('/'))[1].lower()
+    if suffix not in STORES:
+        raise ValueError(f"Unknown factor store format for {path} (use one of {', '.join(STORES)})")
+    return STORES[suffix](path.rstrip('/'))
+
+
+def load_factor_file(path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Load a factor file or store (any supported format) with a datetime64 date column."""
+    return open_factor_store(path).load(columns)
+
+
+def prepare_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """Rows with a datetime64 date column, sorted by date (stable)."""
+    df = df.drop(columns='year_month', errors='ignore').copy()
+    df['date'] = pd.to_datetime(df['date']).astype('datetime64[ns]')
+    return df.sort_values('date', kind='mergesort').reset_index(drop=True)
+
+
+def merge_rows(existing: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+    """Existing rows with the rows of new added, replacing all existing rows of its dates."""
+    new = prepare_rows(new)
+    kept = existing[~existing['date'].isin(new['date'])]
+    return prepare_rows(pd.concat([kept, new], ignore_index=True))
+
+
+def _select(table: 'pa.Table', columns: Optional[List[str]]) -> 'pa.Table':
+    """Columns of a partition that has them (later partitions may add columns)."""
+    if columns is None:
+        return table
+    return table.select(['date'] + [c for c in columns if c != 'date' and c in table.column_names])
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Convert, export and compact Korea factor stores')
+    parser.add_argument('--input', type=str, required=True,
+                        help='Factor file or store (e.g. data/korea_factors_monthly.csv)')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Write all rows to this file or store (e.g. data/korea_factors_monthly.arrow)')
+    parser.add_argument('--compact', action='store_true', help='Merge the partitions of the input store')
+    args = parser.parse_args()
+    
+    print("="*80)
+    print("Korea Factor Store")
+    print("="*80)
+    
+    store = open_factor_store(args.input)
+    if args.compact and isinstance(store, PartitionedFactorStore):
+        before = len(store.partitions())
+        store.compact()
+        print(f"\nCompacted {before} partitions into {len(store.partitions())}")
+    
+    df = store.load()
+    print(f"\nLoaded {len(df)} rows ({df['date'].min()} to {df['date'].max()}) from {args.input}")
+    
+    if args.output is not None:
+        if args.output.lower().endswith('.csv'):
+            store.export_csv(args.output)
+        else:
+            open_factor_store(args.output).write(df)
+        print(f"Saved {len(df)} rows to {args.output}")
+    
+    print("\n✅ Completed!")
@@ -7,20 +7,28 @@ It reads the existing data, identifies missing months, and calculates factors fo
 """
 
 import pandas as pd
-import wrds
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
+from typing import Dict, List, Optional, Tuple
+import json
 import logging
+import os
 from korea_factor_calculator import KoreaFactorCalculator
+from korea_factor_store import open_factor_store
+from korea_holdings import HoldingsStore
+from korea_connection import connect_wrds
+from korea_multi_factor import KoreaMultiFactorCalculator, FACTOR_SORTS
+from korea_data_cache import KoreaDataCache
+from korea_metrics import PipelineMetrics
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
 def load_existing_factors(filepath: str = 'data/korea_factors_monthly.csv') -> pd.DataFrame:
-    """Load existing factor data."""
+    """Load existing factor data (CSV file or Parquet/Arrow store, see korea_factor_store)."""
     try:
-        df = pd.read_csv(filepath, parse_dates=['date'])
+        df = open_factor_store(filepath).load()
         logger.info(f"Loaded {len(df)} existing factor observations")
         return df
     except FileNotFoundError:
@@ -65,17 +73,171 @@ def get_missing_months(existing_df: pd.DataFrame, start_date: str, end_date: str
     return missing
 
 
+def get_incomplete_months(existing_df: pd.DataFrame, start_date: str, end_date: str,
+                          columns: List[str]) -> list:
+    """
+    Identify months that are missing or lack any of the given factor columns.
+    
+    Args:
+        existing_df: DataFrame with existing factor data
+        start_date: Start date in 'YYYY-MM-DD' format
+        end_date: End date in 'YYYY-MM-DD' format
+        columns: Factor columns every month must have (absent or NaN counts as missing)
+    
+    Returns:
+        List of (year, month) tuples for missing or incomplete months
+    """
+    missing = get_missing_months(existing_df, start_date, end_date)
+    if len(existing_df) == 0:
+        return missing
+    
+    incomplete = existing_df.reindex(columns=columns).isna().any(axis=1)
+    periods = pd.to_datetime(existing_df.loc[incomplete, 'date']).dt.to_period('M')
+    start = pd.Period(start_date, freq='M')
+    end = pd.Period(end_date, freq='M')
+    incomplete_months = [(p.year, p.month) for p in periods if start <= p <= end]
+    
+    if incomplete_months:
+        logger.info(f"Found {len(incomplete_months)} months without {columns}")
+    
+    return sorted(set(missing) | set(incomplete_months))
+
+
+def checkpoint_path(filepath: str) -> str:
+    """Path of the checkpoint journal kept next to a factor file or store."""
+    return filepath + '.checkpoint.jsonl'
+
+
+def load_checkpoint(filepath: str) -> Dict[Tuple[int, int], Dict]:
+    """
+    Load the months finished by an interrupted update.
+    
+    Every line of the journal is one finished month:
+    {"year": ..., "month": ..., "status": "ok" | "skipped", "factors": {...} | null}.
+    A line cut short by a crash is ignored (that month is simply redone).
+    
+    Args:
+        filepath: Path to the checkpoint journal
+    
+    Returns:
+        Dictionary mapping (year, month) to its journal record
+    """
+    finished = {}
+    try:
+        with open(filepath, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Ignoring incomplete checkpoint line in {filepath}")
+                    continue
+                finished[(record['year'], record['month'])] = record
+    except FileNotFoundError:
+        pass
+    return finished
+
+
+def append_checkpoint(filepath: str, year: int, month: int, status: str,
+                      factors: Optional[Dict[str, float]] = None):
+    """Append one finished month to the checkpoint journal and flush it to disk."""
+    record = {'year': year, 'month': month, 'status': status, 'factors': factors}
+    with open(filepath, 'a') as f:
+        f.write(json.dumps(record, default=str) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def save_factors_atomic(df: pd.DataFrame, filepath: str):
+    """Replace a factor file or store atomically (temp file then rename)."""
+    open_factor_store(filepath).write(df)
+
+
+def append_factors_atomic(df: pd.DataFrame, filepath: str):
+    """
+    Add new rows to a factor file or store atomically; rows of dates already on
+    file are replaced. Parquet/Arrow stores write only the new rows.
+    """
+    open_factor_store(filepath).append(df)
+
+
 def update_factors(filepath: str = 'data/korea_factors_monthly.csv',
                    start_date: str = '2020-10-01',
-                   end_date: str = None):
+                   end_date: str = None,
+                   cache_dir: str = None,
+                   offline: bool = False,
+                   workers: int = 1,
+                   reporting_lag_months: int = 0,
+                   metrics_file: str = None,
+                   resume: bool = True,
+                   rebalance: str = 'monthly',
+                   rebalance_month: int = 6,
+                   factors: Optional[List[str]] = None,
+                   prefetch: int = 0,
+                   holdings_file: Optional[str] = None):
     """
     Update factor data with missing months.
     
+    Every finished month is appended to a checkpoint journal
+    (<filepath>.checkpoint.jsonl) as soon as it is computed, and the new months
+    are appended to the factor file atomically at the end (a CSV is rewritten, a
+    Parquet/Arrow store gets one new partition). If a run is interrupted, the
+    next run resumes from the journal and only computes the months not yet
+    finished; the journal is removed once the factors are saved. Months that
+    failed with an error are not journaled and are retried.
+    
+    If factors names any of UMD, RMW or CMA, the update runs on the multi-factor
+    panel engine instead: months that are missing or lack a requested column are
+    computed in one pass, existing values are kept and only the missing cells and
+    months are filled in (so new factor columns can be added to an existing file).
+    
     Args:
-        filepath: Path to factor data CSV file
+        filepath: Path to factor data CSV file, or a .parquet/.arrow store directory
         start_date: Start date for checking missing data
         end_date: End date for checking missing data (default: current month)
+        cache_dir: Local Compustat cache directory (default: no cache, query WRDS live)
+        offline: Run from the cache only, without connecting to WRDS
+        workers: Number of months computed concurrently, each worker with its
+                 own WRDS connection
+        reporting_lag_months: Months after fiscal year end before book equity is used
+        metrics_file: JSON lines file for per-month and whole-update stage metrics
+        resume: Continue from the checkpoint of an interrupted run (False discards it)
+        rebalance: Portfolio rebalancing frequency: 'monthly', 'quarterly' or 'annual'
+        rebalance_month: Formation month of annual/quarterly rebalancing
+        factors: Extra factors to maintain (any of UMD, RMW, CMA; default: none)
+        prefetch: With a single worker, months fetched ahead on a background
+                  thread while the current month is computed (0 = no prefetching)
+        holdings_file: Holdings store (see korea_holdings) the stock-level
+                       portfolio holdings of the calculated months are appended
+                       to (months resumed from a checkpoint are not recalculated
+                       and get none)
     """
+    if offline and cache_dir is None:
+        raise ValueError("Offline mode requires a cache_dir")
+    
+    extra = [f for f in FACTOR_SORTS if f in (factors or [])]
+    metrics = PipelineMetrics('update')
+    try:
+        if extra:
+            return _update_multi_factors(filepath, start_date, end_date, cache_dir, offline,
+                                         reporting_lag_months, rebalance, rebalance_month, extra,
+                                         holdings_file, metrics)
+        return _update_factors(filepath, start_date, end_date, cache_dir, offline, workers,
+                               reporting_lag_months, metrics_file, resume, rebalance, rebalance_month,
+                               prefetch, holdings_file, metrics)
+    except Exception:
+        metrics.status = 'error'
+        raise
+    finally:
+        logger.info(f"Update metrics: {metrics.total_seconds:.2f}s ({metrics.summary()})")
+        if metrics_file is not None:
+            metrics.write_jsonl(metrics_file)
+
+
+def _update_factors(filepath: str, start_date: str, end_date: str, cache_dir: str, offline: bool,
+                    workers: int, reporting_lag_months: int, metrics_file: str, resume: bool,
+                    rebalance: str, rebalance_month: int, prefetch: int, holdings_file: Optional[str],
+                    metrics: PipelineMetrics) -> pd.DataFrame:
+    """update_factors, recording whole-update stages into metrics."""
     if end_date is None:
         # Default to last month (current month data not yet available)
         today = datetime.today()
@@ -84,53 +246,280 @@ def update_factors(filepath: str = 'data/korea_factors_monthly.csv',
     logger.info(f"Updating factors from {start_date} to {end_date}")
     
     # Load existing data
-    existing_df = load_existing_factors(filepath)
-    
-    # Find missing months
-    missing_months = get_missing_months(existing_df, start_date, end_date)
+    with metrics.stage('load_existing'):
+        existing_df = load_existing_factors(filepath)
+        
+        # Find missing months
+        missing_months = get_missing_months(existing_df, start_date, end_date)
+        
+        # Months finished by an interrupted run
+        journal = checkpoint_path(filepath)
+        if not resume and os.path.exists(journal):
+            os.remove(journal)
+        finished = {ym: record for ym, record in load_checkpoint(journal).items() if ym in set(missing_months)}
+        new_factors = [finished[ym]['factors'] for ym in missing_months
+                       if ym in finished and finished[ym]['status'] == 'ok']
+        if finished:
+            logger.info(f"Resuming from checkpoint: {len(finished)} months already finished "
+                        f"({len(new_factors)} with factors)")
+        remaining_months = [ym for ym in missing_months if ym not in finished]
     
     if len(missing_months) == 0:
         logger.info("No missing months found. Data is up to date!")
+        metrics.status = 'up_to_date'
         return existing_df
     
+    if len(remaining_months) == 0:
+        return _save_update(existing_df, new_factors, filepath, journal, metrics)
+    missing_months = remaining_months
+    
     logger.info(f"Missing months: {missing_months}")
     
     # Connect to WRDS
-    logger.info("Connecting to WRDS...")
-    conn = wrds.Connection()
-    
-    # Initialize calculator
-    calculator = KoreaFactorCalculator(conn)
-    
-    # Calculate factors for missing months
-    new_factors = []
-    for year, month in missing_months:
-        logger.info(f"Calculating factors for {year}-{month:02d}")
-        try:
-            factors = calculator.calculate_monthly_factors(year, month)
+    if offline:
+        logger.info("Running offline from local cache")
+        conn = None
+    else:
+        logger.info("Connecting to WRDS...")
+        with metrics.stage('connect'):
+            # One pooled connection shared by all workers
+            conn = connect_wrds(pool_size=max(workers, 1))
+    
+    try:
+        cache = KoreaDataCache(cache_dir, conn) if cache_dir is not None else None
+        
+        # Initialize calculator
+        calculator = KoreaFactorCalculator(conn, cache=cache, reporting_lag_months=reporting_lag_months,
+                                           metrics_file=metrics_file, rebalance=rebalance,
+                                           rebalance_month=rebalance_month)
+        
+        # One trading calendar and one fundamentals query for all missing months
+        first, last = missing_months[0], missing_months[-1]
+        with metrics.stage('calendar'):
+            calculator.load_calendar(f"{first[0]}-{first[1]:02d}-01", f"{last[0]}-{last[1]:02d}-01")
+        with metrics.stage('fundamentals'):
+            calculator.load_fundamentals(f"{first[0]}-{first[1]:02d}-01", f"{last[0]}-{last[1]:02d}-01")
+        
+        def checkpoint(year_month: Tuple[int, int], factors: Optional[Dict[str, float]]):
+            # A month that failed before recording metrics is an error (not checkpointed)
+            month_metrics = calculator.month_metrics.get(year_month)
+            status = month_metrics.status if month_metrics is not None else 'error'
+            if status in ('ok', 'skipped'):
+                append_checkpoint(journal, *year_month, status, factors)
             if factors is not None:
                 new_factors.append(factors)
-        except Exception as e:
-            logger.error(f"Failed to calculate factors for {year}-{month:02d}: {e}")
+        
+        # Calculate factors for missing months
+        with metrics.stage('months'):
+            if workers > 1:
+                calculator.calculate_months_parallel(missing_months, workers, lambda: conn, on_result=checkpoint)
+            elif prefetch > 0:
+                calculator.calculate_months_pipelined(missing_months, prefetch, on_result=checkpoint)
+            else:
+                for year, month in missing_months:
+                    logger.info(f"Calculating factors for {year}-{month:02d}")
+                    try:
+                        factors = calculator.calculate_monthly_factors(year, month)
+                    except Exception as e:
+                        logger.error(f"Failed to calculate factors for {year}-{month:02d}: {e}")
+                        factors = None
+                    checkpoint((year, month), factors)
+        metrics.add('months', rows=len(new_factors))
+        
+        # Slowest months, from the per-month metrics
+        slowest = sorted(calculator.month_metrics.values(), key=lambda m: -m.total_seconds)[:3]
+        for month_metrics in slowest:
+            logger.info(f"Slow month {month_metrics.label}: {month_metrics.total_seconds:.2f}s "
+                        f"({month_metrics.summary()})")
+    finally:
+        if conn is not None:
+            conn.close()
+    
+    if holdings_file is not None:
+        with metrics.stage('holdings'):
+            HoldingsStore(holdings_file).append(calculator.collected_holdings())
+    
+    return _save_update(existing_df, new_factors, filepath, journal, metrics)
+
+
+def _update_multi_factors(filepath: str, start_date: str, end_date: str, cache_dir: str, offline: bool,
+                          reporting_lag_months: int, rebalance: str, rebalance_month: int,
+                          factors: List[str], holdings_file: Optional[str],
+                          metrics: PipelineMetrics) -> pd.DataFrame:
+    """update_factors on the multi-factor panel engine, filling missing months and columns."""
+    if end_date is None:
+        today = datetime.today()
+        end_date = (today.replace(day=1) - relativedelta(days=1)).strftime('%Y-%m-%d')
     
-    conn.close()
+    logger.info(f"Updating factors {factors} from {start_date} to {end_date}")
     
+    with metrics.stage('load_existing'):
+        existing_df = load_existing_factors(filepath)
+        missing_months = get_incomplete_months(existing_df, start_date, end_date, factors)
+        existing_df = existing_df.drop(columns='year_month', errors='ignore')
+    
+    if len(missing_months) == 0:
+        logger.info("No missing months found. Data is up to date!")
+        metrics.status = 'up_to_date'
+        return existing_df
+    
+    logger.info(f"Missing months: {missing_months}")
+    
+    if offline:
+        logger.info("Running offline from local cache")
+        conn = None
+    else:
+        logger.info("Connecting to WRDS...")
+        with metrics.stage('connect'):
+            conn = connect_wrds()
+    
+    try:
+        cache = KoreaDataCache(cache_dir, conn) if cache_dir is not None else None
+        calculator = KoreaMultiFactorCalculator(conn, cache=cache, reporting_lag_months=reporting_lag_months,
+                                                rebalance=rebalance, rebalance_month=rebalance_month)
+        
+        # One panel pull from the first to the last missing month
+        first, last = missing_months[0], missing_months[-1]
+        with metrics.stage('months'):
+            new_df = calculator.calculate_multi_factors(f"{first[0]}-{first[1]:02d}-01",
+                                                        f"{last[0]}-{last[1]:02d}-01", factors)
+    finally:
+        if conn is not None:
+            conn.close()
+    
+    # Keep only missing months (the range may span complete months already on file)
+    months = pd.to_datetime(new_df['date']).dt.to_period('M')
+    missing = set(pd.Period(year=y, month=m, freq='M') for y, m in missing_months)
+    new_df = new_df[months.isin(missing)]
+    metrics.add('months', rows=len(new_df))
+    
+    if len(new_df) == 0:
+        logger.warning("No new factors calculated")
+        metrics.status = 'no_new_factors'
+        return existing_df
+    
+    # Existing values win; new values only fill absent cells and months
+    existing = existing_df.copy()
+    existing['date'] = pd.to_datetime(existing['date'])
+    new_df = new_df.assign(date=pd.to_datetime(new_df['date']))
+    combined_df = existing.set_index('date').combine_first(new_df.set_index('date')).reset_index()
+    columns = list(existing_df.columns) + [c for c in new_df.columns if c not in existing_df.columns]
+    combined_df = combined_df[columns].sort_values('date').reset_index(drop=True)
+    
+    if holdings_file is not None:
+        with metrics.stage('holdings'):
+            holdings = calculator.collected_holdings()
+            HoldingsStore(holdings_file).append(holdings[holdings['date'].isin(new_df['date'])])
+    
+    with metrics.stage('save'):
+        filled = combined_df['date'].isin(new_df['date'])
+        append_factors_atomic(combined_df[filled], filepath)
+    logger.info(f"Saved {len(combined_df)} factor observations to {filepath}")
+    logger.info(f"Filled {len(new_df)} months")
+    metrics.status = 'ok'
+    
+    return combined_df
+
+
+def _save_update(existing_df: pd.DataFrame, new_factors: list, filepath: str, journal: str,
+                 metrics: PipelineMetrics) -> pd.DataFrame:
+    """Append new factors to the factor file atomically, then drop the checkpoint journal."""
     if len(new_factors) == 0:
         logger.warning("No new factors calculated")
+        metrics.status = 'no_new_factors'
+        if os.path.exists(journal):
+            os.remove(journal)
         return existing_df
     
     # Combine with existing data
     new_df = pd.DataFrame(new_factors)
-    combined_df = pd.concat([existing_df, new_df], ignore_index=True)
+    combined_df = pd.concat([existing_df.drop(columns='year_month', errors='ignore'), new_df], ignore_index=True)
     
     # Sort by date
     combined_df['date'] = pd.to_datetime(combined_df['date'])
     combined_df = combined_df.sort_values('date').reset_index(drop=True)
     
     # Save updated data
-    combined_df.to_csv(filepath, index=False)
+    with metrics.stage('save'):
+        append_factors_atomic(new_df, filepath)
+        if os.path.exists(journal):
+            os.remove(journal)
     logger.info(f"Saved {len(combined_df)} factor observations to {filepath}")
     logger.info(f"Added {len(new_factors)} new observations")
+    metrics.status = 'ok'
+    
+    return combined_df
+
+
+def update_daily_factors(filepath: str = 'data/korea_factors_daily.csv',
+                         start_date: str = '2020-10-01',
+                         end_date: str = None,
+                         cache_dir: str = None,
+                         offline: bool = False,
+                         reporting_lag_months: int = 0,
+                         rebalance: str = 'monthly',
+                         rebalance_month: int = 6):
+    """
+    Update daily factor data with missing months.
+    
+    All missing months are computed with one panel pull from the first to the
+    last missing month; only days of missing months are added.
+    
+    Args:
+        filepath: Path to daily factor data CSV file, or a .parquet/.arrow store directory
+        start_date: Start date for checking missing data
+        end_date: End date for checking missing data (default: last month)
+        cache_dir: Local Compustat cache directory (default: no cache, query WRDS live)
+        offline: Run from the cache only, without connecting to WRDS
+        reporting_lag_months: Months after fiscal year end before book equity is used
+        rebalance: Portfolio rebalancing frequency: 'monthly', 'quarterly' or 'annual'
+        rebalance_month: Formation month of annual/quarterly rebalancing
+    """
+    if offline and cache_dir is None:
+        raise ValueError("Offline mode requires a cache_dir")
+    
+    if end_date is None:
+        today = datetime.today()
+        end_date = (today.replace(day=1) - relativedelta(days=1)).strftime('%Y-%m-%d')
+    
+    logger.info(f"Updating daily factors from {start_date} to {end_date}")
+    
+    existing_df = load_existing_factors(filepath)
+    missing_months = get_missing_months(existing_df, start_date, end_date)
+    
+    if len(missing_months) == 0:
+        logger.info("No missing months found. Data is up to date!")
+        return existing_df
+    
+    conn = None if offline else connect_wrds()
+    try:
+        cache = KoreaDataCache(cache_dir, conn) if cache_dir is not None else None
+        calculator = KoreaFactorCalculator(conn, cache=cache, reporting_lag_months=reporting_lag_months,
+                                           rebalance=rebalance, rebalance_month=rebalance_month)
+        
+        first, last = missing_months[0], missing_months[-1]
+        daily_df = calculator.calculate_daily_factors(f"{first[0]}-{first[1]:02d}-01",
+                                                      f"{last[0]}-{last[1]:02d}-01")
+    finally:
+        if conn is not None:
+            conn.close()
+    
+    # Keep only days of missing months (the range may span months already on file)
+    months = pd.to_datetime(daily_df['date']).dt.to_period('M')
+    missing = set(pd.Period(year=y, month=m, freq='M') for y, m in missing_months)
+    new_df = daily_df[months.isin(missing)]
+    
+    if len(new_df) == 0:
+        logger.warning("No new factors calculated")
+        return existing_df
+    
+    combined_df = pd.concat([existing_df.drop(columns='year_month', errors='ignore'), new_df], ignore_index=True)
+    combined_df['date'] = pd.to_datetime(combined_df['date'])
+    combined_df = combined_df.sort_values('date').reset_index(drop=True)
+    
+    append_factors_atomic(new_df, filepath)
+    logger.info(f"Saved {len(combined_df)} daily factor observations to {filepath}")
+    logger.info(f"Added {len(new_df)} new observations")
     
     return combined_df
 
@@ -139,12 +528,38 @@ if __name__ == "__main__":
     import argparse
     
     parser = argparse.ArgumentParser(description='Update Korea Fama-French factors')
-    parser.add_argument('--filepath', type=str, default='data/korea_factors_monthly.csv',
-                       help='Path to factor data CSV file')
+    parser.add_argument('--filepath', type=str, default=None,
+                       help='Path to factor data CSV file or .parquet/.arrow store '
+                            '(default: data/korea_factors_<frequency>.csv)')
+    parser.add_argument('--frequency', type=str, default='monthly', choices=['monthly', 'daily'],
+                       help='Factor frequency to update')
     parser.add_argument('--start-date', type=str, default='2020-10-01',
                        help='Start date for checking missing data (YYYY-MM-DD)')
     parser.add_argument('--end-date', type=str, default=None,
                        help='End date for checking missing data (YYYY-MM-DD, default: last month)')
+    parser.add_argument('--cache-dir', type=str, default=None,
+                       help='Local Compustat cache directory (e.g. data/cache)')
+    parser.add_argument('--offline', action='store_true',
+                       help='Use only the local cache, without connecting to WRDS')
+    parser.add_argument('--workers', type=int, default=1,
+                       help='Number of months computed in parallel (one WRDS connection each)')
+    parser.add_argument('--prefetch', type=int, default=0,
+                       help='Months fetched ahead while the current month is computed (single worker)')
+    parser.add_argument('--reporting-lag', type=int, default=0,
+                       help='Months after fiscal year end before book equity is used (default: 0)')
+    parser.add_argument('--metrics-file', type=str, default=None,
+                       help='Append per-month stage metrics as JSON lines (e.g. data/metrics.jsonl)')
+    parser.add_argument('--no-resume', action='store_true',
+                       help='Discard the checkpoint of an interrupted run and start over')
+    parser.add_argument('--rebalance', type=str, default='monthly', choices=['monthly', 'quarterly', 'annual'],
+                       help='Portfolio rebalancing frequency')
+    parser.add_argument('--rebalance-month', type=int, default=6,
+                       help='Formation month of annual/quarterly rebalancing (default: 6, June)')
+    parser.add_argument('--factors', type=str, nargs='+', default=None, choices=list(FACTOR_SORTS),
+                       help='Extra factor columns to maintain (monthly only), e.g. --factors UMD RMW CMA')
+    parser.add_argument('--holdings-file', type=str, default=None,
+                       help='Append stock-level portfolio holdings of new months (monthly only), '
+                            'e.g. data/korea_holdings.arrow')
     
     args = parser.parse_args()
     
@@ -152,11 +567,36 @@ if __name__ == "__main__":
     print("Korea Fama-French Factor Updater")
     print("="*80)
     
-    updated_df = update_factors(
-        filepath=args.filepath,
-        start_date=args.start_date,
-        end_date=args.end_date
-    )
+    filepath = args.filepath or f"data/korea_factors_{args.frequency}.csv"
+    
+    if args.frequency == 'daily':
+        updated_df = update_daily_factors(
+            filepath=filepath,
+            start_date=args.start_date,
+            end_date=args.end_date,
+            cache_dir=args.cache_dir,
+            offline=args.offline,
+            reporting_lag_months=args.reporting_lag,
+            rebalance=args.rebalance,
+            rebalance_month=args.rebalance_month
+        )
+    else:
+        updated_df = update_factors(
+            filepath=filepath,
+            start_date=args.start_date,
+            end_date=args.end_date,
+            cache_dir=args.cache_dir,
+            offline=args.offline,
+            workers=args.workers,
+            reporting_lag_months=args.reporting_lag,
+            metrics_file=args.metrics_file,
+            resume=not args.no_resume,
+            rebalance=args.rebalance,
+            rebalance_month=args.rebalance_month,
+            factors=args.factors,
+            prefetch=args.prefetch,
+            holdings_file=args.holdings_file
+        )
     
     print("\n" + "="*80)
     print("Update Summary")
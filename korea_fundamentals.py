@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Korea Point-in-Time Fundamentals
+
+This module loads the book equity history of Korean firms from WRDS Compustat Global
+(comp.g_funda) once and answers "latest fundamentals known at date t" for any
+number of stocks and dates with a single as-of merge.
+"""
+
+import pandas as pd
+import numpy as np
+import wrds
+from typing import Optional
+import logging
+from korea_data_cache import KoreaDataCache
+from korea_ticker_utils import get_korea_fundamentals_panel
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Columns attached to stock rows by KoreaFundamentalsStore.as_of
+AS_OF_COLUMNS = ['ceq', 'at', 'op', 'inv']
+
+
+class KoreaFundamentalsStore:
+    """
+    Point-in-time store of positive book equity (ceq) and total assets (at).
+    
+    Also derived per record: operating profit op = revt - cogs - xsga - xint
+    (missing xsga/xint count as zero; NaN without revt or cogs) and investment
+    inv = at / at of the previous fiscal year - 1 (NaN without a record 10-14
+    months earlier).
+    
+    A record becomes available `reporting_lag_months` after its fiscal period end
+    (datadate) and is used until a newer record becomes available, as long as its
+    datadate is on or after January 1 of (as-of year - lookback_years). With the
+    defaults (no lag, two years) this reproduces get_korea_all_stocks.
+    """
+    
+    def __init__(self, fundamentals: pd.DataFrame, reporting_lag_months: int = 0,
+                 lookback_years: int = 2, start_date: Optional[str] = None,
+                 end_date: Optional[str] = None):
+        """
+        Initialize store.
+        
+        Args:
+            fundamentals: DataFrame with gvkey, datadate, ceq, at (and optionally
+                          revt, cogs, xsga, xint)
+            reporting_lag_months: Months between fiscal period end and availability
+            lookback_years: Calendar years back from the as-of year a record stays valid
+            start_date: First datadate of the loaded range (default: earliest record)
+            end_date: Last datadate of the loaded range (default: latest record)
+        """
+        self.reporting_lag_months = reporting_lag_months
+        self.lookback_years = lookback_years
+        
+        records = fundamentals.reindex(columns=['gvkey', 'datadate', 'ceq', 'at', 'revt', 'cogs', 'xsga', 'xint'])
+        # One gvkey dtype on both sides of the as-of merge (WRDS returns string, the cache object)
+        records['gvkey'] = records['gvkey'].astype(object)
+        records['at'] = records['at'].astype('float64')
+        records['fund_date'] = pd.to_datetime(records['datadate']).astype('datetime64[ns]')
+        
+        # Operating profit and asset growth over the previous fiscal year's record
+        items = records[['revt', 'cogs', 'xsga', 'xint']].astype('float64')
+        records['op'] = items['revt'] - items['cogs'] - items['xsga'].fillna(0) - items['xint'].fillna(0)
+        records = records.sort_values(['gvkey', 'fund_date'], kind='mergesort')
+        previous = records.groupby('gvkey', sort=False)[['fund_date', 'at']].shift(1)
+        gap = (records['fund_date'] - previous['fund_date']).dt.days
+        records['inv'] = (records['at'] / previous['at'] - 1).where(gap.between(300, 430) & (previous['at'] > 0))
+        records = records.drop(columns=['revt', 'cogs', 'xsga', 'xint'])
+        records['available_date'] = records['fund_date'] + pd.DateOffset(months=reporting_lag_months)
+        self.records = records.drop(columns='datadate').sort_values('available_date', kind='mergesort') \
+                              .reset_index(drop=True)
+        
+        self.start = pd.Timestamp(start_date) if start_date is not None else self.records['fund_date'].min()
+        self.end = pd.Timestamp(end_date) if end_date is not None else self.records['fund_date'].max()
+        
+        logger.info(f"Fundamentals store: {len(self.records)} records, "
+                    f"{self.records['gvkey'].nunique()} firms, lag {reporting_lag_months} months")
+    
+    @classmethod
+    def load(cls, conn: Optional[wrds.Connection], start_date: str, end_date: str,
+             cache: Optional[KoreaDataCache] = None, reporting_lag_months: int = 0,
+             lookback_years: int = 2) -> 'KoreaFundamentalsStore':
+        """
+        Load all book equity records needed for as-of dates in a range, in one query.
+        
+        Args:
+            conn: WRDS connection object
+            start_date: First as-of date in 'YYYY-MM-DD' format
+            end_date: Last as-of date in 'YYYY-MM-DD' format
+            cache: Local data cache to read from instead of querying WRDS
+            reporting_lag_months: Months between fiscal period end and availability
+            lookback_years: Calendar years back from the as-of year a record stays valid
+        
+        Returns:
+            KoreaFundamentalsStore covering as-of dates in [start_date, end_date]
+        """
+        load_start = f"{int(start_date[:4]) - lookback_years}-01-01"
+        df = get_korea_fundamentals_panel(load_start, end_date, conn, cache=cache)
+        return cls(df, reporting_lag_months, lookback_years, load_start, end_date)
+    
+    def covers(self, date: str) -> bool:
+        """Whether as-of lookups at a date only need records within the loaded range."""
+        as_of = pd.Timestamp(date)
+        window_start = pd.Timestamp(as_of.year - self.lookback_years, 1, 1)
+        return self.start <= window_start and as_of <= self.end
+    
+    def as_of(self, stocks_df: pd.DataFrame, date: Optional[str] = None,
+              date_col: Optional[str] = None) -> pd.DataFrame:
+        """
+        Attach the latest available fundamentals to every stock row.
+        
+        Args:
+            stocks_df: DataFrame with gvkey (and date_col if given)
+            date: As-of date for all rows in 'YYYY-MM-DD' format
+            date_col: Column with a per-row as-of date (e.g. formation dates of many months)
+        
+        Returns:
+            Copy of stocks_df (same row order) with ceq, at, op, inv and fund_date
+            columns (NaN/NaT where no valid record is available)
+        """
+        if (date is None) == (date_col is None):
+            raise ValueError("Pass exactly one of date or date_col")
+        
+        left = stocks_df.drop(columns=AS_OF_COLUMNS + ['fund_date'], errors='ignore').copy()
+        as_of = left[date_col] if date_col is not None else pd.Series(date, index=left.index)
+        left['_as_of'] = pd.to_datetime(as_of).astype('datetime64[ns]')
+        left['gvkey'] = left['gvkey'].astype(object)
+        left['_row'] = np.arange(len(left))
+        
+        merged = pd.merge_asof(left.sort_values('_as_of', kind='mergesort'),
+                               self.records[['gvkey', 'available_date', 'fund_date'] + AS_OF_COLUMNS],
+                               left_on='_as_of', right_on='available_date',
+                               by='gvkey', direction='backward')
+        
+        window_start = pd.to_datetime((merged['_as_of'].dt.year - self.lookback_years).astype(str) + '-01-01')
+        stale = merged['fund_date'] < window_start
+        merged.loc[stale, AS_OF_COLUMNS] = np.nan
+        merged.loc[stale, 'fund_date'] = pd.NaT
+        
+        merged = merged.sort_values('_row').drop(columns=['_as_of', '_row', 'available_date'])
+        merged.index = stocks_df.index
+        return merged
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Korea Portfolio Holdings
+
+This module keeps which stock sat in which portfolio in every return month, with
+its weight and return, so that factor returns can be attributed to stocks
+without recomputing the month against WRDS:
+
+    date, gvkey, iid, portfolio, weight, return
+
+There is one row per share class and portfolio of a month (date = month end).
+portfolio is one of the six size/value portfolios (S/L ... B/H) or MKT, weight is
+the share class's value weight in the portfolio and return its monthly return
+in %, so a portfolio's return is the sum of weight * return over its rows.
+
+Holdings are written by the factor calculators (KoreaFactorCalculator.holdings)
+and stored with korea_factor_store, by default as a memory-mapped Arrow store
+to which every update appends the months it calculated. Lookups by month are a
+binary search over the date-sorted rows and lookups by gvkey use a permutation
+of the rows grouped by gvkey, both built once when the store is opened, so a
+lookup takes microseconds regardless of the table size.
+"""
+
+import pandas as pd
+import numpy as np
+from typing import Optional
+import logging
+from korea_factor_calculator import HOLDINGS_PORTFOLIOS
+from korea_factor_store import open_factor_store
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+HOLDINGS_COLUMNS = ['date', 'gvkey', 'iid', 'portfolio', 'weight', 'return']
+
+# Column types of stored holdings, the same in every partition
+HOLDINGS_DTYPES = {'gvkey': str, 'iid': str,
+                   'portfolio': pd.CategoricalDtype(HOLDINGS_PORTFOLIOS), 'weight': float, 'return': float}
+
+
+def month_end(date) -> pd.Timestamp:
+    """Month-end date of a date or month ('2021-03', '2021-03-15', ...)."""
+    return pd.Period(date, freq='M').to_timestamp(how='end').normalize()
+
+
+class HoldingsStore:
+    """
+    Persisted stock holdings with month and gvkey lookups.
+    
+    Example:
+        >>> holdings = HoldingsStore('data/korea_holdings.arrow')
+        >>> holdings.append(calculator.collected_holdings())
+        >>> holdings.attribution('2021-03', 'S/H', top=10)
+        >>> holdings.stock('126313')
+    """
+    
+    def __init__(self, path: str = 'data/korea_holdings.arrow'):
+        """
+        Initialize store.
+        
+        Args:
+            path: Holdings file or store (.arrow, .parquet or .csv, see korea_factor_store)
+        """
+        self.path = path
+        self.store = open_factor_store(path)
+        self._df: Optional[pd.DataFrame] = None
+    
+    def append(self, holdings: pd.DataFrame):
+        """Add the holdings of one or more months, replacing stored months they contain."""
+        if len(holdings) == 0:
+            return
+        self.store.append(holdings[HOLDINGS_COLUMNS].astype(HOLDINGS_DTYPES))
+        self._df = None
+        logger.info(f"Saved {len(holdings)} holdings of {holdings['date'].nunique()} months to {self.path}")
+    
+    def load(self) -> pd.DataFrame:
+        """All holdings sorted by date (read once, then indexed)."""
+        if self._df is None:
+            self._build_index(self.store.load())
+        return self._df
+    
+    def _build_index(self, df: pd.DataFrame):
+        """Date offsets and a gvkey permutation for lookups."""
+        df['gvkey'] = df['gvkey'].astype(str).astype('category')
+        self._df = df
+        self._dates = df['date'].to_numpy()
+        
+        codes = df['gvkey'].cat.codes.to_numpy()
+        self._gvkey_order = np.argsort(codes, kind='stable')
+        self._gvkey_bounds = np.searchsorted(codes[self._gvkey_order], np.arange(len(df['gvkey'].cat.categories) + 1))
+        self._gvkeys = pd.Index(df['gvkey'].cat.categories)
+    
+    def month(self, date) -> pd.DataFrame:
+        """
+        Holdings of a return month.
+        
+        Args:
+            date: Any date in the month, or 'YYYY-MM'
+        
+        Returns:
+            Holdings rows of the month (empty if the month is not stored)
+        """
+        df = self.load()
+        target = np.datetime64(month_end(date), 'ns')
+        lo = np.searchsorted(self._dates, target, side='left')
+        hi = np.searchsorted(self._dates, target, side='right')
+        return df.iloc[lo:hi]
+    
+    def stock(self, gvkey: str) -> pd.DataFrame:
+        """Holdings rows of a gvkey in all months, sorted by date."""
+        df = self.load()
+        code = self._gvkeys.get_indexer([str(gvkey)])[0]
+        if code < 0:
+            return df.iloc[0:0]
+        return df.iloc[self._gvkey_order[self._gvkey_bounds[code]:self._gvkey_bounds[code + 1]]]
+    
+    def portfolio(self, date, portfolio: str) -> pd.DataFrame:
+        """Holdings of one portfolio (e.g. 'S/H' or 'MKT') in a return month."""
+        rows = self.month(date)
+        return rows[rows['portfolio'] == portfolio]
+    
+    def attribution(self, date, portfolio: str, top: Optional[int] = None) -> pd.DataFrame:
+        """
+        Contributions of a portfolio's stocks to its return in a month.
+        
+        Args:
+            date: Any date in the month, or 'YYYY-MM'
+            portfolio: Portfolio name (e.g. 'S/H' or 'MKT')
+            top: Keep only the stocks with the largest absolute contributions
+        
+        Returns:
+            Holdings rows with contribution = weight * return (in %), largest
+            absolute contribution first; contributions sum to the portfolio return
+        """
+        rows = self.portfolio(date, portfolio).copy()
+        rows['contribution'] = rows['weight'] * rows['return']
+        rows = rows.iloc[np.argsort(-rows['contribution'].abs().to_numpy(), kind='stable')]
+        return rows.head(top) if top is not None else rows
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    
+    parser = argparse.ArgumentParser(description='Look up Korea portfolio holdings')
+    parser.add_argument('--holdings', type=str, default='data/korea_holdings.arrow',
+                        help='Holdings store written by the updater (--holdings-file)')
+    parser.add_argument('--month', type=str, default=None, help='Return month (YYYY-MM)')
+    parser.add_argument('--portfolio', type=str, default='MKT', help='Portfolio for attribution (e.g. S/H)')
+    parser.add_argument('--gvkey', type=str, default=None, help='Show the holdings history of a gvkey')
+    parser.add_argument('--top', type=int, default=10, help='Number of largest contributions shown')
+    args = parser.parse_args()
+    
+    print("="*80)
+    print("Korea Portfolio Holdings")
+    print("="*80)
+    
+    holdings = HoldingsStore(args.holdings)
+    t0 = time.perf_counter()
+    df = holdings.load()
+    print(f"\nLoaded {len(df)} holdings of {df['date'].nunique()} months in {time.perf_counter() - t0:.3f}s")
+    
+    if args.month is not None:
+        rows = holdings.attribution(args.month, args.portfolio, top=args.top)
+        total = holdings.portfolio(args.month, args.portfolio)
+        print(f"\n{args.portfolio} in {args.month}: return {(total['weight'] * total['return']).sum():.2f}% "
+              f"({len(total)} stocks), largest contributions (%):")
+        print(rows[['gvkey', 'iid', 'weight', 'return', 'contribution']].to_string(index=False))
+    
+    if args.gvkey is not None:
+        rows = holdings.stock(args.gvkey)
+        print(f"\nHoldings of {args.gvkey}:")
+        print(rows[rows['portfolio'] != 'MKT'][['date', 'iid', 'portfolio', 'weight', 'return']].to_string(index=False))
+    
+    print("\n✅ Completed!")
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Korea Factor Pipeline Metrics
+
+This module records per-stage wall time and data volume (rows fetched, bytes
+transferred, frame memory) of the factor pipeline, so that slow months and
+regressions can be diagnosed from structured logs instead of log lines.
+"""
+
+import pandas as pd
+from typing import Dict, Optional
+from contextlib import contextmanager
+from datetime import datetime
+import json
+import logging
+import os
+import threading
+import time
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_write_lock = threading.Lock()
+
+
+class PipelineMetrics:
+    """
+    Per-stage metrics of one unit of work (e.g. one month of factors).
+    
+    Every stage accumulates: seconds (wall time), rows (rows fetched or
+    produced), bytes (size of fetched results as received, before typing) and
+    memory (deep memory of the resulting frame). A disabled instance ignores
+    all records, so callers can instrument unconditionally.
+    
+    Example:
+        >>> metrics = PipelineMetrics('2020-10')
+        >>> with metrics.stage('prices'):
+        ...     df = get_korea_stock_prices(gvkeys, start, end, conn)
+        >>> metrics.record_frame('prices', df)
+        >>> metrics.write_jsonl('data/metrics.jsonl')
+    """
+    
+    FIELDS = ('seconds', 'rows', 'bytes', 'memory')
+    
+    def __init__(self, label: str = '', enabled: bool = True):
+        """
+        Initialize metrics.
+        
+        Args:
+            label: Name of the unit of work (e.g. '2020-10' or 'update')
+            enabled: Whether records are kept
+        """
+        self.label = label
+        self.enabled = enabled
+        self.created = datetime.now().isoformat(timespec='seconds')
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.status: Optional[str] = None
+        self._lock = threading.Lock()
+    
+    @contextmanager
+    def stage(self, name: str):
+        """Time a block of code as (part of) a stage."""
+        if not self.enabled:
+            yield
+            return
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, seconds=time.perf_counter() - t0)
+    
+    def add(self, name: str, seconds: float = 0.0, rows: int = 0, bytes: int = 0, memory: int = 0):
+        """Add wall time and data volume to a stage."""
+        if not self.enabled:
+            return
+        with self._lock:
+            stage = self.stages.setdefault(name, dict.fromkeys(self.FIELDS, 0))
+            stage['seconds'] += seconds
+            stage['rows'] += int(rows)
+            stage['bytes'] += int(bytes)
+            stage['memory'] += int(memory)
+    
+    def record_frame(self, name: str, df: pd.DataFrame, fetched: bool = False):
+        """
+        Record the rows and deep memory of a frame produced by a stage.
+        
+        Args:
+            name: Stage name
+            df: Frame produced by the stage
+            fetched: Whether the frame was received from the database as is; its
+                     size then also counts as bytes transferred
+        """
+        if not self.enabled or df is None:
+            return
+        memory = int(df.memory_usage(deep=True).sum())
+        self.add(name, rows=len(df), bytes=memory if fetched else 0, memory=memory)
+    
+    def merge(self, other: 'PipelineMetrics', prefix: str = ''):
+        """Add all stages of another metrics object (optionally prefixed)."""
+        for name, stage in other.stages.items():
+            self.add(prefix + name, **stage)
+    
+    @property
+    def total_seconds(self) -> float:
+        return sum(stage['seconds'] for stage in self.stages.values())
+    
+    def to_dict(self) -> Dict:
+        """Metrics as a JSON-serializable dictionary."""
+        with self._lock:
+            stages = {name: dict(stage) for name, stage in self.stages.items()}
+        return {
+            'label': self.label,
+            'created': self.created,
+            'status': self.status,
+            'total_seconds': sum(stage['seconds'] for stage in stages.values()),
+            'rows_fetched': sum(stage['rows'] for stage in stages.values() if stage['bytes'] > 0),
+            'bytes_fetched': sum(stage['bytes'] for stage in stages.values()),
+            'stages': stages
+        }
+    
+    def summary(self) -> str:
+        """One-line summary of the slowest stages."""
+        stages = sorted(self.stages.items(), key=lambda kv: -kv[1]['seconds'])
+        return ", ".join(f"{name} {stage['seconds']:.2f}s/{stage['rows']} rows" for name, stage in stages[:5])
+    
+    def write_jsonl(self, filepath: str):
+        """Append the metrics as one JSON line (safe to call from several threads)."""
+        if not self.enabled:
+            return
+        line = json.dumps(self.to_dict())
+        with _write_lock:
+            os.makedirs(os.path.dirname(filepath) or '.', exist_ok=True)
+            with open(filepath, 'a') as f:
+                f.write(line + "\n")
+
+
+def null_metrics() -> PipelineMetrics:
+    """Disabled metrics for callers that do not collect any."""
+    return PipelineMetrics(enabled=False)
+
+
+def load_metrics(filepath: str) -> pd.DataFrame:
+    """
+    Load metrics written with PipelineMetrics.write_jsonl as one row per stage.
+    
+    Returns:
+        DataFrame with columns: label, created, status, stage, seconds, rows, bytes, memory
+    
+    Example:
+        >>> m = load_metrics('data/metrics.jsonl')
+        >>> m.pivot_table(index='label', columns='stage', values='seconds')
+    """
+    rows = []
+    with open(filepath, 'r') as f:
+        for line in f:
+            record = json.loads(line)
+            for name, stage in record['stages'].items():
+                rows.append({'label': record['label'], 'created': record['created'],
+                             'status': record['status'], 'stage': name, **stage})
+    return pd.DataFrame(rows, columns=['label', 'created', 'status', 'stage', 'seconds', 'rows', 'bytes', 'memory'])
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Korea Multi-Factor Calculator
+
+This module extends the panel engine of KoreaFactorCalculator with momentum
+(UMD), profitability (RMW) and investment (CMA) factors. The price panel and the
+g_funda records are pulled once for the whole period; every requested factor is
+sorted on the same formation snapshots with the same size breakpoints, and the
+value-weighted returns of all sorts are computed in one grouped pass.
+
+Factor definitions (2x3 size/characteristic sorts, 30th/70th percentiles):
+- UMD = (S/U + B/U)/2 - (S/D + B/D)/2, momentum = return over months t-12 to
+  t-2 of return month t (month end t-13 to month end t-2, the last month end
+  before the formation date at the start of t-1); month t-1 is skipped
+- RMW = (S/R + B/R)/2 - (S/W + B/W)/2, operating profitability =
+  (revt - cogs - xsga - xint) / book equity
+- CMA = (S/C + B/C)/2 - (S/A + B/A)/2, investment = growth of total assets
+  over the previous fiscal year
+"""
+
+import pandas as pd
+import numpy as np
+from typing import Sequence
+import logging
+from korea_factor_calculator import KoreaFactorCalculator, MIN_STOCKS, PORTFOLIOS, month_end_date
+from korea_portfolio_utils import value_weighted_returns
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BASE_FACTORS = ['MKT', 'SMB', 'HML']
+
+# Factor: (characteristic, labels of the low/middle/high terciles, sign of high minus low)
+FACTOR_SORTS = {
+    'UMD': ('momentum', ['D', 'N', 'U'], 1),
+    'RMW': ('profitability', ['W', 'N', 'R'], 1),
+    'CMA': ('investment', ['C', 'N', 'A'], -1),
+}
+
+ALL_FACTORS = BASE_FACTORS + list(FACTOR_SORTS)
+
+# Momentum runs from the month end MOMENTUM_MONTHS before the formation target
+# month (t-1) to the month end MOMENTUM_SKIP months before it (t-12 to t-2)
+MOMENTUM_MONTHS = 12
+MOMENTUM_SKIP = 1
+
+
+class KoreaMultiFactorCalculator(KoreaFactorCalculator):
+    """
+    Calculate MKT, SMB, HML and any of UMD, RMW, CMA from one panel pull.
+    
+    MKT, SMB and HML are exactly those of calculate_factors_panel. The extra
+    factors use the same formation dates, universe (stocks with positive book
+    equity) and size median as the 2x3 size/B-M sort; a month where an extra
+    factor has an empty portfolio gets NaN for that factor only.
+    
+    Example:
+        >>> calculator = KoreaMultiFactorCalculator(conn)
+        >>> factors = calculator.calculate_multi_factors('2020-10-01', '2021-09-30', ['UMD', 'RMW', 'CMA'])
+    """
+    
+    def calculate_multi_factors(self, start_date: str, end_date: str,
+                                factors: Sequence[str] = tuple(ALL_FACTORS),
+                                max_days_back: int = 10) -> pd.DataFrame:
+        """
+        Calculate the requested factors for every month of a period.
+        
+        Args:
+            start_date: Start date in 'YYYY-MM-DD' format
+            end_date: End date in 'YYYY-MM-DD' format
+            factors: Factors to add to MKT, SMB and HML (any of UMD, RMW, CMA)
+            max_days_back: Maximum days to search backwards for a formation day
+        
+        Returns:
+            DataFrame with date, MKT, SMB, HML, the requested extra factors, RF
+        """
+        extra = [f for f in FACTOR_SORTS if f in factors]
+        unknown = [f for f in factors if f not in ALL_FACTORS]
+        if unknown:
+            raise ValueError(f"Unknown factors: {unknown}")
+        
+        logger.info(f"Calculating {BASE_FACTORS + extra} from {start_date} to {end_date} (multi-factor panel)")
+        
+        history = MOMENTUM_MONTHS + 1 if 'UMD' in extra else 0
+        prices, stocks, valid_months = self._panel_portfolios(start_date, end_date, max_days_back, history)
+        
+        # Characteristics on the formation snapshots
+        stocks = self.formation_characteristics(prices, stocks, extra)
+        
+        # One membership table for all sorts: (month, gvkey, sort, portfolio)
+        membership = [stocks[['month', 'gvkey', 'portfolio']].assign(sort='BM')]
+        for factor in extra:
+            membership.append(self.assign_characteristic_portfolios(stocks, factor).assign(sort=factor))
+        membership = pd.concat([m.astype({'portfolio': str}) for m in membership], ignore_index=True)
+        membership = membership.drop_duplicates()
+        
+        # Month-end returns of the formation universe, value-weighted per (month, sort, portfolio)
+        monthly = self._panel_monthly_returns(prices)
+        universe = stocks[['month', 'gvkey']].drop_duplicates()
+        monthly = monthly.merge(universe, on=['month', 'gvkey'], how='inner')
+        members = monthly.merge(membership, on=['month', 'gvkey'], how='inner')
+        
+        vw = value_weighted_returns(members, ['month', 'sort', 'portfolio'])['return']
+        market_return = value_weighted_returns(monthly, 'month')['return'].reindex(valid_months)
+        
+        base = vw.xs('BM', level='sort').unstack('portfolio').reindex(index=valid_months, columns=PORTFOLIOS)
+        incomplete = base.isna().any(axis=1) | market_return.isna()
+        for month in valid_months[incomplete.values]:
+            logger.warning(f"Empty portfolio for {month}, skipping")
+        valid_months = valid_months[~incomplete.values]
+        base = base[~incomplete.values]
+        market_return = market_return[~incomplete.values]
+        
+        # Stock holdings of the size/B-M portfolios and the market (see korea_holdings)
+        kept = members['month'].isin(valid_months) & (members['sort'] == 'BM')
+        self._keep_holdings(self.stock_holdings(members[kept], monthly[monthly['month'].isin(valid_months)]))
+        
+        result = {
+            'MKT': market_return - self.risk_free_rate,
+            'SMB': (base['S/L'] + base['S/M'] + base['S/H']) / 3 - (base['B/L'] + base['B/M'] + base['B/H']) / 3,
+            'HML': (base['S/L'] + base['B/L']) / 2 - (base['S/H'] + base['B/H']) / 2,
+        }
+        for factor in extra:
+            _, labels, sign = FACTOR_SORTS[factor]
+            low, high = labels[0], labels[2]
+            cells = vw.xs(factor, level='sort').unstack('portfolio').reindex(
+                index=valid_months, columns=[f"{s}/{v}" for s in 'SB' for v in labels])
+            result[factor] = sign * ((cells[f"S/{high}"] + cells[f"B/{high}"]) / 2 -
+                                     (cells[f"S/{low}"] + cells[f"B/{low}"]) / 2)
+            for month in valid_months[result[factor].isna().values]:
+                logger.warning(f"Empty {factor} portfolio for {month}, {factor} left missing")
+        
+        df = pd.DataFrame({'date': [month_end_date(m.year, m.month) for m in valid_months]})
+        for factor in BASE_FACTORS + extra:
+            df[factor] = (result[factor] * 100).values
+        df['RF'] = self.risk_free_rate * 100
+        logger.info(f"Calculated factors for {len(df)} months")
+        
+        return df
+    
+    def formation_characteristics(self, prices: pd.DataFrame, stocks: pd.DataFrame,
+                                  factors: Sequence[str]) -> pd.DataFrame:
+        """
+        Attach the sort characteristics of the requested factors to formation snapshots.
+        
+        Args:
+            prices: Daily price panel (covering MOMENTUM_MONTHS + 1 months before
+                    the first formation date if momentum is requested)
+            stocks: Formation snapshots (month, formation, gvkey, iid, market_cap, ceq,
+                    op, inv, ...), e.g. from _panel_portfolios
+            factors: Factors whose characteristics are needed
+        
+        Returns:
+            Copy of stocks with momentum, profitability and/or investment columns
+        """
+        stocks = stocks.copy()
+        
+        if 'UMD' in factors:
+            # Last adjusted prices on or before the month ends MOMENTUM_SKIP and
+            # MOMENTUM_MONTHS months before the formation target month (not the
+            # formation day's month, which is earlier when the target is no trading day)
+            adjusted = prices[['gvkey', 'iid', 'datadate']].astype({'gvkey': object, 'iid': object})
+            adjusted['adjusted_price'] = prices['prccd'] / prices['ajexdi']
+            adjusted = adjusted[adjusted['adjusted_price'].notna()].sort_values('datadate', kind='mergesort')
+            target_months = {m: pd.Period(self.formation_target(m.year, m.month), freq='M')
+                             for m in stocks['month'].unique()}
+            formation_month = stocks['month'].map(target_months).astype(stocks['month'].dtype)
+            
+            def price_at_month_end(months_back: int) -> np.ndarray:
+                left = stocks[['gvkey', 'iid']].astype(object)
+                left['_row'] = np.arange(len(stocks))
+                left['target'] = (formation_month - months_back).dt.to_timestamp(how='end') \
+                                                                .dt.normalize().astype('datetime64[ns]').values
+                found = pd.merge_asof(left.sort_values('target', kind='mergesort'), adjusted,
+                                      left_on='target', right_on='datadate', by=['gvkey', 'iid'],
+                                      direction='backward', tolerance=pd.Timedelta(days=10))
+                return found.set_index('_row')['adjusted_price'].sort_index().to_numpy(dtype=float)
+            
+            stocks['momentum'] = price_at_month_end(MOMENTUM_SKIP) / price_at_month_end(MOMENTUM_MONTHS) - 1
+        
+        if 'RMW' in factors:
+            stocks['profitability'] = stocks['op'] / stocks['ceq']
+        
+        if 'CMA' in factors:
+            stocks['investment'] = stocks['inv']
+        
+        return stocks
+    
+    def assign_characteristic_portfolios(self, stocks: pd.DataFrame, factor: str) -> pd.DataFrame:
+        """
+        2x3 size/characteristic sort of a factor for every month at once.
+        
+        Size uses the median market cap of the whole formation universe of the
+        month (the breakpoint of the size/B-M sort); characteristic breakpoints
+        are the 30th and 70th percentiles of the stocks with the characteristic.
+        
+        Args:
+            stocks: Formation snapshots with month, gvkey, market_cap and the
+                    factor's characteristic (see formation_characteristics)
+            factor: 'UMD', 'RMW' or 'CMA'
+        
+        Returns:
+            DataFrame with month, gvkey, portfolio (e.g. 'S/U') for stocks with
+            the characteristic, in months with at least MIN_STOCKS of them
+        """
+        characteristic, labels, _ = FACTOR_SORTS[factor]
+        size_median = stocks.groupby('month')['market_cap'].transform('median')
+        
+        df = stocks.assign(size_median=size_median)
+        df = df[df[characteristic].notna() & np.isfinite(df[characteristic])]
+        counts = df.groupby('month')['gvkey'].transform('size')
+        df = df[counts >= MIN_STOCKS]
+        
+        groups = df.groupby('month')[characteristic]
+        low = groups.transform(lambda x: x.quantile(0.30)).to_numpy()
+        high = groups.transform(lambda x: x.quantile(0.70)).to_numpy()
+        
+        x = df[characteristic].to_numpy(dtype=float)
+        size_code = np.where(df['market_cap'].to_numpy(dtype=float) <= df['size_median'].to_numpy(dtype=float), 0, 1)
+        char_code = np.where(x <= low, 0, np.where(x >= high, 2, 1))
+        cells = [f"{s}/{v}" for s in 'SB' for v in labels]
+        
+        return pd.DataFrame({
+            'month': df['month'].values,
+            'gvkey': df['gvkey'].values,
+            'portfolio': pd.Categorical.from_codes(size_code * 3 + char_code, categories=cells)
+        })
+
+
+if __name__ == "__main__":
+    import argparse
+    from korea_connection import connect_wrds
+    
+    parser = argparse.ArgumentParser(description='Calculate Korea multi-factor returns')
+    parser.add_argument('--start-date', type=str, default='2020-10-01', help='Start date (YYYY-MM-DD)')
+    parser.add_argument('--end-date', type=str, default='2020-12-31', help='End date (YYYY-MM-DD)')
+    parser.add_argument('--factors', type=str, nargs='+', default=list(FACTOR_SORTS),
+                        choices=list(FACTOR_SORTS), help='Factors to add to MKT, SMB and HML')
+    parser.add_argument('--output', type=str, default='data/korea_factors_multi_test.csv', help='Output file')
+    args = parser.parse_args()
+    
+    conn = connect_wrds()
+    calculator = KoreaMultiFactorCalculator(conn)
+    
+    print("="*80)
+    print("Korea Multi-Factor Calculator")
+    print("="*80)
+    
+    factors = calculator.calculate_multi_factors(args.start_date, args.end_date, args.factors)
+    print("\nCalculated factors:")
+    print(factors)
+    
+    calculator.save_factors(factors, args.output)
+    conn.close()
+    print("\n✅ Completed!")
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Korea Characteristic-Sorted Portfolios
+
+This module builds test-asset portfolios (e.g. 5x5 size/B-M, 10 momentum deciles)
+from the same formation snapshots as the factor calculators. Any grid of
+breakpoint quantiles on one or more characteristics is sorted for all months in
+one pass, and value- and equal-weighted returns of every cell are computed in one
+grouped aggregation.
+
+Characteristics: market_cap, book_to_market, momentum, profitability, investment
+(see korea_multi_factor for their definitions).
+"""
+
+import pandas as pd
+import numpy as np
+from typing import Dict, Optional, Sequence, Union
+import logging
+from korea_factor_calculator import month_end_date, month_range
+from korea_multi_factor import KoreaMultiFactorCalculator, FACTOR_SORTS, MOMENTUM_MONTHS
+from korea_portfolio_utils import sort_portfolios, value_weighted_returns
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Short names used in portfolio labels (e.g. 'ME1_BM5')
+CHARACTERISTIC_LABELS = {
+    'market_cap': 'ME',
+    'book_to_market': 'BM',
+    'momentum': 'MOM',
+    'profitability': 'OP',
+    'investment': 'INV',
+}
+
+# Characteristic -> factor whose snapshot characteristic it is
+CHARACTERISTIC_FACTORS = {characteristic: factor for factor, (characteristic, _, _) in FACTOR_SORTS.items()}
+
+
+def largest_stocks_mask(stocks: pd.DataFrame, n: int, by: str = 'month') -> np.ndarray:
+    """Mask of the n largest stocks by market cap within each group (a breakpoint universe)."""
+    return (stocks.groupby(by)['market_cap'].rank(ascending=False, method='first') <= n).to_numpy()
+
+
+def test_assets(portfolios: pd.DataFrame, weighting: str = 'vw') -> pd.DataFrame:
+    """
+    Wide monthly returns of sorted portfolios, as read by fama_macbeth_test.load_test_assets.
+    
+    Args:
+        portfolios: Long output of KoreaPortfolioSorter.calculate_sorted_portfolios
+        weighting: 'vw' (value-weighted) or 'ew' (equal-weighted)
+    
+    Returns:
+        DataFrame with date and one column per portfolio (returns in %)
+    """
+    column = {'vw': 'vw_return', 'ew': 'ew_return'}[weighting]
+    wide = portfolios.pivot(index='date', columns='portfolio', values=column)
+    wide = wide[pd.unique(portfolios['portfolio'])]
+    wide.columns = wide.columns.astype(str)
+    return wide.reset_index().rename_axis(columns=None)
+
+
+class KoreaPortfolioSorter(KoreaMultiFactorCalculator):
+    """
+    Characteristic-sorted portfolio returns from one panel pull.
+    
+    Example:
+        >>> sorter = KoreaPortfolioSorter(conn)
+        >>> portfolios = sorter.calculate_sorted_portfolios('2020-10-01', '2021-09-30',
+        ...                                                 {'market_cap': 5, 'book_to_market': 5})
+        >>> test_assets(portfolios).to_csv('data/test_assets.csv', index=False)
+    """
+    
+    def calculate_sorted_portfolios(self, start_date: str, end_date: str,
+                                    sorts: Dict[str, Union[int, Sequence[float]]],
+                                    breakpoint_top: Optional[int] = None,
+                                    dependent: bool = False,
+                                    max_days_back: int = 10) -> pd.DataFrame:
+        """
+        Calculate monthly returns of every cell of a characteristic sort.
+        
+        The universe, formation dates and month-end returns are those of the
+        factor panel engine. A gvkey belongs to every cell any of its share
+        classes was sorted into; stocks without one of the characteristics are
+        left out of the sort.
+        
+        Args:
+            start_date: Start date in 'YYYY-MM-DD' format
+            end_date: End date in 'YYYY-MM-DD' format
+            sorts: Characteristic -> number of groups or breakpoint quantiles, in
+                   sort order, e.g. {'market_cap': 5, 'book_to_market': 5}
+            breakpoint_top: Set breakpoints on the largest N stocks of each month
+                            only (default: all stocks)
+            dependent: Sort each characteristic within the groups of the previous
+                       ones instead of independently
+            max_days_back: Maximum days to search backwards for a formation day
+        
+        Returns:
+            Long DataFrame with date, portfolio, vw_return, ew_return (in %) and
+            n_stocks; every cell appears in every month (NaN returns when empty)
+        """
+        unknown = [c for c in sorts if c not in CHARACTERISTIC_LABELS]
+        if unknown:
+            raise ValueError(f"Unknown characteristics: {unknown}")
+        
+        logger.info(f"Sorting portfolios on {dict(sorts)} from {start_date} to {end_date}")
+        
+        columns = ['date', 'portfolio', 'vw_return', 'ew_return', 'n_stocks']
+        if len(month_range(start_date, end_date)) == 0:
+            return pd.DataFrame(columns=columns)
+        
+        factors = [CHARACTERISTIC_FACTORS[c] for c in sorts if c in CHARACTERISTIC_FACTORS]
+        history = MOMENTUM_MONTHS + 1 if 'UMD' in factors else 0
+        prices, stocks, valid_months = self._panel_portfolios(start_date, end_date, max_days_back, history)
+        stocks = self.formation_characteristics(prices, stocks, factors)
+        
+        mask = largest_stocks_mask(stocks, breakpoint_top) if breakpoint_top is not None else None
+        sorted_stocks = sort_portfolios(stocks, sorts, by='month', breakpoint_mask=mask, dependent=dependent,
+                                        labels=CHARACTERISTIC_LABELS)
+        membership = sorted_stocks[['month', 'gvkey', 'portfolio']].drop_duplicates()
+        
+        # Month-end returns of the formation universe, all cells of all months in one pass
+        monthly = self._panel_monthly_returns(prices)
+        members = monthly.merge(membership, on=['month', 'gvkey'], how='inner')
+        cells = value_weighted_returns(members, ['month', 'portfolio'], equal_weighted=True)
+        
+        grid = pd.MultiIndex.from_product([valid_months, membership['portfolio'].cat.categories],
+                                          names=['month', 'portfolio'])
+        cells = cells.reindex(grid)
+        
+        df = pd.DataFrame({
+            'date': [month_end_date(m.year, m.month) for m in grid.get_level_values('month')],
+            'portfolio': grid.get_level_values('portfolio'),
+            'vw_return': (cells['return'] * 100).values,
+            'ew_return': (cells['ew_return'] * 100).values,
+            'n_stocks': cells['n_stocks'].fillna(0).astype(int).values
+        })
+        
+        empty = df.groupby('date')['n_stocks'].min() == 0
+        for date in empty.index[empty.values]:
+            logger.warning(f"Empty sorted portfolio in {date}")
+        logger.info(f"Calculated {grid.levshape[1]} portfolios for {len(valid_months)} months")
+        
+        return df
+
+
+def parse_sort(spec: str):
+    """Parse 'characteristic=5' or 'characteristic=0.3,0.7' from the command line."""
+    column, _, groups = spec.partition('=')
+    if ',' in groups or '.' in groups:
+        return column, [float(q) for q in groups.split(',')]
+    return column, int(groups)
+
+
+if __name__ == "__main__":
+    import argparse
+    from korea_connection import connect_wrds
+    
+    parser = argparse.ArgumentParser(description='Calculate Korea characteristic-sorted portfolios')
+    parser.add_argument('--start-date', type=str, default='2020-10-01', help='Start date (YYYY-MM-DD)')
+    parser.add_argument('--end-date', type=str, default='2021-09-30', help='End date (YYYY-MM-DD)')
+    parser.add_argument('--sort', type=str, nargs='+', default=['market_cap=5', 'book_to_market=5'],
+                        help='Sorts in order: characteristic=groups or characteristic=q1,q2,... '
+                             f"(characteristics: {', '.join(CHARACTERISTIC_LABELS)})")
+    parser.add_argument('--breakpoint-top', type=int, default=None,
+                        help='Breakpoints from the largest N stocks of each month only')
+    parser.add_argument('--dependent', action='store_true',
+                        help='Sort each characteristic within the groups of the previous ones')
+    parser.add_argument('--weighting', type=str, default='vw', choices=['vw', 'ew'],
+                        help='Returns written to the output file')
+    parser.add_argument('--output', type=str, default='data/test_assets.csv',
+                        help='Output CSV (date + one column per portfolio, returns in %%)')
+    args = parser.parse_args()
+    
+    conn = connect_wrds()
+    sorter = KoreaPortfolioSorter(conn)
+    
+    print("="*80)
+    print("Korea Characteristic-Sorted Portfolios")
+    print("="*80)
+    
+    sorts = dict(parse_sort(spec) for spec in args.sort)
+    portfolios = sorter.calculate_sorted_portfolios(args.start_date, args.end_date, sorts,
+                                                    breakpoint_top=args.breakpoint_top,
+                                                    dependent=args.dependent)
+    
+    assets = test_assets(portfolios, args.weighting)
+    print("\nAverage monthly returns (%):")
+    print(assets.drop(columns='date').mean().round(3).to_string())
+    
+    assets.to_csv(args.output, index=False)
+    conn.close()
+    print(f"\nSaved {assets.shape[1] - 1} portfolios to {args.output}")
+    print("\n✅ Completed!")
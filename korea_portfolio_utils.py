@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Korea Portfolio Utilities
+
+This module provides vectorized portfolio aggregation helpers shared by the factor
+calculators.
+"""
+
+import pandas as pd
+import numpy as np
+import itertools
+from typing import Dict, List, Optional, Sequence, Union
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def value_weighted_returns(df: pd.DataFrame, by: Union[str, List[str]],
+                           return_col: str = 'monthly_return',
+                           weight_col: str = 'market_cap',
+                           groups: Optional[Sequence] = None,
+                           total: Optional[str] = None,
+                           equal_weighted: bool = False) -> pd.DataFrame:
+    """
+    Calculate value-weighted returns, total caps and stock counts per group in one pass.
+    
+    Rows without a return are ignored; rows without a weight count as stocks but
+    add nothing to the weighted sums. A group with no stocks or a zero total cap
+    gets a NaN return, so callers must decide how to treat it.
+    
+    Args:
+        df: DataFrame with the grouping column(s), return_col and weight_col
+        by: Grouping column name or list of names
+        return_col: Column with returns
+        weight_col: Column with weights (market caps)
+        groups: Groups that must appear in the result even when empty
+        total: If given (single grouping column only), add a group with this label
+               over all distinct rows of df; rows sharing an index label count once,
+               e.g. a stock merged into several portfolios
+        equal_weighted: Also return the equal-weighted return of each group
+    
+    Returns:
+        DataFrame indexed by group with columns: return, total_cap, n_stocks
+        (and ew_return if equal_weighted)
+    
+    Example:
+        >>> vw = value_weighted_returns(members, 'portfolio', groups=PORTFOLIOS, total='MKT')
+    """
+    keys = [by] if isinstance(by, str) else list(by)
+    
+    ret = df[return_col].to_numpy(dtype=float, na_value=np.nan)
+    weight = df[weight_col].to_numpy(dtype=float, na_value=np.nan)
+    has_return = ~np.isnan(ret)
+    weight = np.where(has_return & ~np.isnan(weight), weight, 0.0)
+    weighted = np.where(has_return, ret, 0.0) * weight
+    
+    if len(keys) == 1:
+        codes, uniques = pd.factorize(df[keys[0]], sort=True)
+        if isinstance(uniques, pd.Categorical):
+            uniques = uniques.astype(object)
+        uniques = pd.Index(uniques, name=keys[0])
+    else:
+        codes, uniques = pd.MultiIndex.from_frame(df[keys]).factorize(sort=True)
+        uniques = uniques.set_names(keys)
+    
+    valid = has_return & (codes >= 0)
+    n = len(uniques)
+    weighted_sum = np.bincount(codes[valid], weights=weighted[valid], minlength=n)
+    total_cap = np.bincount(codes[valid], weights=weight[valid], minlength=n)
+    n_stocks = np.bincount(codes[valid], minlength=n)
+    return_sum = np.bincount(codes[valid], weights=ret[valid], minlength=n)
+    
+    result = pd.DataFrame({'weighted_sum': weighted_sum, 'total_cap': total_cap,
+                           'n_stocks': n_stocks, 'return_sum': return_sum}, index=uniques)
+    
+    if groups is not None:
+        result = result.reindex(groups, fill_value=0)
+    
+    if total is not None:
+        distinct = has_return & ~df.index.duplicated()
+        result.loc[total] = [weighted[distinct].sum(), weight[distinct].sum(), distinct.sum(),
+                             ret[distinct].sum()]
+    
+    result['n_stocks'] = result['n_stocks'].astype(int)
+    result['return'] = result['weighted_sum'] / result['total_cap'].where(result['total_cap'] > 0)
+    
+    if equal_weighted:
+        result['ew_return'] = result['return_sum'] / result['n_stocks'].where(result['n_stocks'] > 0)
+        return result[['return', 'ew_return', 'total_cap', 'n_stocks']]
+    return result[['return', 'total_cap', 'n_stocks']]
+
+
+def value_weights(df: pd.DataFrame, by: Union[str, List[str]],
+                  return_col: str = 'monthly_return',
+                  weight_col: str = 'market_cap') -> np.ndarray:
+    """
+    Weight of every row in its group's value-weighted return (see value_weighted_returns).
+    
+    Rows without a return or weight get weight 0, and the weights of a group
+    sum to 1 (NaN in a group with zero total cap), so that the group return is
+    the sum of weight * return.
+    
+    Example:
+        >>> members['weight'] = value_weights(members, ['month', 'portfolio'])
+    """
+    keys = [by] if isinstance(by, str) else list(by)
+    
+    ret = df[return_col].to_numpy(dtype=float, na_value=np.nan)
+    weight = df[weight_col].to_numpy(dtype=float, na_value=np.nan)
+    weight = np.where(~np.isnan(ret) & ~np.isnan(weight), weight, 0.0)
+    
+    if len(keys) == 1:
+        codes = pd.factorize(df[keys[0]])[0]
+    else:
+        codes = pd.MultiIndex.from_frame(df[keys]).factorize()[0]
+    
+    valid = codes >= 0
+    total_cap = np.bincount(codes[valid], weights=weight[valid], minlength=1)
+    total = np.where(valid, total_cap[np.where(valid, codes, 0)], np.nan)
+    return weight / np.where(total > 0, total, np.nan)
+
+
+def breakpoint_quantiles(spec: Union[int, Sequence[float]]) -> List[float]:
+    """
+    Breakpoint quantiles from a number of groups (5 -> quintiles) or explicit quantiles.
+    
+    Example:
+        >>> breakpoint_quantiles(5)
+        [0.2, 0.4, 0.6, 0.8]
+        >>> breakpoint_quantiles([0.3, 0.7])
+        [0.3, 0.7]
+    """
+    if isinstance(spec, (int, np.integer)):
+        if spec < 1:
+            raise ValueError(f"Number of groups must be positive, got {spec}")
+        return [i / spec for i in range(1, spec)]
+    quantiles = sorted(float(q) for q in spec)
+    if any(q <= 0 or q >= 1 for q in quantiles):
+        raise ValueError(f"Breakpoint quantiles must be between 0 and 1, got {list(spec)}")
+    return quantiles
+
+
+def characteristic_breakpoints(df: pd.DataFrame, column: str, quantiles: Sequence[float],
+                               by: Union[str, List[str]],
+                               mask: Optional[np.ndarray] = None) -> pd.DataFrame:
+    """
+    Breakpoints of a characteristic within every group, all groups in one pass.
+    
+    Args:
+        df: DataFrame with the grouping column(s) and the characteristic
+        column: Characteristic column
+        quantiles: Breakpoint quantiles (e.g. [0.3, 0.7])
+        by: Grouping column name or list of names (e.g. 'month')
+        mask: Rows whose values set the breakpoints (default: all rows with a value)
+    
+    Returns:
+        DataFrame indexed by group with one column per quantile
+    """
+    keys = [by] if isinstance(by, str) else list(by)
+    rows = df[keys + [column]]
+    if mask is not None:
+        rows = rows[np.asarray(mask, dtype=bool)]
+    return rows.groupby(keys, observed=True)[column].quantile(list(quantiles)).unstack()
+
+
+def assign_quantile_ranks(df: pd.DataFrame, column: str, breakpoints: pd.DataFrame,
+                          by: Union[str, List[str]]) -> np.ndarray:
+    """
+    Rank every row against its group's breakpoints with a single searchsorted.
+    
+    Values and breakpoints are replaced by their dense rank in the union of both,
+    so that key = group * (number of distinct values + 1) + rank is sorted within
+    and across groups; one searchsorted over the flattened breakpoint keys then
+    ranks all rows of all groups at once. A value equal to a breakpoint goes to
+    the lower group.
+    
+    Args:
+        df: DataFrame with the grouping column(s) and the characteristic
+        column: Characteristic column
+        breakpoints: Breakpoints per group (see characteristic_breakpoints)
+        by: Grouping column name or list of names
+    
+    Returns:
+        Array of ranks 1..len(quantiles)+1 (0 where the value or the group's
+        breakpoints are missing)
+    """
+    keys = [by] if isinstance(by, str) else list(by)
+    n_breaks = breakpoints.shape[1]
+    
+    if len(keys) == 1:
+        group = breakpoints.index.get_indexer(df[keys[0]])
+    else:
+        group = breakpoints.index.get_indexer(pd.MultiIndex.from_frame(df[keys]))
+    bp = breakpoints.to_numpy(dtype=float)
+    x = df[column].to_numpy(dtype=float, na_value=np.nan)
+    valid_group = ~np.isnan(bp).any(axis=1)
+    valid = (group >= 0) & ~np.isnan(x)
+    valid[valid] = valid_group[group[valid]]
+    
+    values, rank = np.unique(np.concatenate([bp[valid_group].ravel(), x[valid]]), return_inverse=True)
+    stride = len(values) + 1
+    bp_rank = rank[:valid_group.sum() * n_breaks].reshape(-1, n_breaks)
+    bp_keys = (np.flatnonzero(valid_group)[:, None] * stride + bp_rank).ravel()
+    x_keys = group[valid] * stride + rank[valid_group.sum() * n_breaks:]
+    
+    ranks = np.zeros(len(df), dtype=int)
+    position = np.searchsorted(bp_keys, x_keys, side='left')
+    group_position = np.searchsorted(np.flatnonzero(valid_group), group[valid])
+    ranks[valid] = position - group_position * n_breaks + 1
+    return ranks
+
+
+def sort_portfolios(df: pd.DataFrame, sorts: Dict[str, Union[int, Sequence[float]]],
+                    by: Union[str, List[str]] = 'month',
+                    breakpoint_mask: Optional[np.ndarray] = None,
+                    dependent: bool = False,
+                    labels: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+    """
+    N x M (x ...) characteristic sort of every group (e.g. month) at once.
+    
+    Args:
+        df: DataFrame with the grouping column(s) and the characteristics
+        sorts: Characteristic -> number of groups or breakpoint quantiles, in sort
+               order, e.g. {'market_cap': 5, 'book_to_market': 5} or
+               {'market_cap': [0.5], 'momentum': [0.3, 0.7]}
+        by: Grouping column name or list of names
+        breakpoint_mask: Rows whose values set the breakpoints (e.g. the largest
+                         stocks); all rows are still assigned
+        dependent: Compute each characteristic's breakpoints within the groups of
+                   the previous characteristics (conditional sort) instead of
+                   independently
+        labels: Short names of the characteristics used in portfolio labels
+                (default: column names)
+    
+    Returns:
+        Rows of df with every characteristic, with a <characteristic>_rank column
+        per sort (1 = lowest) and a 'portfolio' label such as 'ME1_BM5'
+    
+    Example:
+        >>> sorted_df = sort_portfolios(stocks, {'market_cap': 5, 'book_to_market': 5},
+        ...                             labels={'market_cap': 'ME', 'book_to_market': 'BM'})
+    """
+    keys = [by] if isinstance(by, str) else list(by)
+    labels = labels or {}
+    
+    has_all = np.ones(len(df), dtype=bool)
+    for column in sorts:
+        has_all &= np.isfinite(df[column].to_numpy(dtype=float, na_value=np.nan))
+    result = df[has_all].copy()
+    mask = None if breakpoint_mask is None else np.asarray(breakpoint_mask, dtype=bool)[has_all]
+    
+    group_keys = list(keys)
+    n_groups = []
+    for column, spec in sorts.items():
+        quantiles = breakpoint_quantiles(spec)
+        n_groups.append(len(quantiles) + 1)
+        rank_col = f"{column}_rank"
+        if quantiles:
+            breakpoints = characteristic_breakpoints(result, column, quantiles, group_keys, mask)
+            result[rank_col] = assign_quantile_ranks(result, column, breakpoints, group_keys)
+        else:
+            result[rank_col] = 1
+        if dependent:
+            group_keys.append(rank_col)
+    
+    rank_cols = [f"{column}_rank" for column in sorts]
+    result = result[(result[rank_cols] > 0).all(axis=1)]
+    
+    # Cell code in mixed radix of the group counts, labelled like 'ME1_BM5'
+    code = np.zeros(len(result), dtype=int)
+    for rank_col, n in zip(rank_cols, n_groups):
+        code = code * n + result[rank_col].to_numpy() - 1
+    cells = ['_'.join(f"{labels.get(c, c)}{r}" for c, r in zip(sorts, ranks))
+             for ranks in itertools.product(*[range(1, n + 1) for n in n_groups])]
+    result['portfolio'] = pd.Categorical.from_codes(code, categories=cells)
+    
+    return result
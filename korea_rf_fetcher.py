@@ -8,25 +8,75 @@
 
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import json
 import logging
+import os
+import time
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+# 국고채(1년) 수익률 통계표 및 항목 코드
+STAT_CODE = "817Y002"
+ITEM_CODE = "010190000"
+
+# ECOS result code when a query has no rows
+NO_DATA_CODE = "INFO-200"
+
+
+class ECOSError(Exception):
+    """Error response from the ECOS API."""
+
+
 class KoreaRiskFreeRateFetcher:
-    """한국 무위험 수익률 조회 클래스"""
+    """
+    한국 무위험 수익률 조회 클래스
     
-    def __init__(self, api_key: str = None):
+    Daily ranges are fetched page by page (ECOS returns at most page_size rows
+    per request), with the pages after the first fetched concurrently on one
+    pooled HTTP session. Failed requests are retried with exponential backoff.
+    With a cache_dir, fetched days are kept on disk and only days outside the
+    cached range are requested.
+    
+    Example:
+        >>> fetcher = KoreaRiskFreeRateFetcher(api_key, cache_dir='data/cache/ecos')
+        >>> daily = fetcher.fetch_treasury_1year('20001001', '20251031')
+    """
+    
+    def __init__(self, api_key: str = None, base_url: str = "https://ecos.bok.or.kr/api",
+                 cache_dir: Optional[str] = None, page_size: int = 10000, workers: int = 4,
+                 max_retries: int = 3, backoff: float = 1.0, timeout: float = 30.0):
         """
         Initialize fetcher.
         
         Args:
             api_key: ECOS API key (https://ecos.bok.or.kr/api/)
+            base_url: ECOS API root (e.g. a local stand-in server for testing)
+            cache_dir: Directory of the on-disk daily rate cache (default: no cache)
+            page_size: Rows requested per page (ECOS allows at most 10000)
+            workers: Pages fetched concurrently (also the connection pool size)
+            max_retries: Retries of a failed request
+            backoff: Seconds before the first retry, doubled on every further retry
+            timeout: Seconds before a request times out
         """
         self.api_key = api_key
-        self.base_url = "https://ecos.bok.or.kr/api"
+        self.base_url = base_url.rstrip('/')
+        self.cache_dir = cache_dir
+        self.page_size = page_size
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
         
     def fetch_treasury_1year(self, start_date: str, end_date: str) -> pd.DataFrame:
         """
@@ -37,43 +87,151 @@ class KoreaRiskFreeRateFetcher:
             end_date: 종료일 (YYYYMMDD)
             
         Returns:
-            DataFrame with columns: date, rate (annual %)
+            DataFrame with columns: date, rate (annual %); empty only if ECOS has
+            no observations in the range
+        
+        Raises:
+            ECOSError: If ECOS returns an error or fewer rows than it reports
+            requests.RequestException: If a request still fails after all retries
         """
         if not self.api_key:
             raise ValueError("ECOS API key required. Get it from https://ecos.bok.or.kr/api/")
         
-        # ECOS API 호출
-        stat_code = "817Y002"  # 국고채(1년) 수익률
-        item_code = "010190000"  # 국고채(1년)
-        
-        url = f"{self.base_url}/StatisticSearch/{self.api_key}/json/kr/1/10000/{stat_code}/D/{start_date}/{end_date}/{item_code}"
-        
         logger.info(f"Fetching Korea 1-year treasury rates from {start_date} to {end_date}")
         
         try:
-            response = requests.get(url)
-            response.raise_for_status()
-            data = response.json()
-            
-            if 'StatisticSearch' not in data:
-                logger.error(f"API Error: {data}")
-                return pd.DataFrame()
+            cached, covered = self._read_cache()
+            frames = [cached]
+            for fetch_start, fetch_end in self._missing_ranges(start_date, end_date, covered):
+                frames.append(self._fetch_range(fetch_start, fetch_end))
             
-            rows = data['StatisticSearch']['row']
+            df = pd.concat(frames, ignore_index=True)
+            df = df.drop_duplicates('date', keep='last').sort_values('date').reset_index(drop=True)
             
-            # DataFrame 생성
-            df = pd.DataFrame(rows)
-            df['date'] = pd.to_datetime(df['TIME'], format='%Y%m%d')
-            df['rate'] = pd.to_numeric(df['DATA_VALUE'])
+            if self.cache_dir is not None and len(frames) > 1:
+                bounds = [start_date, end_date] + (list(covered) if covered else [])
+                self._write_cache(df, min(bounds), max(bounds))
             
-            df = df[['date', 'rate']].sort_values('date').reset_index(drop=True)
+            in_range = (df['date'] >= pd.Timestamp(start_date)) & (df['date'] <= pd.Timestamp(end_date))
+            df = df[in_range].reset_index(drop=True)
             
             logger.info(f"Retrieved {len(df)} daily observations")
             return df
             
         except Exception as e:
             logger.error(f"Failed to fetch data: {e}")
-            return pd.DataFrame()
+            raise
+    
+    def _fetch_range(self, start_date: str, end_date: str) -> pd.DataFrame:
+        """Fetch all pages of a date range: the first page, then the rest concurrently."""
+        first, total = self._fetch_page(start_date, end_date, 1)
+        pages = [(start, start + self.page_size - 1) for start in range(1 + self.page_size, total + 1, self.page_size)]
+        
+        rows = list(first)
+        if pages:
+            logger.info(f"Fetching {len(pages)} more pages ({total} rows) with {self.workers} workers")
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                for page_rows, _ in pool.map(lambda page: self._fetch_page(start_date, end_date, *page), pages):
+                    rows.extend(page_rows)
+        
+        if len(rows) != total:
+            raise ECOSError(f"Expected {total} rows from {start_date} to {end_date}, received {len(rows)}")
+        
+        df = pd.DataFrame(rows, columns=['TIME', 'DATA_VALUE'])
+        return pd.DataFrame({
+            'date': pd.to_datetime(df['TIME'], format='%Y%m%d'),
+            'rate': pd.to_numeric(df['DATA_VALUE'])
+        })
+    
+    def _fetch_page(self, start_date: str, end_date: str, first_row: int,
+                    last_row: Optional[int] = None) -> Tuple[List[Dict], int]:
+        """
+        Fetch one page of rows, retrying with exponential backoff.
+        
+        Returns:
+            Tuple of (rows, total number of rows of the query)
+        """
+        last_row = last_row or first_row + self.page_size - 1
+        url = (f"{self.base_url}/StatisticSearch/{self.api_key}/json/kr/{first_row}/{last_row}/"
+               f"{STAT_CODE}/D/{start_date}/{end_date}/{ITEM_CODE}")
+        
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.get(url, timeout=self.timeout)
+                response.raise_for_status()
+                data = response.json()
+                break
+            except (requests.RequestException, ValueError) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff * 2 ** attempt
+                logger.warning(f"Request for rows {first_row}-{last_row} failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+        
+        if 'StatisticSearch' not in data:
+            result = data.get('RESULT', {})
+            if result.get('CODE') == NO_DATA_CODE:
+                return [], 0
+            raise ECOSError(f"API Error: {data}")
+        
+        search = data['StatisticSearch']
+        return search.get('row', []), int(search['list_total_count'])
+    
+    @staticmethod
+    def _missing_ranges(start_date: str, end_date: str,
+                        covered: Optional[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """Date ranges (YYYYMMDD) of a request not covered by the cache."""
+        if covered is None:
+            return [(start_date, end_date)]
+        
+        day = pd.Timedelta(days=1)
+        cached_start, cached_end = pd.Timestamp(covered[0]), pd.Timestamp(covered[1])
+        start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+        
+        # Extend the cached range contiguously so that it never has holes
+        ranges = []
+        if start < cached_start:
+            ranges.append((start, cached_start - day))
+        if end > cached_end:
+            ranges.append((cached_end + day, end))
+        return [(s.strftime('%Y%m%d'), e.strftime('%Y%m%d')) for s, e in ranges]
+    
+    def _cache_paths(self) -> Tuple[str, str]:
+        name = f"{STAT_CODE}_{ITEM_CODE}"
+        return os.path.join(self.cache_dir, f"{name}.csv"), os.path.join(self.cache_dir, f"{name}.json")
+    
+    def _read_cache(self) -> Tuple[pd.DataFrame, Optional[Tuple[str, str]]]:
+        """Cached daily rates and the date range (YYYYMMDD) they cover."""
+        empty = pd.DataFrame({'date': pd.Series(dtype='datetime64[ns]'), 'rate': pd.Series(dtype='float64')})
+        if self.cache_dir is None:
+            return empty, None
+        
+        data_path, meta_path = self._cache_paths()
+        try:
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+            df = pd.read_csv(data_path, parse_dates=['date'], dtype={'rate': 'float64'})
+        except FileNotFoundError:
+            return empty, None
+        
+        logger.info(f"Using {len(df)} cached daily rates from {meta['start_date']} to {meta['end_date']}")
+        return df, (meta['start_date'], meta['end_date'])
+    
+    def _write_cache(self, df: pd.DataFrame, start_date: str, end_date: str):
+        """Write the daily rates and their covered range atomically (temp file then rename)."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        data_path, meta_path = self._cache_paths()
+        
+        # Days after the last available observation may still be published later
+        last_day = df['date'].max().strftime('%Y%m%d') if len(df) > 0 else None
+        if last_day is not None and end_date > last_day:
+            end_date = last_day
+        
+        df.to_csv(data_path + '.tmp', index=False, date_format='%Y-%m-%d')
+        os.replace(data_path + '.tmp', data_path)
+        with open(meta_path + '.tmp', 'w') as f:
+            json.dump({'start_date': start_date, 'end_date': end_date, 'fetched_at': datetime.now().isoformat()}, f)
+        os.replace(meta_path + '.tmp', meta_path)
     
     def calculate_monthly_rf(self, daily_df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -148,6 +306,11 @@ if __name__ == "__main__":
     parser.add_argument('--start-date', type=str, default='20201001', help='Start date (YYYYMMDD)')
     parser.add_argument('--end-date', type=str, default='20251031', help='End date (YYYYMMDD)')
     parser.add_argument('--output', type=str, default='korea_rf_monthly.csv', help='Output file')
+    parser.add_argument('--cache-dir', type=str, default=None,
+                        help='On-disk cache of daily rates; only days not cached are fetched (e.g. data/cache/ecos)')
+    parser.add_argument('--workers', type=int, default=4, help='Result pages fetched concurrently')
+    parser.add_argument('--base-url', type=str, default='https://ecos.bok.or.kr/api',
+                        help='ECOS API root (e.g. a local stand-in server)')
     
     args = parser.parse_args()
     
@@ -166,8 +329,13 @@ if __name__ == "__main__":
         print("\n📖 See ECOS_API_SETUP.md for instructions")
         exit(1)
     
-    fetcher = KoreaRiskFreeRateFetcher(api_key=api_key)
-    fetcher.fetch_and_save(args.start_date, args.end_date, args.output)
+    fetcher = KoreaRiskFreeRateFetcher(api_key=api_key, base_url=args.base_url, cache_dir=args.cache_dir,
+                                       workers=args.workers)
+    try:
+        fetcher.fetch_and_save(args.start_date, args.end_date, args.output)
+    except (ECOSError, requests.RequestException) as e:
+        print(f"❌ Error: {e}")
+        exit(1)
     
     print("\n✅ Risk-free rate data updated!")
     print(f"📁 File: {args.output}")
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Korea Rolling Factor Betas
+
+This module estimates rolling-window factor exposures of every stock at once:
+    
+    R_i,t - R_f,t = a_i + b_i' f_t + e_i,t    over the last `window` periods
+
+Instead of refitting an OLS per stock and window, the cross products X'X, X'y and
+y'y of every stock are accumulated over time with cumulative sums; the sums of a
+window are the difference of two cumulative sums, and the normal equations of
+all (period, stock) windows are solved in one batched solve. A stock's missing
+returns are masked out of its sums, so every window uses exactly the periods in
+which the stock has a return (and all factors are available).
+
+Works on monthly returns (get_korea_monthly_returns) against the monthly factor
+file, or on daily returns against the daily factor file.
+"""
+
+import pandas as pd
+import numpy as np
+from typing import Optional, Sequence
+import logging
+from fama_macbeth_test import batched_lstsq
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+FACTORS = ['MKT', 'SMB', 'HML']
+
+# Date and return columns of the stock-return panel for each frequency
+PANEL_COLUMNS = {
+    'monthly': ('month', 'monthly_return'),
+    'daily': ('datadate', 'daily_return'),
+}
+
+# Cumulative cross products held in memory at once (elements), bounds the stock chunk size
+MAX_CHUNK_ELEMENTS = 4_000_000
+
+
+def return_matrix(stock_returns: pd.DataFrame, dates: pd.Index, frequency: str = 'monthly',
+                  id_cols: Sequence[str] = ('gvkey', 'iid')) -> pd.DataFrame:
+    """
+    Pivot a long stock-return panel onto a factor calendar.
+    
+    Args:
+        stock_returns: Long panel with id_cols, the frequency's date column and
+                       return column (decimal returns, see PANEL_COLUMNS)
+        dates: Factor dates (month ends for monthly returns)
+        frequency: 'monthly' or 'daily'
+        id_cols: Columns identifying a security
+    
+    Returns:
+        Periods x securities returns in % (NaN where a security has no return),
+        columns indexed by id_cols
+    """
+    date_col, return_col = PANEL_COLUMNS[frequency]
+    panel = stock_returns[stock_returns[return_col].notna()]
+    
+    if frequency == 'monthly':
+        row = pd.PeriodIndex(pd.DatetimeIndex(dates), freq='M').get_indexer(
+            pd.PeriodIndex(panel[date_col], freq='M'))
+    else:
+        row = pd.DatetimeIndex(dates).normalize().get_indexer(pd.DatetimeIndex(panel[date_col]).normalize())
+    
+    # Security codes from per-column codes (mixed radix), cheaper than factorizing tuples
+    col = np.zeros(len(panel), dtype=np.int64)
+    levels = []
+    for name in id_cols:
+        codes, uniques = pd.factorize(panel[name].astype(str))
+        col = col * len(uniques) + codes
+        levels.append(uniques)
+    col, combined = pd.factorize(col)
+    arrays = []
+    for uniques in reversed(levels):
+        arrays.append(np.asarray(uniques)[combined % len(uniques)])
+        combined = combined // len(uniques)
+    securities = pd.MultiIndex.from_arrays(arrays[::-1], names=list(id_cols))
+    keep = row >= 0
+    
+    y = np.full((len(dates), len(securities)), np.nan)
+    y[row[keep], col[keep]] = panel[return_col].to_numpy(dtype=float)[keep] * 100
+    return pd.DataFrame(y, index=dates, columns=securities)
+
+
+def _window_sums(values: np.ndarray, window: int) -> np.ndarray:
+    """Sums over the last `window` periods (axis 0) from one cumulative sum."""
+    cumulative = np.cumsum(values, axis=0)
+    sums = cumulative.copy()
+    sums[window:] -= cumulative[:-window]
+    return sums
+
+
+def rolling_regressions(returns: pd.DataFrame, factors: pd.DataFrame, window: int = 60,
+                        min_obs: int = 36, chunk_size: Optional[int] = None) -> pd.DataFrame:
+    """
+    Rolling OLS of every column of returns on the factors, all windows at once.
+    
+    Args:
+        returns: Periods x securities (excess) returns
+        factors: Periods x factors returns (same index as returns)
+        window: Periods in each window, ending at (and including) the estimation date
+        min_obs: Minimum returns in a window for an estimate
+        chunk_size: Securities processed at once (default: bounded by MAX_CHUNK_ELEMENTS)
+    
+    Returns:
+        Long DataFrame with date, the column levels of returns, alpha, beta_<factor>
+        for each factor, resid_vol, r2 and n_obs, for every period in which a
+        security has a return and at least min_obs returns in its window
+    """
+    if min_obs > window:
+        raise ValueError(f"min_obs ({min_obs}) cannot exceed window ({window})")
+    
+    x = np.column_stack([np.ones(len(factors)), factors.to_numpy(dtype='float64')])
+    valid_x = ~np.isnan(x).any(axis=1)
+    x0 = np.where(valid_x[:, None], x, 0.0)
+    xx = x0[:, :, None] * x0[:, None, :]
+    n_periods, p = x.shape
+    
+    id_names = [name or f'level_{level}' for level, name in enumerate(returns.columns.names)]
+    columns = ['date'] + id_names + ['alpha'] + [f'beta_{f}' for f in factors.columns] + ['resid_vol', 'r2', 'n_obs']
+    
+    y_all = returns.to_numpy(dtype='float64')
+    if chunk_size is None:
+        chunk_size = max(1, MAX_CHUNK_ELEMENTS // (n_periods * p * p))
+    
+    results = []
+    for start in range(0, y_all.shape[1], chunk_size):
+        y = y_all[:, start:start + chunk_size]
+        mask = ~np.isnan(y) & valid_x[:, None]
+        y0 = np.where(mask, y, 0.0)
+        m = mask.astype('float64')
+        
+        # Window cross products of every (period, security): X'X, X'y, y'y and counts
+        sxx = _window_sums(m[:, :, None, None] * xx[:, None, :, :], window)
+        sxy = _window_sums(y0[:, :, None] * x0[:, None, :], window)
+        syy = _window_sums(y0 * y0, window)
+        counts = _window_sums(mask.astype(np.int64), window)
+        
+        # Estimates only where the security has a return and enough of them
+        t, n = np.nonzero(mask & (counts >= min_obs))
+        coef = batched_lstsq(sxx[t, n], sxy[t, n], counts[t, n], min_obs)
+        
+        # SSR = y'y - b'X'y at the OLS solution; SST around the window mean (X'y[0] = sum of y)
+        obs = counts[t, n].astype('float64')
+        ssr = np.maximum(syy[t, n] - np.einsum('bk,bk->b', coef, sxy[t, n]), 0.0)
+        sst = syy[t, n] - sxy[t, n, 0] ** 2 / obs
+        dof = obs - p
+        
+        chunk = pd.DataFrame({'date': returns.index[t]})
+        ids = returns.columns[start + n]
+        for level, name in enumerate(id_names):
+            chunk[name] = ids.get_level_values(level)
+        chunk['alpha'] = coef[:, 0]
+        for k, factor in enumerate(factors.columns, start=1):
+            chunk[f'beta_{factor}'] = coef[:, k]
+        chunk['resid_vol'] = np.sqrt(ssr / np.where(dof > 0, dof, np.nan))
+        chunk['r2'] = 1 - ssr / np.where(sst > 0, sst, np.nan)
+        chunk['n_obs'] = counts[t, n]
+        results.append(chunk[chunk['alpha'].notna()])
+    
+    if not results:
+        return pd.DataFrame(columns=columns)
+    df = pd.concat(results, ignore_index=True)
+    return df.sort_values(['date'] + id_names, kind='mergesort').reset_index(drop=True)
+
+
+def rolling_factor_betas(stock_returns: pd.DataFrame, factors: pd.DataFrame,
+                         factor_names: Sequence[str] = tuple(FACTORS), window: int = 60,
+                         min_obs: int = 36, frequency: str = 'monthly',
+                         id_cols: Sequence[str] = ('gvkey', 'iid'),
+                         excess: bool = True) -> pd.DataFrame:
+    """
+    Rolling factor betas, alphas and residual volatilities of every stock.
+    
+    Args:
+        stock_returns: Long panel of decimal returns, e.g. get_korea_monthly_returns
+                       (gvkey, iid, month, monthly_return) or daily returns
+                       (gvkey, iid, datadate, daily_return)
+        factors: Factor file contents (date, factor columns and RF, in %), e.g.
+                 load_factor_file('data/korea_factors_monthly.csv')
+        factor_names: Factor columns to regress on
+        window: Periods (factor file rows) in each window, ending at the estimation date
+        min_obs: Minimum returns in a window for an estimate
+        frequency: 'monthly' or 'daily' (selects the panel's date and return columns)
+        id_cols: Columns identifying a security
+        excess: Subtract RF from stock returns (factor returns are already excess)
+    
+    Returns:
+        Long DataFrame with date, id_cols, alpha (in % per period), beta_<factor>,
+        resid_vol (in % per period), r2 and n_obs
+    
+    Example:
+        >>> monthly = get_korea_monthly_returns(gvkeys, '2010-01-01', '2020-12-31', conn)
+        >>> factors = load_factor_file('data/korea_factors_monthly.csv')
+        >>> betas = rolling_factor_betas(monthly, factors, window=60, min_obs=36)
+    """
+    if frequency not in PANEL_COLUMNS:
+        raise ValueError(f"Unknown frequency: {frequency}")
+    missing = [f for f in factor_names if f not in factors.columns]
+    if missing:
+        raise ValueError(f"Factors not in the factor file: {missing}")
+    
+    factors = factors.assign(date=pd.to_datetime(factors['date'])).sort_values('date').set_index('date')
+    returns = return_matrix(stock_returns, factors.index, frequency, id_cols)
+    if excess and 'RF' in factors.columns:
+        returns = returns.sub(factors['RF'], axis=0)
+    
+    logger.info(f"Rolling {window}-period betas on {list(factor_names)} for {returns.shape[1]} securities "
+                f"over {returns.shape[0]} periods")
+    betas = rolling_regressions(returns, factors[list(factor_names)], window, min_obs)
+    logger.info(f"Estimated {len(betas)} security-period betas")
+    return betas
+
+
+def latest_betas(betas: pd.DataFrame, id_cols: Sequence[str] = ('gvkey', 'iid')) -> pd.DataFrame:
+    """Most recent estimate of every security."""
+    return betas.drop_duplicates(list(id_cols), keep='last').reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    import argparse
+    from korea_connection import connect_wrds
+    from korea_factor_calculator import KoreaFactorCalculator
+    from korea_factor_store import load_factor_file, open_factor_store
+    from korea_ticker_utils import get_korea_all_stocks, get_korea_monthly_returns
+    
+    parser = argparse.ArgumentParser(description='Estimate rolling factor betas of Korean stocks')
+    parser.add_argument('--factors-file', type=str, default='data/korea_factors_monthly.csv',
+                        help='Monthly factor data CSV file or .parquet/.arrow store')
+    parser.add_argument('--start-date', type=str, default='2015-01-01', help='Start date (YYYY-MM-DD)')
+    parser.add_argument('--end-date', type=str, default='2020-12-31', help='End date (YYYY-MM-DD)')
+    parser.add_argument('--factors', type=str, nargs='+', default=FACTORS, help='Factors to regress on')
+    parser.add_argument('--window', type=int, default=60, help='Months in each window')
+    parser.add_argument('--min-obs', type=int, default=36, help='Minimum months of returns in a window')
+    parser.add_argument('--output', type=str, default='data/korea_rolling_betas.csv',
+                        help='Output file or store (e.g. data/korea_rolling_betas.arrow)')
+    args = parser.parse_args()
+    
+    conn = connect_wrds()
+    
+    print("="*80)
+    print("Korea Rolling Factor Betas")
+    print("="*80)
+    
+    factors = load_factor_file(args.factors_file)
+    # Securities listed at the end of the period
+    last_day = KoreaFactorCalculator(conn).find_previous_trading_day(args.end_date)
+    stocks = get_korea_all_stocks(last_day, conn)
+    monthly = get_korea_monthly_returns(stocks['gvkey'].unique().tolist(), args.start_date, args.end_date, conn)
+    betas = rolling_factor_betas(monthly, factors, args.factors, window=args.window, min_obs=args.min_obs)
+    
+    latest = latest_betas(betas)
+    print(f"\nLatest betas of {len(latest)} securities:")
+    print(latest.describe().round(3).to_string())
+    
+    open_factor_store(args.output).write(betas)
+    conn.close()
+    print(f"\nSaved {len(betas)} estimates to {args.output}")
+    print("\n✅ Completed!")
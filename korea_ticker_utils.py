@@ -6,15 +6,27 @@ This module provides functions to retrieve Korean stock data from WRDS Compustat
 """
 
 import pandas as pd
+from pandas.api.types import union_categoricals
+import sqlalchemy as sa
 import wrds
-from typing import List, Optional
+from typing import Iterator, List, Optional, TYPE_CHECKING
 import logging
+from korea_data_cache import KoreaDataCache
+from korea_metrics import PipelineMetrics, null_metrics
+
+if TYPE_CHECKING:
+    from korea_fundamentals import KoreaFundamentalsStore
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+PRICE_COLUMNS = ['gvkey', 'iid', 'datadate', 'prccd', 'ajexdi', 'cshoc', 'market_cap']
+FUNDAMENTAL_COLUMNS = ['gvkey', 'datadate', 'ceq', 'at', 'revt', 'cogs', 'xsga', 'xint']
+
 
-def get_korea_top_n_stocks(n: int, date: str, conn: wrds.Connection) -> pd.DataFrame:
+def get_korea_top_n_stocks(n: int, date: str, conn: wrds.Connection,
+                           cache: Optional[KoreaDataCache] = None,
+                           metrics: Optional[PipelineMetrics] = None) -> pd.DataFrame:
     """
     Get top N Korean stocks by market capitalization on a specific date.
     
@@ -22,6 +34,8 @@ def get_korea_top_n_stocks(n: int, date: str, conn: wrds.Connection) -> pd.DataF
         n: Number of stocks to retrieve
         date: Reference date in 'YYYY-MM-DD' format
         conn: WRDS connection object
+        cache: Local data cache to read from instead of querying WRDS
+        metrics: Metrics to record stage times and data volumes into
     
     Returns:
         DataFrame with columns: gvkey, iid, conm, prccd, market_cap
@@ -33,6 +47,15 @@ def get_korea_top_n_stocks(n: int, date: str, conn: wrds.Connection) -> pd.DataF
         >>> print(top100.head())
     """
     logger.info(f"Retrieving top {n} Korean stocks as of {date}")
+    metrics = metrics or null_metrics()
+    
+    if cache is not None:
+        df = _read_cache(cache.secd, date, date, metrics, 'top_stocks.cache')
+        df = df[df['cshoc'].notna() & (df['cshoc'] > 0) & df['market_cap'].notna()]
+        df = df.sort_values('market_cap', ascending=False).head(n).reset_index(drop=True)
+        if len(df) < n:
+            logger.warning(f"Only {len(df)} stocks found, requested {n}")
+        return df[['gvkey', 'iid', 'conm', 'prccd', 'ajexdi', 'cshoc', 'market_cap']]
     
     query = f"""
     SELECT gvkey, iid, conm,
@@ -49,7 +72,7 @@ def get_korea_top_n_stocks(n: int, date: str, conn: wrds.Connection) -> pd.DataF
     """
     
     try:
-        df = conn.raw_sql(query)
+        df = _query(conn, query, metrics, 'top_stocks.sql')
         logger.info(f"Successfully retrieved {len(df)} stocks")
         
         if len(df) < n:
@@ -63,48 +86,80 @@ def get_korea_top_n_stocks(n: int, date: str, conn: wrds.Connection) -> pd.DataF
 
 
 def get_korea_stock_prices(gvkeys: List[str], start_date: str, end_date: str, 
-                           conn: wrds.Connection) -> pd.DataFrame:
+                           conn: wrds.Connection,
+                           cache: Optional[KoreaDataCache] = None,
+                           chunk_size: int = 1000,
+                           fetch_size: int = 100000,
+                           metrics: Optional[PipelineMetrics] = None,
+                           float32: bool = False) -> pd.DataFrame:
     """
     Get daily prices for Korean stocks.
     
+    The gvkeys are bound as an array parameter, one query per chunk of
+    chunk_size gvkeys, and every query is read through a server-side cursor
+    fetch_size rows at a time into the compact schema (see compact_prices), so
+    peak memory stays close to the size of the compact result. Company names
+    are not included; use get_korea_company_names.
+    
     Args:
         gvkeys: List of gvkey identifiers
         start_date: Start date in 'YYYY-MM-DD' format
         end_date: End date in 'YYYY-MM-DD' format
         conn: WRDS connection object
+        cache: Local data cache to read from instead of querying WRDS
+        chunk_size: Maximum number of gvkeys per query
+        fetch_size: Number of rows fetched from the cursor at a time
+        metrics: Metrics to record stage times and data volumes into
+                 (prices.sql: until the first rows arrive, prices.transfer: the rest)
+        float32: Store prices, shares and market caps as float32 instead of float64
     
     Returns:
-        DataFrame with columns: gvkey, iid, datadate, prccd, returns
+        DataFrame with columns: gvkey, iid (categorical), datadate (datetime64),
+        prccd, ajexdi, cshoc, market_cap, returns
         
     Example:
         >>> prices = get_korea_stock_prices(['104604', '204049'], '2020-10-01', '2020-10-31', conn)
     """
     logger.info(f"Retrieving prices for {len(gvkeys)} stocks from {start_date} to {end_date}")
+    metrics = metrics or null_metrics()
     
-    # Create gvkey list for SQL IN clause
-    gvkey_list = "','".join(gvkeys)
-    
-    query = f"""
-    SELECT gvkey, iid, datadate, conm,
-           prccd, ajexdi, cshoc,
-           (prccd / ajexdi * cshoc) as market_cap
+    query = """
+    SELECT gvkey, iid, datadate, prccd, ajexdi, cshoc
     FROM comp.g_secd
-    WHERE gvkey IN ('{gvkey_list}')
-    AND datadate BETWEEN '{start_date}' AND '{end_date}'
+    WHERE gvkey = ANY(%(gvkeys)s)
+    AND datadate BETWEEN %(start_date)s AND %(end_date)s
     AND prccd IS NOT NULL
     ORDER BY gvkey, iid, datadate
     """
     
     try:
-        df = conn.raw_sql(query)
+        gvkeys = sorted(set(gvkeys))
+        if cache is not None:
+            df = _read_cache(cache.secd, start_date, end_date, metrics, 'prices.cache')
+            df = compact_prices(df[df['gvkey'].isin(gvkeys)], float32, gvkeys)
+        else:
+            frames = []
+            for i in range(0, len(gvkeys), chunk_size):
+                params = {'gvkeys': gvkeys[i:i + chunk_size], 'start_date': start_date, 'end_date': end_date}
+                chunks = _stream_sql(conn, query, params, fetch_size)
+                with metrics.stage('prices.sql'):
+                    chunk = next(chunks, None)
+                while chunk is not None:
+                    metrics.record_frame('prices.transfer', chunk, fetched=True)
+                    with metrics.stage('prices.transfer'):
+                        frames.append(compact_prices(chunk, float32, gvkeys))
+                        chunk = next(chunks, None)
+            df = _concat_prices(frames, float32, gvkeys)
         logger.info(f"Retrieved {len(df)} price records")
         
         # Calculate returns
-        df = df.sort_values(['gvkey', 'iid', 'datadate'])
-        df['returns'] = df.groupby(['gvkey', 'iid'])['prccd'].pct_change()
+        with metrics.stage('prices.returns'):
+            df = df.sort_values(['gvkey', 'iid', 'datadate'])
+            df['returns'] = df.groupby(['gvkey', 'iid'], observed=True)['prccd'].pct_change()
+        metrics.record_frame('prices.returns', df)
         
         # Report missing data
-        missing_pct = df['returns'].isna().sum() / len(df) * 100
+        missing_pct = df['returns'].isna().sum() / len(df) * 100 if len(df) else 0.0
         logger.info(f"Missing data: {missing_pct:.2f}%")
         
         return df
@@ -114,8 +169,183 @@ def get_korea_stock_prices(gvkeys: List[str], start_date: str, end_date: str,
         raise
 
 
+def get_korea_month_end_prices(gvkeys: List[str], start_date: str, end_date: str,
+                               conn: wrds.Connection,
+                               cache: Optional[KoreaDataCache] = None,
+                               chunk_size: int = 1000,
+                               metrics: Optional[PipelineMetrics] = None,
+                               float32: bool = False) -> pd.DataFrame:
+    """
+    Get the last trading-day row of every security-month for Korean stocks.
+    
+    The month-end rows are selected in the database, so only one row per
+    (gvkey, iid, month) is transferred instead of every trading day. The result
+    matches taking groupby(['gvkey', 'iid', 'month']).last() of the daily
+    prices for prccd (last day with a price) and market_cap (last day with a
+    market cap); ajexdi, cshoc and trfd are those of the last day with a price.
+    
+    Args:
+        gvkeys: List of gvkey identifiers
+        start_date: Start date in 'YYYY-MM-DD' format
+        end_date: End date in 'YYYY-MM-DD' format
+        conn: WRDS connection object
+        cache: Local data cache to read from instead of querying WRDS
+        chunk_size: Maximum number of gvkeys per query
+        metrics: Metrics to record stage times and data volumes into
+        float32: Store prices, shares and market caps as float32 instead of float64
+    
+    Returns:
+        DataFrame with columns: gvkey, iid (categorical), month (Period), datadate,
+        prccd, ajexdi, cshoc, trfd, market_cap; sorted by gvkey, iid, month
+        
+    Example:
+        >>> month_ends = get_korea_month_end_prices(gvkeys, '2020-09-01', '2020-10-31', conn)
+    """
+    logger.info(f"Retrieving month-end prices for {len(gvkeys)} stocks from {start_date} to {end_date}")
+    metrics = metrics or null_metrics()
+    
+    query = """
+    WITH last_days AS (
+        SELECT gvkey, iid,
+               MAX(datadate) AS datadate,
+               MAX(CASE WHEN ajexdi IS NOT NULL AND cshoc IS NOT NULL THEN datadate END) AS cap_date
+        FROM comp.g_secd
+        WHERE gvkey = ANY(%(gvkeys)s)
+        AND datadate BETWEEN %(start_date)s AND %(end_date)s
+        AND prccd IS NOT NULL
+        GROUP BY gvkey, iid, date_trunc('month', datadate)
+    )
+    SELECT d.gvkey, d.iid, d.datadate,
+           p.prccd, p.ajexdi, p.cshoc, p.trfd,
+           (c.prccd / c.ajexdi * c.cshoc) as market_cap
+    FROM last_days d
+    JOIN comp.g_secd p
+      ON p.gvkey = d.gvkey AND p.iid = d.iid AND p.datadate = d.datadate
+    LEFT JOIN comp.g_secd c
+      ON c.gvkey = d.gvkey AND c.iid = d.iid AND c.datadate = d.cap_date
+    ORDER BY d.gvkey, d.iid, d.datadate
+    """
+    
+    try:
+        gvkeys = sorted(set(gvkeys))
+        if cache is not None:
+            daily = _read_cache(cache.secd, start_date, end_date, metrics, 'month_end.cache')
+            daily = daily[daily['gvkey'].isin(gvkeys)].sort_values(['gvkey', 'iid', 'datadate'])
+            daily['month'] = pd.to_datetime(daily['datadate']).dt.to_period('M')
+            keys = ['gvkey', 'iid', 'month']
+            df = daily.drop_duplicates(keys, keep='last').set_index(keys)
+            df['market_cap'] = daily.groupby(keys)['market_cap'].last()
+            df = df.reset_index()
+        else:
+            frames = []
+            for i in range(0, len(gvkeys), chunk_size):
+                params = {'gvkeys': gvkeys[i:i + chunk_size], 'start_date': start_date, 'end_date': end_date}
+                frames.append(_query(conn, query, metrics, 'month_end.sql', params))
+            df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        
+        with metrics.stage('month_end.typing'):
+            df = df.reset_index(drop=True).reindex(columns=PRICE_COLUMNS + ['trfd'])
+            compact = compact_prices(df, float32, gvkeys)
+            # market_cap is the last non-missing one of the month, not prccd / ajexdi * cshoc of the last row
+            value_dtype = compact['prccd'].dtype
+            for c in ['trfd', 'market_cap']:
+                compact[c] = pd.to_numeric(df[c], errors='coerce').astype(value_dtype)
+            compact.insert(2, 'month', compact['datadate'].dt.to_period('M'))
+            compact = compact[['gvkey', 'iid', 'month', 'datadate', 'prccd', 'ajexdi', 'cshoc', 'trfd', 'market_cap']]
+            compact = compact.sort_values(['gvkey', 'iid', 'month']).reset_index(drop=True)
+        metrics.record_frame('month_end.typing', compact)
+        
+        logger.info(f"Retrieved {len(compact)} month-end records")
+        return compact
+    
+    except Exception as e:
+        logger.error(f"Failed to retrieve month-end prices: {e}")
+        raise
+
+
+def _stream_sql(conn: wrds.Connection, query: str, params: dict, fetch_size: int) -> Iterator[pd.DataFrame]:
+    """
+    Yield the result of a query in chunks of fetch_size rows.
+    
+    On a live WRDS connection the query runs on a server-side cursor
+    (SQLAlchemy stream_results), so only one chunk is held by the client;
+    ManagedConnection (connect_wrds) streams its chunked queries itself.
+    """
+    connection = getattr(conn, 'connection', None)
+    streaming = isinstance(connection, sa.engine.Connection)
+    if streaming:
+        connection.execution_options(stream_results=True)
+    try:
+        yield from conn.raw_sql(query, params=params, chunksize=fetch_size, return_iter=True)
+    finally:
+        if streaming:
+            connection.execution_options(stream_results=False)
+
+
+def compact_prices(df: pd.DataFrame, float32: bool = False,
+                   gvkeys: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Cast a g_secd price frame to the compact price schema.
+    
+    gvkey and iid become categoricals, datadate datetime64[ns], and prccd,
+    ajexdi, cshoc and market_cap (computed here as prccd / ajexdi * cshoc, so it
+    need not be transferred) float64 or float32. Other columns are dropped.
+    
+    Args:
+        df: Frame with gvkey, iid, datadate, prccd, ajexdi, cshoc
+        float32: Store the value columns as float32
+        gvkeys: Categories of gvkey (default: the gvkeys present)
+    
+    Returns:
+        DataFrame with columns: gvkey, iid, datadate, prccd, ajexdi, cshoc, market_cap
+    """
+    df = df.reindex(columns=PRICE_COLUMNS)
+    compact = pd.DataFrame({
+        'gvkey': pd.Categorical(df['gvkey'], categories=gvkeys),
+        'iid': pd.Categorical(df['iid']),
+        'datadate': pd.to_datetime(df['datadate']).astype('datetime64[ns]')
+    }, index=df.index)
+    for c in ['prccd', 'ajexdi', 'cshoc']:
+        compact[c] = pd.to_numeric(df[c], errors='coerce').astype('float64')
+    compact['market_cap'] = compact['prccd'] / compact['ajexdi'] * compact['cshoc']
+    
+    if float32:
+        compact = compact.astype({c: 'float32' for c in ['prccd', 'ajexdi', 'cshoc', 'market_cap']})
+    return compact
+
+
+def _concat_prices(frames: List[pd.DataFrame], float32: bool = False,
+                   gvkeys: Optional[List[str]] = None) -> pd.DataFrame:
+    """Concatenate compact price frames, keeping iid categorical across chunks."""
+    if len(frames) == 0:
+        return compact_prices(pd.DataFrame(), float32, gvkeys)
+    df = pd.concat(frames, ignore_index=True)
+    df['iid'] = union_categoricals([f['iid'] for f in frames])
+    return df
+
+
+def _query(conn: wrds.Connection, query: str, metrics: PipelineMetrics, stage: str,
+           params: Optional[dict] = None) -> pd.DataFrame:
+    """Run a query, recording its time and result size as a stage."""
+    with metrics.stage(stage):
+        df = conn.raw_sql(query, params=params) if params is not None else conn.raw_sql(query)
+    metrics.record_frame(stage, df, fetched=True)
+    return df
+
+
+def _read_cache(read, start_date: str, end_date: str, metrics: PipelineMetrics, stage: str) -> pd.DataFrame:
+    """Read a date range from a cache table, recording its time and result size as a stage."""
+    with metrics.stage(stage):
+        df = read(start_date, end_date)
+    metrics.record_frame(stage, df)
+    return df
+
+
 def get_korea_all_stocks(date: str, conn: wrds.Connection, 
-                         min_market_cap: float = 0) -> pd.DataFrame:
+                         min_market_cap: float = 0,
+                         cache: Optional[KoreaDataCache] = None,
+                         fundamentals: Optional['KoreaFundamentalsStore'] = None,
+                         metrics: Optional[PipelineMetrics] = None) -> pd.DataFrame:
     """
     Get all Korean stocks with market cap and book value for factor calculation.
     
@@ -123,18 +353,23 @@ def get_korea_all_stocks(date: str, conn: wrds.Connection,
         date: Reference date in 'YYYY-MM-DD' format
         conn: WRDS connection object
         min_market_cap: Minimum market cap filter (default: 0)
+        cache: Local data cache to read from instead of querying WRDS
+        fundamentals: Point-in-time fundamentals store used instead of querying comp.g_funda
+        metrics: Metrics to record stage times and data volumes into
     
     Returns:
-        DataFrame with columns: gvkey, iid, conm, market_cap, book_equity, book_to_market
+        DataFrame with columns: gvkey, iid, datadate, prccd, ajexdi, cshoc, market_cap,
+        ceq, at, book_equity, book_to_market (company names: get_korea_company_names)
         
     Example:
         >>> all_stocks = get_korea_all_stocks('2020-10-15', conn)
     """
     logger.info(f"Retrieving all Korean stocks as of {date}")
+    metrics = metrics or null_metrics()
     
     # Get price and market cap data
     query_price = f"""
-    SELECT gvkey, iid, conm, datadate,
+    SELECT gvkey, iid, datadate,
            prccd, ajexdi, cshoc,
            (prccd / ajexdi * cshoc) as market_cap
     FROM comp.g_secd
@@ -147,31 +382,47 @@ def get_korea_all_stocks(date: str, conn: wrds.Connection,
     """
     
     try:
-        df_price = conn.raw_sql(query_price)
+        if cache is not None:
+            df_price = _read_cache(cache.secd, date, date, metrics, 'stocks.cache')
+            df_price = df_price[df_price['cshoc'].notna() & (df_price['cshoc'] > 0) &
+                                (df_price['market_cap'] >= min_market_cap)].drop(columns='conm')
+        else:
+            df_price = _query(conn, query_price, metrics, 'stocks.sql')
+            df_price['datadate'] = pd.to_datetime(df_price['datadate'])
         logger.info(f"Retrieved {len(df_price)} stocks with price data")
         
-        # Get book equity from fundamentals (most recent annual data before the date)
-        year = int(date[:4])
-        query_fundamentals = f"""
-        SELECT gvkey, datadate, ceq, at
-        FROM comp.g_funda
-        WHERE fic = 'KOR'
-        AND datadate <= '{date}'
-        AND datadate >= '{year-2}-01-01'
-        AND ceq IS NOT NULL
-        AND ceq > 0
-        """
-        
-        df_fundamentals = conn.raw_sql(query_fundamentals)
-        logger.info(f"Retrieved {len(df_fundamentals)} fundamental records")
-        
-        # Get most recent fundamental data for each gvkey
-        df_fundamentals = df_fundamentals.sort_values('datadate', ascending=False)
-        df_fundamentals = df_fundamentals.groupby('gvkey').first().reset_index()
-        
-        # Merge price and fundamental data
-        df = df_price.merge(df_fundamentals[['gvkey', 'ceq', 'at']], 
-                           on='gvkey', how='left', suffixes=('', '_fund'))
+        if fundamentals is not None:
+            # Latest book equity available at the date, from the point-in-time store
+            with metrics.stage('stocks.fundamentals'):
+                df = fundamentals.as_of(df_price, date=date).drop(columns='fund_date')
+        else:
+            # Get book equity from fundamentals (most recent annual data before the date)
+            year = int(date[:4])
+            query_fundamentals = f"""
+            SELECT gvkey, datadate, ceq, at
+            FROM comp.g_funda
+            WHERE fic = 'KOR'
+            AND datadate <= '{date}'
+            AND datadate >= '{year-2}-01-01'
+            AND ceq IS NOT NULL
+            AND ceq > 0
+            """
+            
+            if cache is not None:
+                df_fundamentals = _read_cache(cache.funda, f"{year-2}-01-01", date, metrics, 'stocks.fundamentals')
+                df_fundamentals = df_fundamentals[df_fundamentals['ceq'].notna() & (df_fundamentals['ceq'] > 0)]
+            else:
+                df_fundamentals = _query(conn, query_fundamentals, metrics, 'stocks.fundamentals')
+            logger.info(f"Retrieved {len(df_fundamentals)} fundamental records")
+            
+            with metrics.stage('stocks.merge'):
+                # Get most recent fundamental data for each gvkey
+                df_fundamentals = df_fundamentals.sort_values('datadate', ascending=False)
+                df_fundamentals = df_fundamentals.groupby('gvkey').first().reset_index()
+                
+                # Merge price and fundamental data
+                df = df_price.merge(df_fundamentals[['gvkey', 'ceq', 'at']], 
+                                   on='gvkey', how='left', suffixes=('', '_fund'))
         
         # Calculate book-to-market ratio
         df['book_equity'] = df['ceq']
@@ -179,6 +430,7 @@ def get_korea_all_stocks(date: str, conn: wrds.Connection,
         
         # Remove stocks without book value
         df_with_bm = df[df['book_to_market'].notna()].copy()
+        metrics.record_frame('stocks.merge', df_with_bm)
         
         logger.info(f"Final dataset: {len(df_with_bm)} stocks with book-to-market data")
         logger.info(f"Dropped {len(df) - len(df_with_bm)} stocks without book value")
@@ -190,16 +442,162 @@ def get_korea_all_stocks(date: str, conn: wrds.Connection,
         raise
 
 
+def get_korea_price_panel(start_date: str, end_date: str,
+                          conn: wrds.Connection,
+                          cache: Optional[KoreaDataCache] = None,
+                          metrics: Optional[PipelineMetrics] = None,
+                          float32: bool = False) -> pd.DataFrame:
+    """
+    Get the full daily price panel of Korean securities for a date range.
+    
+    Unlike get_korea_stock_prices, the panel is not restricted to a gvkey list,
+    so a single query covers every formation snapshot and return month in the range.
+    The panel uses the compact price schema (see compact_prices).
+    
+    Args:
+        start_date: Start date in 'YYYY-MM-DD' format
+        end_date: End date in 'YYYY-MM-DD' format
+        conn: WRDS connection object
+        cache: Local data cache to read from instead of querying WRDS
+        metrics: Metrics to record stage times and data volumes into
+        float32: Store prices, shares and market caps as float32 instead of float64
+    
+    Returns:
+        DataFrame with columns: gvkey, iid (categorical), datadate (datetime64),
+        prccd, ajexdi, cshoc, market_cap
+        
+    Example:
+        >>> panel = get_korea_price_panel('2020-08-20', '2020-12-31', conn)
+    """
+    logger.info(f"Retrieving Korean price panel from {start_date} to {end_date}")
+    metrics = metrics or null_metrics()
+    
+    query = f"""
+    SELECT gvkey, iid, datadate, prccd, ajexdi, cshoc
+    FROM comp.g_secd
+    WHERE fic = 'KOR'
+    AND datadate BETWEEN '{start_date}' AND '{end_date}'
+    AND prccd IS NOT NULL
+    """
+    
+    try:
+        if cache is not None:
+            df = _read_cache(cache.secd, start_date, end_date, metrics, 'price_panel.cache')
+        else:
+            df = _query(conn, query, metrics, 'price_panel.sql')
+        df = compact_prices(df, float32)
+        logger.info(f"Retrieved {len(df)} panel records")
+        return df
+    
+    except Exception as e:
+        logger.error(f"Failed to retrieve price panel: {e}")
+        raise
+
+
+def get_korea_fundamentals_panel(start_date: str, end_date: str,
+                                 conn: wrds.Connection,
+                                 cache: Optional[KoreaDataCache] = None,
+                                 metrics: Optional[PipelineMetrics] = None) -> pd.DataFrame:
+    """
+    Get all positive book equity records of Korean firms for a date range.
+    
+    Besides book equity and total assets, the income statement items needed for
+    operating profitability (revt, cogs, xsga, xint) are returned.
+    
+    Args:
+        start_date: Start date in 'YYYY-MM-DD' format
+        end_date: End date in 'YYYY-MM-DD' format
+        conn: WRDS connection object
+        cache: Local data cache to read from instead of querying WRDS
+        metrics: Metrics to record stage times and data volumes into
+    
+    Returns:
+        DataFrame with columns: gvkey, datadate, ceq, at, revt, cogs, xsga, xint
+        
+    Example:
+        >>> funda = get_korea_fundamentals_panel('2018-01-01', '2020-12-01', conn)
+    """
+    logger.info(f"Retrieving Korean fundamentals from {start_date} to {end_date}")
+    metrics = metrics or null_metrics()
+    
+    query = f"""
+    SELECT gvkey, datadate, ceq, at, revt, cogs, xsga, xint
+    FROM comp.g_funda
+    WHERE fic = 'KOR'
+    AND datadate BETWEEN '{start_date}' AND '{end_date}'
+    AND ceq IS NOT NULL
+    AND ceq > 0
+    """
+    
+    try:
+        if cache is not None:
+            df = _read_cache(cache.funda, start_date, end_date, metrics, 'fundamentals_panel.cache')
+            # Partitions cached before the income statement items were added lack them
+            df = df[df['ceq'].notna() & (df['ceq'] > 0)].reindex(columns=FUNDAMENTAL_COLUMNS)
+        else:
+            df = _query(conn, query, metrics, 'fundamentals_panel.sql')
+        df['datadate'] = pd.to_datetime(df['datadate'])
+        logger.info(f"Retrieved {len(df)} fundamental records")
+        return df
+    
+    except Exception as e:
+        logger.error(f"Failed to retrieve fundamentals panel: {e}")
+        raise
+
+
+def get_korea_company_names(conn: wrds.Connection, gvkeys: Optional[List[str]] = None,
+                            cache: Optional[KoreaDataCache] = None) -> pd.DataFrame:
+    """
+    Get company names of Korean firms (kept out of the price frames).
+    
+    Args:
+        conn: WRDS connection object
+        gvkeys: gvkeys to look up (default: all Korean firms)
+        cache: Local data cache to read from instead of querying WRDS
+    
+    Returns:
+        DataFrame with columns: gvkey, conm
+        
+    Example:
+        >>> names = get_korea_company_names(conn, top10['gvkey'].tolist())
+        >>> top10.merge(names, on='gvkey')
+    """
+    query = """
+    SELECT gvkey, conm
+    FROM comp.g_company
+    WHERE fic = 'KOR'
+    """
+    
+    try:
+        df = cache.company() if cache is not None else conn.raw_sql(query)
+        if gvkeys is not None:
+            df = df[df['gvkey'].isin(gvkeys)]
+        return df[['gvkey', 'conm']].reset_index(drop=True)
+    
+    except Exception as e:
+        logger.error(f"Failed to retrieve company names: {e}")
+        raise
+
+
 def get_korea_monthly_returns(gvkeys: List[str], start_date: str, end_date: str,
-                              conn: wrds.Connection) -> pd.DataFrame:
+                              conn: wrds.Connection,
+                              cache: Optional[KoreaDataCache] = None,
+                              metrics: Optional[PipelineMetrics] = None,
+                              month_end: bool = True) -> pd.DataFrame:
     """
     Get monthly returns for Korean stocks.
     
+    By default only month-end rows are fetched (see get_korea_month_end_prices);
+    with month_end=False all daily prices are fetched and reduced here.
+    
     Args:
         gvkeys: List of gvkey identifiers
         start_date: Start date in 'YYYY-MM-DD' format
         end_date: End date in 'YYYY-MM-DD' format
         conn: WRDS connection object
+        cache: Local data cache to read from instead of querying WRDS
+        metrics: Metrics to record stage times and data volumes into
+        month_end: Select month-end rows in the database instead of fetching daily prices
     
     Returns:
         DataFrame with columns: gvkey, month, monthly_return, market_cap
@@ -208,20 +606,24 @@ def get_korea_monthly_returns(gvkeys: List[str], start_date: str, end_date: str,
         >>> monthly_ret = get_korea_monthly_returns(['104604'], '2020-10-01', '2021-10-31', conn)
     """
     logger.info(f"Retrieving monthly returns for {len(gvkeys)} stocks")
+    metrics = metrics or null_metrics()
     
-    # Get daily prices
-    df_daily = get_korea_stock_prices(gvkeys, start_date, end_date, conn)
-    
-    # Convert to monthly
-    df_daily['month'] = pd.to_datetime(df_daily['datadate']).dt.to_period('M')
-    
-    # Get month-end prices and market caps
-    df_monthly = df_daily.sort_values(['gvkey', 'iid', 'datadate'])
-    df_monthly = df_monthly.groupby(['gvkey', 'iid', 'month']).last().reset_index()
+    if month_end:
+        df_monthly = get_korea_month_end_prices(gvkeys, start_date, end_date, conn, cache=cache, metrics=metrics)
+    else:
+        # Get daily prices
+        df_daily = get_korea_stock_prices(gvkeys, start_date, end_date, conn, cache=cache, metrics=metrics)
+        df_daily['month'] = df_daily['datadate'].dt.to_period('M')
+        
+        # Get month-end prices and market caps
+        df_monthly = df_daily.sort_values(['gvkey', 'iid', 'datadate'])
+        df_monthly = df_monthly.groupby(['gvkey', 'iid', 'month'], observed=True).last().reset_index()
     
-    # Calculate monthly returns
-    df_monthly = df_monthly.sort_values(['gvkey', 'iid', 'month'])
-    df_monthly['monthly_return'] = df_monthly.groupby(['gvkey', 'iid'])['prccd'].pct_change()
+    with metrics.stage('month_end'):
+        # Calculate monthly returns
+        df_monthly = df_monthly.sort_values(['gvkey', 'iid', 'month'])
+        df_monthly['monthly_return'] = df_monthly.groupby(['gvkey', 'iid'], observed=True)['prccd'].pct_change()
+    metrics.record_frame('month_end', df_monthly)
     
     logger.info(f"Calculated monthly returns for {len(df_monthly)} month-stock observations")
     
@@ -230,9 +632,9 @@ def get_korea_monthly_returns(gvkeys: List[str], start_date: str, end_date: str,
 
 if __name__ == "__main__":
     # Test the functions
-    import wrds
+    from korea_connection import connect_wrds
     
-    conn = wrds.Connection()
+    conn = connect_wrds()
     
     # Test 1: Get top 10 stocks
     print("="*80)
@@ -248,7 +650,8 @@ if __name__ == "__main__":
     gvkeys = top10['gvkey'].head(3).tolist()
     prices = get_korea_stock_prices(gvkeys, '2020-10-01', '2020-10-31', conn)
     print(f"Retrieved {len(prices)} price records")
-    print(prices.groupby('gvkey')['datadate'].count())
+    counts = prices.groupby('gvkey', observed=True)['datadate'].count().rename('days').reset_index()
+    print(counts.merge(get_korea_company_names(conn, gvkeys), on='gvkey', how='left'))
     
     # Test 3: Get all stocks with book-to-market
     print("\n" + "="*80)
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Korea Trading Calendar
+
+This module holds the KOR trading days of WRDS Compustat Global as a sorted
+datetime64 array, so that month-end and previous-trading-day lookups are binary
+searches instead of per-month queries against comp.g_secd.
+"""
+
+import pandas as pd
+import numpy as np
+import wrds
+from typing import Optional
+import logging
+import os
+from korea_data_cache import KoreaDataCache
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class KoreaTradingCalendar:
+    """
+    Sorted array of KOR trading days (days with at least one comp.g_secd price).
+    
+    Lookups outside the loaded range [start, end] are not answered by the
+    calendar; use covers() to check before relying on a lookup.
+    """
+    
+    def __init__(self, dates, start_date: Optional[str] = None, end_date: Optional[str] = None):
+        """
+        Initialize calendar.
+        
+        Args:
+            dates: Trading days (any array-like of dates)
+            start_date: First day of the loaded range (default: first trading day)
+            end_date: Last day of the loaded range (default: last trading day)
+        """
+        self.dates = np.unique(pd.to_datetime(pd.Series(dates)).values.astype('datetime64[D]'))
+        
+        if start_date is None:
+            start_date = str(self.dates[0]) if len(self.dates) else '1900-01-01'
+        if end_date is None:
+            end_date = str(self.dates[-1]) if len(self.dates) else '1900-01-01'
+        self.start = np.datetime64(start_date, 'D')
+        self.end = np.datetime64(end_date, 'D')
+    
+    @classmethod
+    def load(cls, conn: Optional[wrds.Connection], start_date: str, end_date: str,
+             cache: Optional[KoreaDataCache] = None,
+             cache_file: Optional[str] = None) -> 'KoreaTradingCalendar':
+        """
+        Load the trading days of a date range with a single query.
+        
+        Args:
+            conn: WRDS connection object
+            start_date: Start date in 'YYYY-MM-DD' format
+            end_date: End date in 'YYYY-MM-DD' format
+            cache: Local data cache to read from instead of querying WRDS
+            cache_file: CSV file to reuse if it covers the range, and to save to otherwise
+        
+        Returns:
+            KoreaTradingCalendar covering [start_date, end_date]
+        """
+        if cache_file is not None and os.path.exists(cache_file):
+            calendar = cls.from_file(cache_file)
+            if calendar.covers(start_date) and calendar.covers(end_date):
+                logger.info(f"Loaded {len(calendar)} trading days from {cache_file}")
+                return calendar
+        
+        logger.info(f"Loading KOR trading calendar from {start_date} to {end_date}")
+        
+        if cache is not None:
+            dates = cache.secd(start_date, end_date)['datadate'].unique()
+        else:
+            query = f"""
+            SELECT DISTINCT datadate
+            FROM comp.g_secd
+            WHERE fic = 'KOR'
+            AND datadate BETWEEN '{start_date}' AND '{end_date}'
+            AND prccd IS NOT NULL
+            """
+            dates = conn.raw_sql(query)['datadate']
+        
+        calendar = cls(dates, start_date, end_date)
+        logger.info(f"Loaded {len(calendar)} trading days")
+        
+        if cache_file is not None:
+            calendar.save(cache_file)
+        
+        return calendar
+    
+    @classmethod
+    def from_file(cls, filepath: str) -> 'KoreaTradingCalendar':
+        """Load a calendar saved with save()."""
+        df = pd.read_csv(filepath, comment='#')
+        with open(filepath, 'r') as f:
+            start_date, end_date = f.readline().lstrip('# ').split()
+        return cls(df['date'], start_date, end_date)
+    
+    def save(self, filepath: str):
+        """Save the calendar (loaded range in the header comment) to CSV."""
+        os.makedirs(os.path.dirname(filepath) or '.', exist_ok=True)
+        tmp_path = filepath + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(f"# {self.start} {self.end}\n")
+            pd.DataFrame({'date': self.dates.astype(str)}).to_csv(f, index=False)
+        os.replace(tmp_path, filepath)
+        logger.info(f"Saved trading calendar to {filepath}")
+    
+    def __len__(self) -> int:
+        return len(self.dates)
+    
+    def covers(self, date: str) -> bool:
+        """Whether a date lies within the loaded range."""
+        return self.start <= np.datetime64(date, 'D') <= self.end
+    
+    def is_trading_day(self, date: str) -> bool:
+        """Whether a date is a trading day."""
+        day = np.datetime64(date, 'D')
+        i = np.searchsorted(self.dates, day)
+        return bool(i < len(self.dates) and self.dates[i] == day)
+    
+    def previous_trading_day(self, date: str, max_days_back: int = 10) -> Optional[str]:
+        """
+        Find the most recent trading day on or before a date.
+        
+        Args:
+            date: Target date in 'YYYY-MM-DD' format
+            max_days_back: Maximum days to search backwards
+        
+        Returns:
+            Date string of the trading day, or None if none within max_days_back
+        """
+        result = self.previous_trading_days([date], max_days_back)[0]
+        return None if np.isnat(result) else str(result)
+    
+    def previous_trading_days(self, dates, max_days_back: int = 10) -> np.ndarray:
+        """
+        Vectorized previous_trading_day.
+        
+        Args:
+            dates: Array-like of target dates
+            max_days_back: Maximum days to search backwards
+        
+        Returns:
+            datetime64[D] array of trading days (NaT where none within max_days_back)
+        """
+        targets = pd.to_datetime(pd.Series(dates)).values.astype('datetime64[D]')
+        idx = np.searchsorted(self.dates, targets, side='right') - 1
+        
+        result = np.full(len(targets), np.datetime64('NaT'), dtype='datetime64[D]')
+        found = idx >= 0
+        candidates = self.dates[idx[found]]
+        in_window = candidates >= targets[found] - np.timedelta64(max_days_back, 'D')
+        result[np.flatnonzero(found)[in_window]] = candidates[in_window]
+        return result
+    
+    def month_end(self, year: int, month: int) -> Optional[str]:
+        """Last trading day of a month, or None if the month has no trading days."""
+        result = self.month_ends(f"{year}-{month:02d}-01", f"{year}-{month:02d}-01")
+        return None if len(result) == 0 or pd.isna(result['month_end'].iloc[0]) else \
+            result['month_end'].iloc[0].strftime('%Y-%m-%d')
+    
+    def month_ends(self, start_date: str, end_date: str) -> pd.DataFrame:
+        """
+        Last trading day of every month in a range.
+        
+        Args:
+            start_date: Start date in 'YYYY-MM-DD' format
+            end_date: End date in 'YYYY-MM-DD' format
+        
+        Returns:
+            DataFrame with columns: month (Period), month_end (NaT if no trading day)
+        """
+        months = pd.period_range(start_date, end_date, freq='M')
+        first = months.start_time.values.astype('datetime64[D]')
+        last = months.end_time.values.astype('datetime64[D]')
+        
+        idx = np.searchsorted(self.dates, last, side='right') - 1
+        valid = idx >= 0
+        valid[valid] &= self.dates[idx[valid]] >= first[valid]
+        month_end = np.full(len(months), np.datetime64('NaT'), dtype='datetime64[D]')
+        month_end[valid] = self.dates[idx[valid]]
+        
+        return pd.DataFrame({'month': months, 'month_end': month_end.astype('datetime64[ns]')})
+    
+    def formation_dates(self, start_date: str, end_date: str, max_days_back: int = 10) -> pd.DataFrame:
+        """
+        Portfolio formation dates for every return month in a range.
+        
+        The formation date of a month is the last trading day on or before
+        korea_factor_calculator.formation_target_date (falling back to the target
+        itself when no trading day lies within max_days_back).
+        
+        Args:
+            start_date: Start date in 'YYYY-MM-DD' format
+            end_date: End date in 'YYYY-MM-DD' format
+            max_days_back: Maximum days to search backwards
+        
+        Returns:
+            DataFrame with columns: month (Period), target, formation
+        """
+        months = pd.period_range(start_date, end_date, freq='M')
+        targets = (months - 1).start_time
+        formation = self.previous_trading_days(targets, max_days_back)
+        
+        return pd.DataFrame({
+            'month': months,
+            'target': targets,
+            'formation': np.where(np.isnat(formation), targets.values.astype('datetime64[D]'),
+                                  formation).astype('datetime64[ns]')
+        })
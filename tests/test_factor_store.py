@@ -0,0 +1,50 @@
+import pandas as pd
+import pytest
+
+from korea_factor_store import PartitionedFactorStore, open_factor_store
+
+pytest.importorskip('pyarrow')
+
+MONTHS = pd.date_range('2021-01-31', periods=5, freq='ME')
+
+
+def month_row(date, mkt):
+    return pd.DataFrame({'date': [date], 'MKT': [mkt], 'SMB': [mkt / 10]})
+
+
+@pytest.mark.parametrize('suffix', ['.parquet', '.arrow'])
+def test_append_many_partitions(tmp_path, suffix):
+    store = open_factor_store(str(tmp_path / f'factors{suffix}'))
+    for i, date in enumerate(MONTHS):
+        store.append(month_row(date, float(i)))
+        df = store.load()
+        assert df['date'].tolist() == list(MONTHS[:i + 1])
+    assert len(store.partitions()) == len(MONTHS)
+
+    # A later partition replaces an earlier date
+    store.append(month_row(MONTHS[1], 10.0))
+    df = store.load()
+    assert df['date'].tolist() == list(MONTHS)
+    assert df['MKT'].tolist() == [0.0, 10.0, 2.0, 3.0, 4.0]
+
+    store.compact()
+    assert len(store.partitions()) == 1
+    pd.testing.assert_frame_equal(store.load(), df)
+
+
+@pytest.mark.parametrize('suffix', ['.parquet', '.arrow'])
+def test_load_columns_across_partitions(tmp_path, suffix):
+    store = open_factor_store(str(tmp_path / f'factors{suffix}'))
+    for i, date in enumerate(MONTHS[:4]):
+        store.append(month_row(date, float(i)))
+    store.append(month_row(MONTHS[4], 4.0).assign(UMD=1.0))
+
+    df = store.load(['MKT', 'UMD'])
+    assert df.columns.tolist() == ['date', 'MKT', 'UMD']
+    assert df['UMD'].isna().sum() == 4
+
+
+
+def test_partitioned_store_is_abstract(tmp_path):
+    with pytest.raises(TypeError):
+        PartitionedFactorStore(str(tmp_path / 'factors'))
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from korea_holdings import HoldingsStore  # noqa: E402
+
+MONTHS = pd.date_range('2021-01-31', periods=5, freq='ME')
+
+
+def month_holdings(date, gvkeys, shift=0.0):
+    """Holdings of one run: every gvkey in S/L and MKT with equal weights."""
+    n = len(gvkeys)
+    rows = []
+    for portfolio in ['S/L', 'MKT']:
+        rows.append(pd.DataFrame({'date': date, 'gvkey': gvkeys, 'iid': '01', 'portfolio': portfolio,
+                                  'weight': 1.0 / n, 'return': np.arange(n, dtype=float) + shift}))
+    return pd.concat(rows, ignore_index=True)
+
+
+@pytest.mark.parametrize('suffix', ['.arrow', '.parquet'])
+def test_append_many_runs(tmp_path, suffix):
+    path = str(tmp_path / f'holdings{suffix}')
+    for i, date in enumerate(MONTHS):
+        HoldingsStore(path).append(month_holdings(date, ['001000', '002000', f'00{i}500']))
+
+        holdings = HoldingsStore(path)
+        assert holdings.load()['date'].nunique() == i + 1
+        assert len(holdings.month(date)) == 6
+        assert len(holdings.stock('001000')) == 2 * (i + 1)
+    assert len(HoldingsStore(path).store.partitions()) == len(MONTHS)
+
+    # A rerun of a month replaces its holdings
+    holdings = HoldingsStore(path)
+    holdings.append(month_holdings(MONTHS[2], ['001000', '003000'], shift=1.0))
+    assert holdings.month('2021-03')['gvkey'].astype(str).tolist() == ['001000', '003000'] * 2
+    assert holdings.stock('002500').empty
+    assert holdings.stock('001000')['date'].tolist() == [d for d in MONTHS for _ in range(2)]
+
+    attribution = holdings.attribution('2021-03', 'S/L')
+    assert attribution['contribution'].sum() == pytest.approx(1.5)
+    assert attribution['gvkey'].iloc[0] == '003000'